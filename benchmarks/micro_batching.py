@@ -0,0 +1,103 @@
+"""
+Throughput and latency of concurrent eth_call requests across micro-batching windows,
+against a simulated bucket with a fixed round trip and a capped number of connections.
+
+    python -m benchmarks.micro_batching --requests 2000 --threads 64 --rtt 0.02
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from stateless.eth.provider import StatelessProvider
+
+IDENTITIES = ["https://stateless.bargsystems.com", "https://stateless.nodefleet.org"]
+
+WINDOWS = [None, 0.0005, 0.002, 0.005, 0.01]
+
+
+def make_bucket(rtt, per_item, connections):
+    sockets = threading.Semaphore(connections)
+
+    def post(endpoint_uri, data, **kwargs):
+        request = json.loads(data)
+        requests = request if isinstance(request, list) else [request]
+        with sockets:
+            time.sleep(rtt + per_item * len(requests))
+        responses = [
+            {
+                "jsonrpc": "2.0",
+                "id": item["id"],
+                "result": "0x01",
+                "attestations": [
+                    {"msg": "0xaa", "signature": "0x00", "identity": identity}
+                    for identity in IDENTITIES
+                ],
+            }
+            for item in requests
+        ]
+        return json.dumps(
+            responses if isinstance(request, list) else responses[0]
+        ).encode()
+
+    return post
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def run(window, args):
+    provider = StatelessProvider(
+        "http://localhost:8545",
+        2,
+        IDENTITIES,
+        batch_window=window,
+        batch_max_size=args.max_size,
+    )
+    post = make_bucket(args.rtt, args.per_item, args.connections)
+
+    def call(index):
+        start = time.perf_counter()
+        provider.make_request("eth_call", [{"to": "0x00", "data": hex(index)}, "0x1"])
+        return time.perf_counter() - start
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=post
+    ) as posts:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as callers:
+            latencies = sorted(callers.map(call, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    print(
+        "window {:>8}: {:>7.0f} req/s, {:>5} round trips, "
+        "p50 {:.1f} ms, p99 {:.1f} ms".format(
+            "off" if window is None else "{:g} ms".format(window * 1000),
+            args.requests / elapsed,
+            posts.call_count,
+            percentile(latencies, 0.5) * 1000,
+            percentile(latencies, 0.99) * 1000,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--rtt", type=float, default=0.02)
+    parser.add_argument("--per-item", type=float, default=0.00005)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--max-size", type=int, default=50)
+    args = parser.parse_args()
+
+    for window in WINDOWS:
+        run(window, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Verified responses per second per core, inline versus through a VerificationPool.
+
+    python -m benchmarks.verification --responses 2000 --workers 4
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from eth_keys import keys
+
+from stateless.eth.provider import StatelessProvider
+from stateless.eth.signatures import IdentityKeyRegistry, verify_signature
+from stateless.eth.verification import VerificationPool
+
+IDENTITIES = [
+    "https://stateless.bargsystems.com",
+    "https://stateless.nodefleet.org",
+    "https://stateless.stakenodes.org",
+]
+
+
+def make_responses(count):
+    private_keys = {
+        identity: keys.PrivateKey(bytes([index + 1]) * 32)
+        for index, identity in enumerate(IDENTITIES)
+    }
+    responses = []
+    for index in range(count):
+        msg_hash = index.to_bytes(32, "big")
+        responses.append(
+            {
+                "jsonrpc": "2.0",
+                "id": index,
+                "result": hex(index),
+                "attestations": [
+                    {
+                        "signature": private_key.sign_msg_hash(msg_hash).to_hex(),
+                        "msg": "0x" + msg_hash.hex(),
+                        "signatureFormat": "secp256k1",
+                        "hashAlgo": "sha256",
+                        "identity": identity,
+                    }
+                    for identity, private_key in private_keys.items()
+                ],
+            }
+        )
+    registry = IdentityKeyRegistry(
+        {
+            identity: private_key.public_key.to_checksum_address()
+            for identity, private_key in private_keys.items()
+        }
+    )
+    return registry, responses
+
+
+def run(provider, responses, threads):
+    verify_signature.cache_clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as callers:
+        list(
+            callers.map(
+                lambda resp: provider._verify_response("eth_call", [], resp),
+                responses,
+            )
+        )
+    return len(responses) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--responses", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    registry, responses = make_responses(args.responses)
+    url = "http://localhost:8545"
+
+    inline = StatelessProvider(url, 2, IDENTITIES, key_registry=registry)
+    inline_rate = run(inline, responses, args.threads)
+    print(
+        "inline: {:.0f} responses/s, {:.0f}/s per core".format(inline_rate, inline_rate)
+    )
+
+    pool = VerificationPool(ProcessPoolExecutor(args.workers), batch_size=256)
+    pooled = StatelessProvider(
+        url, 2, IDENTITIES, key_registry=registry, verification_pool=pool
+    )
+    run(pooled, responses[:64], args.threads)  # warm up the worker processes
+    pooled_rate = run(pooled, responses, args.threads)
+    pool.close()
+    print(
+        "pooled ({} workers): {:.0f} responses/s, {:.0f}/s per core".format(
+            args.workers, pooled_rate, pooled_rate / args.workers
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
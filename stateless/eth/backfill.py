@@ -0,0 +1,254 @@
+import asyncio
+import heapq
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from requests.exceptions import Timeout
+from web3.exceptions import Web3RPCError
+
+from .methods import block_number
+from .provider import AsyncStatelessProvider, IntegrityError, StatelessProvider
+
+# Error messages buckets and clients return when a range holds too many logs or
+# takes too long to scan, the range is split and fetched again.
+RANGE_TOO_LARGE = re.compile(
+    r"too many|more than \d+ results|limit exceeded|response size|"
+    r"range is too (large|wide)|exceed|timeout|timed out",
+    re.IGNORECASE,
+)
+
+
+class RangeTooLarge(Exception):
+    pass
+
+
+class ChunkSizer:
+    """
+    Picks the number of blocks requested per eth_getLogs chunk.
+
+    The size halves whenever a chunk holds more than `target_logs` logs, takes
+    longer than `target_latency` seconds or is rejected as too large, and
+    doubles while full sized chunks come back well under both targets.
+    """
+
+    def __init__(
+        self,
+        size: int = 2000,
+        min_size: int = 1,
+        max_size: int = 100000,
+        target_logs: int = 5000,
+        target_latency: float = 2.0,
+    ):
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_logs = target_logs
+        self.target_latency = target_latency
+
+    def observe(self, blocks: int, logs: int, latency: float) -> None:
+        if logs > self.target_logs or latency > self.target_latency:
+            self.shrink(blocks)
+        elif (
+            blocks >= self.size
+            and logs * 2 < self.target_logs
+            and latency * 2 < self.target_latency
+        ):
+            self.size = min(self.max_size, self.size * 2)
+
+    def shrink(self, blocks: int) -> None:
+        self.size = max(self.min_size, min(self.size, blocks) // 2)
+
+
+class _RangeScheduler:
+    # Hands out block ranges in order and releases their logs in block order,
+    # whatever order the chunks complete in.
+
+    def __init__(self, start: int, end: int, sizer: ChunkSizer, max_buffered: int):
+        self.cursor = start
+        self.next_start = start
+        self.end = end
+        self.sizer = sizer
+        self.max_buffered = max_buffered
+        self.retries: list[tuple[int, int]] = []
+        self.results: dict[int, tuple[int, list[dict[str, Any]]]] = {}
+
+    @property
+    def done(self) -> bool:
+        return self.next_start > self.end
+
+    def next_range(self) -> Optional[tuple[int, int]]:
+        if self.retries:
+            return heapq.heappop(self.retries)
+        if self.cursor > self.end or len(self.results) >= self.max_buffered:
+            return None
+        start = self.cursor
+        self.cursor = min(self.end, start + self.sizer.size - 1) + 1
+        return start, self.cursor - 1
+
+    def complete(self, start, end, logs, latency) -> None:
+        self.sizer.observe(end - start + 1, len(logs), latency)
+        self.results[start] = (end, logs)
+
+    def split(self, start, end, error) -> None:
+        if start == end:
+            raise error
+        self.sizer.shrink(end - start + 1)
+        middle = (start + end) // 2
+        heapq.heappush(self.retries, (start, middle))
+        heapq.heappush(self.retries, (middle + 1, end))
+
+    def ready(self) -> Iterator[dict[str, Any]]:
+        while self.next_start in self.results:
+            end, logs = self.results.pop(self.next_start)
+            self.next_start = end + 1
+            yield from logs
+
+
+def _chunk_filter(log_filter, start, end):
+    return {**log_filter, "fromBlock": hex(start), "toBlock": hex(end)}
+
+
+def _check_chunk(provider, log_filter, start, end, resp):
+    if "error" in resp:
+        message = str(resp["error"].get("message", resp["error"]))
+        if RANGE_TOO_LARGE.search(message):
+            raise RangeTooLarge(message)
+        raise Web3RPCError(message, rpc_response=resp)
+    logs = resp.get("result") or []
+    for log in logs:
+        if not start <= int(log["blockNumber"], 16) <= end:
+            raise IntegrityError(
+                "eth_getLogs",
+                [_chunk_filter(log_filter, start, end)],
+                provider.acceptance_threshold,
+                provider.provider,
+                reason="log from block {} is outside the requested range".format(
+                    int(log["blockNumber"], 16)
+                ),
+            )
+    return sorted(
+        logs, key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16))
+    )
+
+
+def _range_bounds(log_filter) -> list[Any]:
+    if log_filter.get("blockHash") is not None:
+        raise ValueError("Range splitting needs fromBlock and toBlock, not blockHash")
+    return [log_filter.get(key, "latest") for key in ("fromBlock", "toBlock")]
+
+
+def _resolved_number(resp) -> int:
+    return int(resp["result"]["number"], 16)
+
+
+def iter_logs(
+    provider: StatelessProvider,
+    log_filter: dict[str, Any],
+    max_concurrency: int = 4,
+    sizer: Optional[ChunkSizer] = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Yields the logs matching `log_filter` in block order, fetched in chunks.
+
+    Block tags are resolved once up front. Chunks are requested concurrently,
+    verified by the provider and checked to fall inside their range, and ranges
+    rejected as too large are split in two and fetched again. At most a few
+    completed chunks are held while an earlier one is still in flight.
+    """
+    sizer = sizer or ChunkSizer()
+    bounds = []
+    for block in _range_bounds(log_filter):
+        number = block_number(block)
+        if number is None:
+            number = _resolved_number(
+                provider.make_request("eth_getBlockByNumber", [block, False])
+            )
+        bounds.append(number)
+    scheduler = _RangeScheduler(bounds[0], bounds[1], sizer, max_concurrency * 2)
+
+    def fetch(chunk_start, chunk_end):
+        started = time.monotonic()
+        try:
+            resp = provider.make_request(
+                "eth_getLogs", [_chunk_filter(log_filter, chunk_start, chunk_end)]
+            )
+        except Timeout as error:
+            raise RangeTooLarge(str(error)) from error
+        logs = _check_chunk(provider, log_filter, chunk_start, chunk_end, resp)
+        return logs, time.monotonic() - started
+
+    executor = ThreadPoolExecutor(max_concurrency)
+    in_flight = {}
+    try:
+        while not scheduler.done:
+            while len(in_flight) < max_concurrency:
+                chunk = scheduler.next_range()
+                if chunk is None:
+                    break
+                in_flight[executor.submit(fetch, *chunk)] = chunk
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = in_flight.pop(future)
+                try:
+                    logs, latency = future.result()
+                except RangeTooLarge as error:
+                    scheduler.split(*chunk, error)
+                    continue
+                scheduler.complete(*chunk, logs, latency)
+            yield from scheduler.ready()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_logs(
+    provider: AsyncStatelessProvider,
+    log_filter: dict[str, Any],
+    max_concurrency: int = 4,
+    sizer: Optional[ChunkSizer] = None,
+) -> AsyncIterator[dict[str, Any]]:
+    sizer = sizer or ChunkSizer()
+    bounds = []
+    for block in _range_bounds(log_filter):
+        number = block_number(block)
+        if number is None:
+            number = _resolved_number(
+                await provider.make_request("eth_getBlockByNumber", [block, False])
+            )
+        bounds.append(number)
+    scheduler = _RangeScheduler(bounds[0], bounds[1], sizer, max_concurrency * 2)
+
+    async def fetch(chunk_start, chunk_end):
+        started = time.monotonic()
+        try:
+            resp = await provider.make_request(
+                "eth_getLogs", [_chunk_filter(log_filter, chunk_start, chunk_end)]
+            )
+        except asyncio.TimeoutError as error:
+            raise RangeTooLarge(str(error)) from error
+        logs = _check_chunk(provider, log_filter, chunk_start, chunk_end, resp)
+        return logs, time.monotonic() - started
+
+    in_flight = {}
+    try:
+        while not scheduler.done:
+            while len(in_flight) < max_concurrency:
+                chunk = scheduler.next_range()
+                if chunk is None:
+                    break
+                in_flight[asyncio.ensure_future(fetch(*chunk))] = chunk
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                chunk = in_flight.pop(task)
+                try:
+                    logs, latency = task.result()
+                except RangeTooLarge as error:
+                    scheduler.split(*chunk, error)
+                    continue
+                scheduler.complete(*chunk, logs, latency)
+            for log in scheduler.ready():
+                yield log
+    finally:
+        for task in in_flight:
+            task.cancel()
@@ -0,0 +1,156 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable
+
+BatchRequest = tuple[str, Any]
+
+
+def _split_batch_response(batch: list[BatchRequest], responses: Any) -> list[Any]:
+    # A single error object comes back when the bucket rejects the whole batch,
+    # every caller gets that error as its own response.
+    if not isinstance(responses, list):
+        return [responses] * len(batch)
+    if len(responses) != len(batch):
+        error = ValueError(
+            "Batch of {} requests got {} responses".format(len(batch), len(responses))
+        )
+        return [error] * len(batch)
+    return responses
+
+
+class _Batch:
+    __slots__ = ("items", "full")
+
+    def __init__(self, full):
+        self.items: list[tuple[str, Any, Any]] = []
+        self.full = full
+
+
+class MicroBatcher:
+    """
+    Gathers independent calls from many threads into JSON-RPC batches.
+
+    The first call to arrive opens a batch and waits up to `window` seconds, or
+    until `max_size` calls have joined, before sending it through `send_batch`.
+    Every caller then gets back its own response.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[list[BatchRequest]], Any],
+        window: float = 0.002,
+        max_size: int = 50,
+    ):
+        self.send_batch = send_batch
+        self.window = window
+        self.max_size = max_size
+        self._batch = None
+        self._condition = threading.Condition()
+
+    def submit(self, method: str, params: Any) -> Any:
+        future: Future = Future()
+        with self._condition:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _Batch(None)
+            batch.items.append((method, params, future))
+            if len(batch.items) >= self.max_size:
+                self._batch = None
+                self._condition.notify_all()
+
+            if leader:
+                self._condition.wait_for(lambda: self._batch is not batch, self.window)
+                if self._batch is batch:
+                    self._batch = None
+
+        if leader:
+            self._send(batch)
+        return future.result()
+
+    def _send(self, batch: _Batch) -> None:
+        requests = [(method, params) for method, params, _ in batch.items]
+        try:
+            responses = _split_batch_response(requests, self.send_batch(requests))
+        except BaseException as error:
+            for _, _, future in batch.items:
+                future.set_exception(error)
+            return
+        for (_, _, future), resp in zip(batch.items, responses):
+            if isinstance(resp, BaseException):
+                future.set_exception(resp)
+            else:
+                future.set_result(resp)
+
+
+class AsyncMicroBatcher:
+    """
+    The coroutine counterpart of MicroBatcher, batches are kept per event loop.
+
+    Each batch is waited on and sent by a task of its own rather than by the
+    first caller, so cancelling any caller only cancels that caller.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[list[BatchRequest]], Awaitable[Any]],
+        window: float = 0.002,
+        max_size: int = 50,
+    ):
+        self.send_batch = send_batch
+        self.window = window
+        self.max_size = max_size
+        self._batches: dict[int, _Batch] = {}
+        self._flushes: set[asyncio.Task] = set()
+
+    async def submit(self, method: str, params: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._batches.get(id(loop))
+        if batch is None:
+            batch = self._batches[id(loop)] = _Batch(asyncio.Event())
+            flush = loop.create_task(self._flush(loop, batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+        batch.items.append((method, params, future))
+        if len(batch.items) >= self.max_size:
+            self._close(loop, batch)
+        return await future
+
+    async def _flush(self, loop, batch: _Batch) -> None:
+        try:
+            await asyncio.wait_for(batch.full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._close(loop, batch)
+        await self._send(batch)
+
+    def _close(self, loop, batch: _Batch) -> None:
+        if self._batches.get(id(loop)) is batch:
+            del self._batches[id(loop)]
+        batch.full.set()
+
+    async def _send(self, batch: _Batch) -> None:
+        # Calls cancelled while the batch was open are left out.
+        items = [item for item in batch.items if not item[2].done()]
+        if not items:
+            return
+        requests = [(method, params) for method, params, _ in items]
+        try:
+            responses = _split_batch_response(requests, await self.send_batch(requests))
+        except BaseException as error:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(error)
+            if isinstance(error, asyncio.CancelledError):
+                raise
+            return
+        for (_, _, future), resp in zip(items, responses):
+            if future.done():
+                continue
+            if isinstance(resp, BaseException):
+                future.set_exception(resp)
+            else:
+                future.set_result(resp)
@@ -0,0 +1,183 @@
+import abc
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .encoding import EncodedResult, make_request_key
+from .methods import (
+    BLOCK_PARAM_INDEX,
+    NON_IDEMPOTENT_METHODS,
+    block_number,
+    block_params,
+    depends_on_head,
+)
+
+# Answers that never change for a given chain.
+STATIC_METHODS = frozenset({"eth_chainId", "net_version"})
+
+# Lookups by hash, final once the block they resolve to is final.
+HASH_KEYED_METHODS = frozenset(
+    {
+        "eth_getBlockByHash",
+        "eth_getTransactionByHash",
+        "eth_getTransactionReceipt",
+        "eth_getTransactionByBlockHashAndIndex",
+        "eth_getUncleByBlockHashAndIndex",
+    }
+)
+
+
+def _result_block_number(result: Any) -> Optional[int]:
+    if not isinstance(result, dict):
+        return None
+    number = result.get("blockNumber", result.get("number"))
+    return int(number, 16) if isinstance(number, str) else None
+
+
+def request_block_number(method: str, params: Any, result: Any) -> Optional[int]:
+    """
+    The newest block a response depends on, or None when it can't be pinned to one.
+    """
+    if method in HASH_KEYED_METHODS:
+        return _result_block_number(result)
+    if method not in BLOCK_PARAM_INDEX and method != "eth_getLogs":
+        return None
+    numbers = [block_number(block) for block in block_params(method, params)]
+    if not numbers or None in numbers:
+        return None
+    return max(numbers)
+
+
+def may_be_cached(method: str, params: Any) -> bool:
+    if method in STATIC_METHODS or method in HASH_KEYED_METHODS:
+        return True
+    if method in NON_IDEMPOTENT_METHODS or depends_on_head(method, params):
+        return False
+    return method in BLOCK_PARAM_INDEX or method == "eth_getLogs"
+
+
+class BaseResponseCache(abc.ABC):
+    """
+    Holds verified responses that can no longer change.
+
+    A response is stored when its method is static, or when every block it
+    depends on is at least `finality_depth` blocks behind the highest head the
+    provider has seen. Requests following `latest` or `pending` are never
+    stored. Backends implement `get` and `set`.
+    """
+
+    def __init__(self, finality_depth: int = 64, head_max_age: float = 12.0):
+        self.finality_depth = finality_depth
+        self.head_max_age = head_max_age
+        self.head: Optional[int] = None
+        self.head_updated_at = 0.0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0}
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        """Returns the entry stored under `key`, or None."""
+
+    @abc.abstractmethod
+    def set(self, key: str, entry: dict[str, Any], encoded: EncodedResult) -> None:
+        """Stores `entry`, `encoded` holds the canonical encoding of its result."""
+
+    def observe_head(self, number: int) -> None:
+        if self.head is None or number >= self.head:
+            self.head = number
+        self.head_updated_at = time.monotonic()
+
+    def head_is_stale(self) -> bool:
+        return (
+            self.head is None
+            or time.monotonic() - self.head_updated_at > self.head_max_age
+        )
+
+    def lookup(self, method: str, params: Any) -> Optional[dict[str, Any]]:
+        if not may_be_cached(method, params):
+            return None
+        entry = self.get(make_request_key(method, params))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return {"jsonrpc": "2.0", "id": 0, **entry}
+
+    def is_candidate(self, method: str, params: Any, resp: dict[str, Any]) -> bool:
+        """Whether the response could be stored given a fresh enough head."""
+        if "error" in resp or resp.get("result") is None:
+            return False
+        return may_be_cached(method, params)
+
+    def is_final(self, method: str, params: Any, result: Any) -> bool:
+        if method in STATIC_METHODS:
+            return True
+        number = request_block_number(method, params, result)
+        if number is None or self.head is None:
+            return False
+        return number <= self.head - self.finality_depth
+
+    def store(
+        self,
+        method: str,
+        params: Any,
+        resp: dict[str, Any],
+        encoded: Optional[EncodedResult] = None,
+    ) -> bool:
+        if not self.is_candidate(method, params, resp):
+            return False
+        if not self.is_final(method, params, resp["result"]):
+            return False
+        encoded = encoded or EncodedResult(resp["result"])
+        entry = {"result": resp["result"], "attestations": resp.get("attestations")}
+        self.set(make_request_key(method, params), entry, encoded)
+        self.stats["stores"] += 1
+        return True
+
+
+class ResponseCache(BaseResponseCache):
+    """In-process LRU bounded both by entry count and by encoded result size."""
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 256 * 1024 * 1024,
+        finality_depth: int = 64,
+        head_max_age: float = 12.0,
+    ):
+        super().__init__(finality_depth, head_max_age)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[dict[str, Any], int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key: str, entry: dict[str, Any], encoded: EncodedResult) -> None:
+        size = len(encoded)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._entries[key] = (entry, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time, concurrent callers with the same key
+    wait for the leading call and share its result or exception.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # The key is released whatever happened to the leader, a failed call
+            # must not pin its future or block the next attempt.
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    The coroutine counterpart of SingleFlight, keyed per event loop.
+
+    The call runs in a task of its own that every caller waits on, so a caller
+    that is cancelled, the first one included, leaves the others waiting on it.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        key = (id(loop), key)
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = loop.create_task(fn())
+            task.add_done_callback(lambda task: self._release(key, task))
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        del self._calls[key]
+        # Mark the exception as retrieved in case every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._calls)
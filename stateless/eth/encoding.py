@@ -0,0 +1,162 @@
+import hashlib
+import json
+from typing import Any, Callable, Iterable, Optional
+
+import ujson
+from eth_hash.auto import keccak
+from web3._utils.encoding import Web3JsonEncoder
+
+DEFAULT_HASH_ALGO = "sha256"
+
+HASH_ALGORITHMS: dict[str, Callable[[bytes], bytes]] = {
+    "sha256": lambda data: hashlib.sha256(data).digest(),
+    "sha384": lambda data: hashlib.sha384(data).digest(),
+    "sha512": lambda data: hashlib.sha512(data).digest(),
+    "sha3256": lambda data: hashlib.sha3_256(data).digest(),
+    "keccak": keccak,
+    "keccak256": keccak,
+}
+
+# Incremental counterparts of HASH_ALGORITHMS, for results hashed as they stream in.
+HASH_CONSTRUCTORS: dict[str, Callable[[], Any]] = {
+    "sha256": hashlib.sha256,
+    "sha384": hashlib.sha384,
+    "sha512": hashlib.sha512,
+    "sha3256": hashlib.sha3_256,
+    "keccak": lambda: keccak.new(b""),
+    "keccak256": lambda: keccak.new(b""),
+}
+
+
+def normalize_hash_algo(hash_algo: Optional[str]) -> str:
+    return (hash_algo or DEFAULT_HASH_ALGO).lower().replace("-", "").replace("_", "")
+
+
+def normalize_digest(digest: str) -> str:
+    digest = digest.lower()
+    return digest[2:] if digest.startswith("0x") else digest
+
+
+def canonical_json(obj: Any) -> bytes:
+    # Compact separators and sorted keys, serialized by ujson since results such
+    # as full blocks or eth_getLogs can run into the hundreds of megabytes.
+    return ujson.dumps(
+        obj, sort_keys=True, ensure_ascii=False, escape_forward_slashes=False
+    ).encode("utf-8")
+
+
+def canonical_params(params: Any) -> str:
+    # Request params may hold HexBytes or AttributeDicts, which ujson can't encode.
+    return json.dumps(
+        params or [], cls=Web3JsonEncoder, sort_keys=True, separators=(",", ":")
+    )
+
+
+def make_request_key(method: str, params: Any) -> str:
+    return "{}:{}".format(method, canonical_params(params))
+
+
+class EncodedResult:
+    """
+    The canonical encoding of an RPC result, computed at most once and shared by
+    every consumer that needs its bytes or digests.
+    """
+
+    __slots__ = ("result", "_encoded", "_digests")
+
+    def __init__(self, result: Any):
+        self.result = result
+        self._encoded: Optional[bytes] = None
+        self._digests: dict[str, str] = {}
+
+    @property
+    def encoded(self) -> bytes:
+        if self._encoded is None:
+            self._encoded = canonical_json(self.result)
+        return self._encoded
+
+    def __len__(self) -> int:
+        return len(self.encoded)
+
+    def digest(self, hash_algo: Optional[str] = None) -> Optional[str]:
+        """Hex digest of the canonical encoding, None for unsupported algorithms."""
+        name = normalize_hash_algo(hash_algo)
+        digest = self._digests.get(name)
+        if digest is None:
+            hash_func = HASH_ALGORITHMS.get(name)
+            if hash_func is None:
+                return None
+            digest = self._digests[name] = hash_func(self.encoded).hex()
+        return digest
+
+    def matches(self, msg: str, hash_algo: Optional[str] = None) -> bool:
+        digest = self.digest(hash_algo)
+        return digest is not None and digest == normalize_digest(msg)
+
+
+class IncrementalEncodedList:
+    """
+    Digests of the canonical encoding of a list result fed one item at a time.
+
+    The canonical encoding of a list is its items' encodings joined by commas
+    inside brackets, so the digests match EncodedResult's for the whole list
+    without ever holding it. A list nested in the result is hashed between the
+    encoding of the rest of the result, `prefix` and the suffix given to
+    `finish`.
+    """
+
+    __slots__ = ("_hashers", "_digests", "prefix", "size", "count")
+
+    def __init__(self, hash_algos: Iterable[str], prefix: bytes = b""):
+        self._hashers = {}
+        for hash_algo in hash_algos:
+            name = normalize_hash_algo(hash_algo)
+            if name in HASH_CONSTRUCTORS:
+                self._hashers[name] = HASH_CONSTRUCTORS[name]()
+        self._digests: Optional[dict[str, str]] = None
+        self.prefix = prefix
+        self.size = len(prefix) + 1
+        self.count = 0
+        self._update(prefix + b"[")
+
+    @property
+    def hashing(self) -> bool:
+        return bool(self._hashers)
+
+    def _update(self, data: bytes) -> None:
+        for hasher in self._hashers.values():
+            hasher.update(data)
+
+    def update(self, item: Any) -> bytes:
+        """Feeds the next item and returns its canonical encoding."""
+        encoded = canonical_json(item)
+        self.add(encoded)
+        return encoded
+
+    def add(self, encoded: bytes) -> None:
+        """Feeds the canonical encoding of the next item."""
+        if self.count:
+            self._update(b",")
+            self.size += 1
+        self._update(encoded)
+        self.size += len(encoded)
+        self.count += 1
+
+    def finish(self, suffix: bytes = b"") -> None:
+        if self._digests is None:
+            self._update(b"]" + suffix)
+            self.size += 1 + len(suffix)
+            self._digests = {
+                name: hasher.digest().hex() for name, hasher in self._hashers.items()
+            }
+
+    def __len__(self) -> int:
+        return self.size
+
+    def digest(self, hash_algo: Optional[str] = None) -> Optional[str]:
+        self.finish()
+        return self._digests.get(normalize_hash_algo(hash_algo))
+
+    def matches(self, msg: str, hash_algo: Optional[str] = None) -> bool:
+        digest = self.digest(hash_algo)
+        return digest is not None and digest == normalize_digest(msg)
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+from web3.providers.base import BaseProvider
+
+from .encoding import make_request_key
+from .utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def _bounded(value: Any, max_length: int) -> Any:
+    # Long strings, such as call data or return data, are cut down to a prefix.
+    if isinstance(value, str) and len(value) > max_length:
+        return "{}... ({} chars)".format(value[:max_length], len(value))
+    if isinstance(value, dict):
+        return {key: _bounded(item, max_length) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_bounded(item, max_length) for item in value]
+    return value
+
+
+def _summary(value: Any, max_length: int) -> Any:
+    # Containers are summarized rather than copied into a diff entry.
+    if isinstance(value, dict):
+        return "{{{} keys}}".format(len(value))
+    if isinstance(value, list):
+        return "[{} items]".format(len(value))
+    return _bounded(value, max_length)
+
+
+def structural_diff(
+    expected: Any,
+    actual: Any,
+    max_entries: int = 50,
+    max_length: int = 200,
+) -> tuple[list[dict[str, Any]], bool]:
+    """
+    Lists the paths at which `actual` differs from `expected`, such as
+    `$.logs[3].data`, with both values cut down to `max_length` characters.
+    Returns the differences and whether they were cut off at `max_entries`.
+    """
+    entries: list[dict[str, Any]] = []
+    stack = [("$", expected, actual)]
+    while stack:
+        path, left, right = stack.pop()
+        if left == right:
+            continue
+        if len(entries) >= max_entries:
+            return entries, True
+        if isinstance(left, dict) and isinstance(right, dict):
+            keys = list(left) + [key for key in right if key not in left]
+            for key in reversed(keys):
+                stack.append(("{}.{}".format(path, key), left.get(key), right.get(key)))
+            continue
+        if isinstance(left, list) and isinstance(right, list):
+            if len(left) != len(right):
+                entries.append(
+                    {
+                        "path": "{}.length".format(path),
+                        "expected": len(left),
+                        "actual": len(right),
+                    }
+                )
+            for index in reversed(range(min(len(left), len(right)))):
+                stack.append(("{}[{}]".format(path, index), left[index], right[index]))
+            continue
+        entries.append(
+            {
+                "path": path,
+                "expected": _summary(left, max_length),
+                "actual": _summary(right, max_length),
+            }
+        )
+    return entries, False
+
+
+class ReportStore:
+    """
+    Appends reports as JSON lines to `path`. Once the file would grow past
+    `max_bytes` it is rotated to `path.1`, `path.1` to `path.2` and so on,
+    keeping `backup_count` old files, like logging's RotatingFileHandler.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10_000_000, backup_count: int = 5):
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    def _rotate(self) -> None:
+        for index in range(self.backup_count - 1, 0, -1):
+            source = "{}.{}".format(self.path, index)
+            if os.path.exists(source):
+                os.replace(source, "{}.{}".format(self.path, index + 1))
+        if self.backup_count > 0:
+            os.replace(self.path, "{}.1".format(self.path))
+        else:
+            os.remove(self.path)
+
+    def write(self, report: dict[str, Any]) -> None:
+        line = (json.dumps(report, default=str) + "\n").encode()
+        with self._lock:
+            if (
+                os.path.exists(self.path)
+                and os.path.getsize(self.path) + len(line) > self.max_bytes
+            ):
+                self._rotate()
+            with open(self.path, "ab") as file:
+                file.write(line)
+
+    def read(self) -> Iterator[dict[str, Any]]:
+        """Yields stored reports, oldest first."""
+        paths = [
+            "{}.{}".format(self.path, index)
+            for index in range(self.backup_count, 0, -1)
+        ] + [self.path]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as file:
+                for line in file:
+                    yield json.loads(line)
+
+
+class Forensics:
+    """
+    Investigates integrity failures in the background.
+
+    When attestations for a request disagree, the request is sent again to each
+    identity found in `identities`, a mapping from provider identity to a
+    provider for that identity's own endpoint. Each result is compared with the
+    one the bucket returned, and a report with a size-bounded structural diff
+    per identity is written to `store`.
+
+    Failures are queued without blocking the caller and dropped when the queue
+    is full. A request that was investigated is not investigated again until it
+    falls out of the last `dedupe_size` requests seen.
+    """
+
+    def __init__(
+        self,
+        store: ReportStore,
+        identities: dict[str, BaseProvider],
+        queue_size: int = 100,
+        dedupe_size: int = 1024,
+        max_entries: int = 50,
+        max_length: int = 200,
+    ):
+        self.store = store
+        self.identities = identities
+        self.max_entries = max_entries
+        self.max_length = max_length
+        self.stats = {"reported": 0, "dropped": 0, "duplicates": 0, "errors": 0}
+        self._seen = LRUCache(dedupe_size)
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def should_investigate(error) -> bool:
+        quorum = error.quorum
+        return quorum is not None and bool(
+            quorum.disagreeing or quorum.result_digest is not None
+        )
+
+    def submit(self, error, result: Any) -> bool:
+        if not self.should_investigate(error):
+            return False
+        key = make_request_key(error.method, error.params)
+        if key in self._seen:
+            self._count("duplicates")
+            return False
+        self._seen.set(key, True)
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((error, result, time.time()))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        return True
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def join(self) -> None:
+        self._queue.join()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="integrity-forensics", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            error, result, failed_at = self._queue.get()
+            try:
+                self.store.write(self.investigate(error, result, failed_at))
+                self._count("reported")
+            except Exception as failure:
+                self._count("errors")
+                logger.warning("Integrity forensics failed: %s", failure)
+            finally:
+                self._queue.task_done()
+
+    def _attested(self, quorum) -> dict[str, Optional[str]]:
+        attested: dict[str, Optional[str]] = {
+            identity: msg
+            for msg, identities in quorum.groups.items()
+            for identity in identities
+        }
+        attested.update((identity, None) for identity in quorum.invalid)
+        return attested
+
+    def _refetch(self, provider, method, params, result) -> dict[str, Any]:
+        try:
+            resp = provider.make_request(method, params)
+        except Exception as error:
+            return {"error": str(error)}
+        if "error" in resp:
+            return {"error": _bounded(resp["error"], self.max_length)}
+        diff, truncated = structural_diff(
+            result, resp.get("result"), self.max_entries, self.max_length
+        )
+        return {"diff": diff, "truncated": truncated}
+
+    def investigate(
+        self, error, result: Any, failed_at: Optional[float] = None
+    ) -> dict[str, Any]:
+        """Builds the report for one IntegrityError."""
+        quorum = error.quorum
+        identities = {}
+        for identity, msg in self._attested(quorum).items():
+            report: dict[str, Any] = {"msg": msg, "invalid": msg is None}
+            provider = self.identities.get(identity)
+            if provider is not None:
+                report.update(
+                    self._refetch(provider, error.method, error.params, result)
+                )
+            identities[identity] = report
+        return {
+            "failed_at": failed_at if failed_at is not None else time.time(),
+            "method": error.method,
+            "params": _bounded(error.params, self.max_length),
+            "batch_index": error.batch_index,
+            "threshold": error.acceptance,
+            "accepted_msg": quorum.msg,
+            "result_digest": quorum.result_digest,
+            "identities": identities,
+        }
@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Collection, Optional
+
+import requests
+
+from .types import NodeHealth
+
+logger = logging.getLogger(__name__)
+
+
+def health_url(url: str) -> str:
+    return url if url.endswith("/health") else url.rstrip("/") + "/health"
+
+
+def fetch_health(url: str, timeout: float = 5.0) -> list[NodeHealth]:
+    response = requests.post(health_url(url), timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+@dataclass
+class BucketHealth:
+    url: str
+    nodes: list[NodeHealth] = field(default_factory=list)
+    # Smoothed round trip from this client, in seconds.
+    latency: Optional[float] = None
+    checked_at: float = 0.0
+    failed: bool = False
+
+    @property
+    def height(self) -> Optional[int]:
+        """The height of the bucket's slowest healthy node."""
+        heights = [node["height"] for node in self.nodes if node["height"] > 0]
+        return min(heights) if heights else None
+
+    @property
+    def tip(self) -> Optional[int]:
+        heights = [node["height"] for node in self.nodes if node["height"] > 0]
+        return max(heights) if heights else None
+
+    @property
+    def available(self) -> bool:
+        return not self.failed and self.height is not None
+
+
+class HealthMonitor:
+    """
+    Tracks the health of several bucket URLs serving the same chain.
+
+    Every `interval` seconds a background thread POSTs to each bucket's
+    `/health` endpoint. `select` returns the bucket with the lowest smoothed
+    round trip among those whose healthy nodes are all within `max_lag` blocks
+    of the highest height seen across buckets, falling back to the first URL
+    until a bucket has reported. Round trips of regular requests feed the same
+    average through `record`, and a bucket whose request failed is skipped
+    until its next successful health check.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        interval: float = 10.0,
+        max_lag: int = 5,
+        timeout: float = 5.0,
+        smoothing: float = 0.3,
+        fetch: Optional[Callable[[str], list[NodeHealth]]] = None,
+    ):
+        if not urls:
+            raise ValueError("At least one bucket URL is required")
+        self.urls = list(urls)
+        self.interval = interval
+        self.max_lag = max_lag
+        self.timeout = timeout
+        self.smoothing = smoothing
+        self.fetch = fetch or (lambda url: fetch_health(url, self.timeout))
+        self.buckets = {url: BucketHealth(url) for url in self.urls}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def record(self, url: str, latency: float) -> None:
+        with self._lock:
+            bucket = self.buckets.get(url)
+            if bucket is None:
+                return
+            if bucket.latency is None:
+                bucket.latency = latency
+            else:
+                bucket.latency += self.smoothing * (latency - bucket.latency)
+
+    def mark_failed(self, url: str) -> None:
+        with self._lock:
+            if url in self.buckets:
+                self.buckets[url].failed = True
+
+    def check(self, url: str) -> None:
+        started = time.monotonic()
+        try:
+            nodes = self.fetch(url)
+        except Exception as error:
+            logger.warning("Health check of %s failed: %s", url, error)
+            self.mark_failed(url)
+            return
+        self.record(url, time.monotonic() - started)
+        with self._lock:
+            bucket = self.buckets[url]
+            bucket.nodes = nodes
+            bucket.checked_at = time.time()
+            bucket.failed = False
+
+    def refresh(self) -> None:
+        for url in self.urls:
+            self.check(url)
+
+    def select(self, exclude: Collection[str] = ()) -> str:
+        self.start()
+        with self._lock:
+            available = [
+                (index, bucket)
+                for index, bucket in enumerate(self.buckets.values())
+                if bucket.available and bucket.url not in exclude
+            ]
+            if not available:
+                return next(
+                    (url for url in self.urls if url not in exclude), self.urls[0]
+                )
+            tip = max(bucket.tip for _, bucket in available)
+            synced = [
+                (index, bucket)
+                for index, bucket in available
+                if bucket.height >= tip - self.max_lag
+            ]
+            if not synced:
+                # Every bucket has a lagging node, take the least behind.
+                return max(available, key=lambda item: item[1].height)[1].url
+            return min(
+                synced,
+                key=lambda item: (
+                    item[1].latency if item[1].latency is not None else float("inf"),
+                    item[0],
+                ),
+            )[1].url
+
+    @property
+    def started(self) -> bool:
+        return self._worker is not None
+
+    def start(self) -> None:
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(
+                target=self._run, name="bucket-health", daemon=True
+            )
+        # The first round runs inline so the first request already has health
+        # data to go by.
+        self.refresh()
+        self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.refresh()
+
+    def close(self) -> None:
+        self._stopped.set()
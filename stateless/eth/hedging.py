@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+# Set while a hedged attempt runs, requests it makes in turn aren't hedged.
+_in_hedge: ContextVar[bool] = ContextVar("in_hedge", default=False)
+
+
+class HedgePolicy:
+    """
+    Decides when a request still waiting on its primary bucket is sent again to
+    a secondary one, and counts how often that happens and pays off.
+
+    The delay is the `percentile` of the primary bucket's last `window`
+    successful round trips, `initial_delay` until `min_samples` have been seen,
+    and never below `min_delay`.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        window: int = 200,
+        min_samples: int = 20,
+        initial_delay: float = 0.5,
+        min_delay: float = 0.01,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+        self._latencies: defaultdict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self._lock = threading.Lock()
+
+    def record(self, url: str, latency: float) -> None:
+        with self._lock:
+            self._latencies[url].append(latency)
+
+    def delay(self, url: str) -> float:
+        with self._lock:
+            latencies = sorted(self._latencies[url])
+        if len(latencies) < self.min_samples:
+            return max(self.min_delay, self.initial_delay)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile))
+        return max(self.min_delay, latencies[index])
+
+    def count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    @property
+    def hedge_rate(self) -> float:
+        return (
+            self.stats["hedged"] / self.stats["requests"]
+            if self.stats["requests"]
+            else 0.0
+        )
+
+    @property
+    def win_rate(self) -> float:
+        return (
+            self.stats["hedge_wins"] / self.stats["hedged"]
+            if self.stats["hedged"]
+            else 0.0
+        )
+
+
+class HedgeExecutor:
+    """
+    The threads hedged attempts run on. Work is refused rather than queued once
+    all `max_workers` are busy, so a burst of requests is never stuck behind
+    the pool, it just goes unhedged.
+    """
+
+    def __init__(self, max_workers: int = 64):
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="hedge")
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def try_submit(self, fn: Callable[..., Any], *args) -> Optional[Future]:
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._pool.submit(_run_attempt, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait)
+
+
+def _run_attempt(fn: Callable[..., Any], *args) -> Any:
+    token = _in_hedge.set(True)
+    try:
+        return fn(*args)
+    finally:
+        _in_hedge.reset(token)
+
+
+def _timed(policy: HedgePolicy, attempt: Callable[[str], Any], url: str) -> Any:
+    started = time.monotonic()
+    result = attempt(url)
+    policy.record(url, time.monotonic() - started)
+    return result
+
+
+def hedged_call(
+    policy: HedgePolicy,
+    executor: HedgeExecutor,
+    attempt: Callable[[str], Any],
+    primary: str,
+    secondary: str,
+) -> Any:
+    """
+    Runs `attempt(primary)`, and `attempt(secondary)` as well if the primary
+    hasn't finished within the policy's delay. The first attempt to succeed
+    wins and the other is abandoned. Fails with the primary's error when both do.
+
+    Requests made from within an attempt, and requests arriving while the
+    executor is busy, run `attempt(primary)` on the calling thread instead, so
+    attempts never wait on the executor themselves.
+    """
+    if _in_hedge.get():
+        return attempt(primary)
+    first = executor.try_submit(_timed, policy, attempt, primary)
+    if first is None:
+        return attempt(primary)
+    policy.count("requests")
+    futures: dict[Future, str] = {first: "primary"}
+    done, _ = wait(futures, timeout=policy.delay(primary))
+    if not done:
+        second = executor.try_submit(_timed, policy, attempt, secondary)
+        if second is not None:
+            policy.count("hedged")
+            futures[second] = "secondary"
+
+    pending = set(futures)
+    errors: dict[str, BaseException] = {}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is not None:
+                errors[futures[future]] = error
+                continue
+            for other in pending:
+                other.cancel()
+            if futures[future] == "secondary":
+                policy.count("hedge_wins")
+            return future.result()
+    raise errors.get("primary") or errors["secondary"]
+
+
+async def async_hedged_call(
+    policy: HedgePolicy,
+    attempt: Callable[[str], Awaitable[Any]],
+    primary: str,
+    secondary: str,
+) -> Any:
+    """The coroutine counterpart of hedged_call, the losing attempt is cancelled."""
+
+    async def timed(url):
+        started = time.monotonic()
+        result = await attempt(url)
+        policy.record(url, time.monotonic() - started)
+        return result
+
+    policy.count("requests")
+    tasks = {asyncio.ensure_future(timed(primary)): "primary"}
+    pending = set(tasks)
+    errors: dict[str, BaseException] = {}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=policy.delay(primary))
+        if not done:
+            policy.count("hedged")
+            hedge = asyncio.ensure_future(timed(secondary))
+            tasks[hedge] = "secondary"
+            pending.add(hedge)
+        while True:
+            for task in done:
+                if task.exception() is not None:
+                    errors[tasks[task]] = task.exception()
+                    continue
+                if tasks[task] == "secondary":
+                    policy.count("hedge_wins")
+                return task.result()
+            if not pending:
+                break
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+    finally:
+        for task in pending:
+            task.cancel()
+    raise errors.get("primary") or errors["secondary"]
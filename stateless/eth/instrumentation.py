@@ -0,0 +1,313 @@
+import bisect
+import math
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+# The method of the request being made, for hooks deep inside web3 such as
+# response decoding that don't get to see it.
+current_method: ContextVar[str] = ContextVar("current_method", default="unknown")
+
+REQUESTS = "stateless_requests_total"
+REQUEST_SECONDS = "stateless_request_seconds"
+REQUEST_BYTES = "stateless_request_bytes"
+RESPONSE_BYTES = "stateless_response_bytes"
+DECODE_SECONDS = "stateless_decode_seconds"
+VERIFY_SECONDS = "stateless_verify_seconds"
+ATTESTATIONS = "stateless_attestations_total"
+
+SECONDS_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+BYTES_BUCKETS = tuple(4**exponent for exponent in range(4, 15))
+
+Labels = dict[str, str]
+
+
+class Sink:
+    """Receives measurements from an Instrumentation, both methods are no-ops."""
+
+    def observe(self, name: str, value: float, labels: Labels) -> None:
+        pass
+
+    def increment(self, name: str, value: float, labels: Labels) -> None:
+        pass
+
+
+class Instrumentation:
+    """
+    Measurements taken by a provider, fanned out to `sinks`.
+
+    Providers only call into this when given one, so instrumentation costs
+    nothing but an attribute check when disabled.
+    """
+
+    def __init__(self, *sinks: Sink):
+        self.sinks = sinks
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        for sink in self.sinks:
+            sink.observe(name, value, labels)
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        for sink in self.sinks:
+            sink.increment(name, value, labels)
+
+    def _finish(self, method, started, outcome) -> None:
+        self.observe(REQUEST_SECONDS, time.perf_counter() - started, method=method)
+        self.increment(REQUESTS, method=method, outcome=outcome)
+
+    def track(self, method: str, fn: Callable[..., Any], *args) -> Any:
+        token = current_method.set(method)
+        started = time.perf_counter()
+        outcome = "exception"
+        try:
+            resp = fn(*args)
+            outcome = _outcome(resp)
+            return resp
+        except Exception as error:
+            outcome = type(error).__name__
+            raise
+        finally:
+            self._finish(method, started, outcome)
+            current_method.reset(token)
+
+    async def track_async(
+        self, method: str, fn: Callable[..., Awaitable[Any]], *args
+    ) -> Any:
+        token = current_method.set(method)
+        started = time.perf_counter()
+        outcome = "exception"
+        try:
+            resp = await fn(*args)
+            outcome = _outcome(resp)
+            return resp
+        except Exception as error:
+            outcome = type(error).__name__
+            raise
+        finally:
+            self._finish(method, started, outcome)
+            current_method.reset(token)
+
+    def bytes_sent(self, method: str, size: int) -> None:
+        self.observe(REQUEST_BYTES, size, method=method)
+
+    def decoded(self, response: Any, size: int, seconds: float) -> None:
+        method = "batch" if isinstance(response, list) else current_method.get()
+        self.observe(RESPONSE_BYTES, size, method=method)
+        self.observe(DECODE_SECONDS, seconds, method=method)
+
+    def verified(self, method: str, seconds: float) -> None:
+        self.observe(VERIFY_SECONDS, seconds, method=method)
+
+    def attestations(self, method: str, quorum) -> None:
+        invalid = set(quorum.invalid)
+        for identity in quorum.agreeing:
+            self.increment(ATTESTATIONS, identity=identity, outcome="agreed")
+        for identity in quorum.disagreeing:
+            outcome = "invalid" if identity in invalid else "disagreed"
+            self.increment(ATTESTATIONS, identity=identity, outcome=outcome)
+
+
+def _outcome(resp) -> str:
+    return "rpc_error" if isinstance(resp, dict) and "error" in resp else "ok"
+
+
+def _key(name: str, labels: Labels) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+class Histogram:
+    """
+    Log-linear histogram in the style of HdrHistogram. Each power of two is
+    split into 2**`precision` buckets, so any percentile is reported within a
+    relative error of 2**-(precision + 1) in constant memory per magnitude.
+    """
+
+    def __init__(self, precision: int = 5):
+        self.sub_buckets = 2**precision
+        self.counts: dict[tuple[int, int], int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket(self, value: float) -> tuple[int, int]:
+        if value <= 0:
+            return (-1075, 0)
+        mantissa, exponent = math.frexp(value)
+        return (exponent, int((mantissa - 0.5) * 2 * self.sub_buckets))
+
+    def _value(self, bucket: tuple[int, int]) -> float:
+        exponent, sub_bucket = bucket
+        if exponent == -1075:
+            return 0.0
+        return math.ldexp(0.5 + (sub_bucket + 0.5) / (2 * self.sub_buckets), exponent)
+
+    def record(self, value: float) -> None:
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * percentile / 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(max(self._value(bucket), self.min), self.max)
+        return self.max
+
+
+class HistogramSink(Sink):
+    """Keeps an in-memory Histogram per metric and label set, and counters."""
+
+    def __init__(self, precision: int = 5):
+        self.precision = precision
+        self.histograms: dict[tuple, Histogram] = {}
+        self.counters: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, labels: Labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.precision)
+            histogram.record(value)
+
+    def increment(self, name: str, value: float, labels: Labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        return self.histograms.get(_key(name, labels))
+
+    def counter(self, name: str, **labels: str) -> float:
+        return self.counters.get(_key(name, labels), 0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{{{}}}".format(
+        ",".join('{}="{}"'.format(name, _escape(str(value))) for name, value in labels)
+    )
+
+
+class PrometheusSink(Sink):
+    """
+    Cumulative Prometheus histograms and counters, rendered in the text
+    exposition format by `render` for a /metrics endpoint.
+    """
+
+    def __init__(self, seconds_buckets=SECONDS_BUCKETS, bytes_buckets=BYTES_BUCKETS):
+        self.seconds_buckets = seconds_buckets
+        self.bytes_buckets = bytes_buckets
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms: dict[tuple, list] = {}
+        self.counters: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _buckets(self, name: str) -> tuple:
+        return self.bytes_buckets if name.endswith("_bytes") else self.seconds_buckets
+
+    def observe(self, name: str, value: float, labels: Labels) -> None:
+        buckets = self._buckets(name)
+        key = _key(name, labels)
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(buckets) + 2)
+            series[bisect.bisect_left(buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def increment(self, name: str, value: float, labels: Labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        typed = set()
+        for (name, labels), series in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE {} histogram".format(name))
+            cumulative = 0
+            for bound, count in zip(self._buckets(name) + ("+Inf",), series[:-2]):
+                cumulative += count
+                lines.append(
+                    "{}_bucket{} {}".format(
+                        name, _format_labels(labels + (("le", str(bound)),)), cumulative
+                    )
+                )
+            lines.append("{}_sum{} {}".format(name, _format_labels(labels), series[-2]))
+            lines.append(
+                "{}_count{} {}".format(name, _format_labels(labels), series[-1])
+            )
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE {} counter".format(name))
+            lines.append("{}{} {}".format(name, _format_labels(labels), value))
+        return "\n".join(lines) + "\n"
+
+
+class OpenTelemetrySink(Sink):
+    """
+    Forwards measurements to an OpenTelemetry `meter`, such as the one from
+    `opentelemetry.metrics.get_meter`. Instruments are created on first use.
+    """
+
+    def __init__(self, meter):
+        self.meter = meter
+        self._instruments: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _instrument(self, name: str, create: Callable[..., Any]):
+        instrument = self._instruments.get(name)
+        if instrument is None:
+            with self._lock:
+                instrument = self._instruments.get(name)
+                if instrument is None:
+                    unit = "By" if name.endswith("_bytes") else "s"
+                    if name.endswith("_total"):
+                        unit = "1"
+                    instrument = self._instruments[name] = create(name, unit=unit)
+        return instrument
+
+    def observe(self, name: str, value: float, labels: Labels) -> None:
+        self._instrument(name, self.meter.create_histogram).record(
+            value, attributes=labels
+        )
+
+    def increment(self, name: str, value: float, labels: Labels) -> None:
+        self._instrument(name, self.meter.create_counter).add(value, attributes=labels)
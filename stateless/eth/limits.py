@@ -0,0 +1,291 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterator, Optional
+
+import requests
+
+# HTTP statuses a bucket answers with when it's overloaded.
+OVERLOAD_STATUSES = frozenset({429, 502, 503, 504})
+
+
+def is_overload(error: BaseException) -> bool:
+    """Whether a failed request means the bucket is overloaded."""
+    if isinstance(error, (requests.Timeout, asyncio.TimeoutError, TimeoutError)):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    return status in OVERLOAD_STATUSES
+
+
+class LimitState:
+    """The state of one AdaptiveLimiter, private to the current process."""
+
+    shared = False
+
+    def __init__(self, limit: float, tokens: float):
+        self.limit = limit
+        self.tokens = tokens
+        self.updated_at = time.monotonic()
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def locked(self) -> Iterator["LimitState"]:
+        with self._lock:
+            yield self
+
+
+class SharedLimitState:
+    """
+    The state of an AdaptiveLimiter kept in a named shared memory block, so
+    every process on the host using the same `name` shares one limit and one
+    token bucket. Updates are serialized with a lock file next to it.
+
+    The block outlives the processes using it until `unlink` is called. Slots
+    held by a process that dies mid-request are not given back.
+    """
+
+    shared = True
+    _LAYOUT = struct.Struct("<dddqq")
+
+    def __init__(self, name: str, limit: float, tokens: float):
+        self.name = name
+        try:
+            self._memory = shared_memory.SharedMemory(
+                name, create=True, size=self._LAYOUT.size
+            )
+        except FileExistsError:
+            self._memory = shared_memory.SharedMemory(name)
+        # The resource tracker would remove the block as soon as the process
+        # that created it exits, while others are still using it.
+        resource_tracker.unregister(self._memory._name, "shared_memory")
+        self._lock = threading.Lock()
+        self._lock_file = open(
+            os.path.join(tempfile.gettempdir(), "{}.lock".format(name)), "a+b"
+        )
+        with self.locked():
+            if not self._initialized:
+                self._values = [limit, tokens, time.monotonic(), 0, 1]
+
+    @property
+    def _values(self) -> list:
+        return list(self._LAYOUT.unpack_from(self._memory.buf))
+
+    @_values.setter
+    def _values(self, values: list) -> None:
+        self._LAYOUT.pack_into(self._memory.buf, 0, *values)
+
+    def _field(index):
+        def get(self):
+            return self._values[index]
+
+        def set(self, value):
+            values = self._values
+            values[index] = value
+            self._values = values
+
+        return property(get, set)
+
+    limit = _field(0)
+    tokens = _field(1)
+    updated_at = _field(2)
+    in_flight = _field(3)
+    _initialized = _field(4)
+    del _field
+
+    @contextmanager
+    def locked(self) -> Iterator["SharedLimitState"]:
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield self
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        self._memory.close()
+        self._lock_file.close()
+
+    def unlink(self) -> None:
+        # unlink unregisters the block from the resource tracker again.
+        resource_tracker.register(self._memory._name, "shared_memory")
+        self._memory.unlink()
+
+
+class AdaptiveLimiter:
+    """
+    Caps the requests in flight to one bucket with an AIMD limit, and
+    optionally their rate with a token bucket.
+
+    Every request that succeeds raises the limit by about one per round of
+    `limit` requests, up to `max_limit`. Every request the bucket rejects as
+    overloaded (429, 5xx gateway errors, timeouts) multiplies it by `backoff`,
+    down to `min_limit`, and other failures leave it as it is. With `rate` set, requests also draw from a token bucket
+    refilled at `rate` per second holding up to `burst` tokens.
+
+    A limiter can be shared by any number of threads and coroutines. Passing a
+    SharedLimitState shares it with other processes as well.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        backoff: float = 0.5,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        state=None,
+        poll_interval: float = 0.005,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.poll_interval = poll_interval
+        self.state = state or LimitState(initial_limit, self.burst or 0.0)
+        self.stats = {"acquired": 0, "waited": 0, "overloads": 0}
+        self._condition = threading.Condition()
+        self._async_waiters: deque = deque()
+
+    @property
+    def limit(self) -> float:
+        return self.state.limit
+
+    @property
+    def in_flight(self) -> int:
+        return self.state.in_flight
+
+    def try_acquire(self) -> tuple[bool, Optional[float]]:
+        """
+        Takes a slot if one is free. Otherwise returns how long to wait for a
+        token, or None when waiting on a slot to be released.
+        """
+        with self.state.locked() as state:
+            if self.rate is not None:
+                now = time.monotonic()
+                state.tokens = min(
+                    self.burst, state.tokens + (now - state.updated_at) * self.rate
+                )
+                state.updated_at = now
+            if state.in_flight >= max(int(state.limit), self.min_limit):
+                return False, None
+            if self.rate is not None:
+                if state.tokens < 1:
+                    return False, (1 - state.tokens) / self.rate
+                state.tokens -= 1
+            state.in_flight += 1
+        self.stats["acquired"] += 1
+        return True, None
+
+    def _wait_time(self, wait: Optional[float]) -> Optional[float]:
+        # Releases in other processes can't be signalled, poll for them.
+        if self.state.shared:
+            return min(wait, self.poll_interval) if wait else self.poll_interval
+        return wait
+
+    def acquire(self) -> None:
+        # Checking under the condition means a release can't slip in between
+        # the check and the wait.
+        with self._condition:
+            acquired, wait = self.try_acquire()
+            if not acquired:
+                self.stats["waited"] += 1
+            while not acquired:
+                self._condition.wait(self._wait_time(wait))
+                acquired, wait = self.try_acquire()
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        waited = False
+        while True:
+            # Registered before checking, for the same reason as in acquire.
+            waiter = loop.create_future()
+            self._async_waiters.append((loop, waiter))
+            acquired, wait = self.try_acquire()
+            if acquired:
+                waiter.cancel()
+                return
+            if not waited:
+                waited = True
+                self.stats["waited"] += 1
+            try:
+                await asyncio.wait_for(waiter, self._wait_time(wait))
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, overloaded: bool = False, failed: bool = False) -> None:
+        with self.state.locked() as state:
+            state.in_flight = max(0, state.in_flight - 1)
+            if overloaded:
+                state.limit = max(self.min_limit, state.limit * self.backoff)
+            elif not failed:
+                state.limit = min(self.max_limit, state.limit + 1 / state.limit)
+        if overloaded:
+            self.stats["overloads"] += 1
+        with self._condition:
+            self._condition.notify()
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if not waiter.done():
+                loop.call_soon_threadsafe(_wake, waiter)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        except BaseException as error:
+            self.release(is_overload(error), failed=True)
+            raise
+        self.release()
+
+
+def _wake(waiter) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class BucketLimits:
+    """
+    One AdaptiveLimiter per bucket URL, created on first use from the same
+    settings. With `shared_name` set, each limiter's state lives in shared
+    memory named after it and the URL, so every process on the host using the
+    same name shares the per-bucket limits.
+    """
+
+    def __init__(self, shared_name: Optional[str] = None, **limiter_kwargs):
+        self.shared_name = shared_name
+        self.limiter_kwargs = limiter_kwargs
+        self._limiters: dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> AdaptiveLimiter:
+        limiter = self._limiters.get(url)
+        if limiter is not None:
+            return limiter
+        with self._lock:
+            if url not in self._limiters:
+                self._limiters[url] = self._make_limiter(url)
+            return self._limiters[url]
+
+    def _make_limiter(self, url: str) -> AdaptiveLimiter:
+        limiter = AdaptiveLimiter(**self.limiter_kwargs)
+        if self.shared_name is not None:
+            name = "{}-{}".format(
+                self.shared_name, hashlib.sha256(url.encode()).hexdigest()[:16]
+            )
+            limiter.state = SharedLimitState(
+                name, limiter.state.limit, limiter.state.tokens
+            )
+        return limiter
@@ -0,0 +1,69 @@
+from typing import Any, Optional
+
+from eth_hash.auto import keccak
+from eth_utils import decode_hex
+
+BLOOM_BITS = 2048
+
+
+def bloom_bits(value: bytes) -> tuple[int, int, int]:
+    digest = keccak(value)
+    return tuple(
+        ((digest[i] << 8) | digest[i + 1]) & (BLOOM_BITS - 1) for i in (0, 2, 4)
+    )
+
+
+def bloom_contains(bloom: int, value: bytes) -> bool:
+    return all((bloom >> bit) & 1 for bit in bloom_bits(value))
+
+
+def bloom_contains_log(logs_bloom: str, log: dict[str, Any]) -> bool:
+    bloom = int(logs_bloom, 16)
+    if not bloom_contains(bloom, decode_hex(log["address"])):
+        return False
+    return all(bloom_contains(bloom, decode_hex(topic)) for topic in log["topics"])
+
+
+def _same_log(a: dict[str, Any], b: dict[str, Any]) -> bool:
+    return (
+        int(a["logIndex"], 16) == int(b["logIndex"], 16)
+        and a["address"].lower() == b["address"].lower()
+        and [topic.lower() for topic in a["topics"]]
+        == [topic.lower() for topic in b["topics"]]
+        and a["data"].lower() == b["data"].lower()
+    )
+
+
+def find_excluded_log(
+    logs: list[dict[str, Any]],
+    headers: dict[str, dict[str, Any]],
+    receipts: Optional[dict[str, list[dict[str, Any]]]] = None,
+) -> Optional[dict[str, Any]]:
+    """
+    Returns the first log that can't be placed in the block it claims to be from.
+
+    Every log must name a known block header with a matching number and have its
+    address and topics set in that header's logs bloom. When `receipts` are given,
+    the log must also appear in its transaction's receipt.
+    """
+    for log in logs:
+        if log.get("removed"):
+            continue
+        header = headers.get(log["blockHash"])
+        if header is None or int(header["number"], 16) != int(log["blockNumber"], 16):
+            return log
+        if not bloom_contains_log(header["logsBloom"], log):
+            return log
+        if receipts is None:
+            continue
+        receipt = next(
+            (
+                receipt
+                for receipt in receipts.get(log["blockHash"]) or []
+                if receipt["transactionHash"] == log["transactionHash"]
+            ),
+            None,
+        )
+        if receipt is None or not any(_same_log(log, item) for item in receipt["logs"]):
+            return log
+    return None
@@ -0,0 +1,111 @@
+from typing import Any, Optional
+
+# Methods with side effects or server-side state, these are never replayed,
+# retried, hedged or served from a cache.
+NON_IDEMPOTENT_METHODS = frozenset(
+    {
+        "eth_sendRawTransaction",
+        "eth_sendTransaction",
+        "eth_sign",
+        "eth_signTransaction",
+        "eth_signTypedData",
+        "eth_newFilter",
+        "eth_newBlockFilter",
+        "eth_newPendingTransactionFilter",
+        "eth_getFilterChanges",
+        "eth_uninstallFilter",
+        "eth_subscribe",
+        "eth_unsubscribe",
+        "personal_sendTransaction",
+        "personal_sign",
+    }
+)
+
+# Transaction submissions that are sent to every bucket when broadcasting.
+BROADCAST_METHODS = frozenset({"eth_sendRawTransaction"})
+
+# Methods whose answer follows the chain head regardless of their parameters.
+HEAD_DEPENDENT_METHODS = frozenset(
+    {
+        "eth_blockNumber",
+        "eth_gasPrice",
+        "eth_maxPriorityFeePerGas",
+        "eth_blobBaseFee",
+        "eth_syncing",
+        "eth_mining",
+        "eth_hashrate",
+        "net_peerCount",
+        "net_listening",
+        "eth_getFilterLogs",
+    }
+)
+
+# Index of the block number or tag parameter for methods that take one.
+BLOCK_PARAM_INDEX = {
+    "eth_getBalance": 1,
+    "eth_getCode": 1,
+    "eth_getTransactionCount": 1,
+    "eth_getStorageAt": 2,
+    "eth_call": 1,
+    "eth_estimateGas": 1,
+    "eth_createAccessList": 1,
+    "eth_getProof": 2,
+    "eth_feeHistory": 1,
+    "eth_getBlockByNumber": 0,
+    "eth_getBlockReceipts": 0,
+    "eth_getBlockTransactionCountByNumber": 0,
+    "eth_getUncleCountByBlockNumber": 0,
+    "eth_getTransactionByBlockNumberAndIndex": 0,
+    "eth_getUncleByBlockNumberAndIndex": 0,
+    "debug_traceCall": 1,
+    "debug_traceBlockByNumber": 0,
+    "trace_block": 0,
+    "trace_call": 2,
+}
+
+DEFAULT_BLOCK_TAG = "latest"
+MOVING_BLOCK_TAGS = frozenset({"latest", "pending", "safe", "finalized"})
+
+
+def block_params(method: str, params: Any) -> list[Any]:
+    """
+    Returns every block number or tag a request is evaluated at, with omitted
+    block parameters reported as their "latest" default.
+    """
+    if method == "eth_getLogs":
+        log_filter = params[0] if params else {}
+        if log_filter.get("blockHash") is not None:
+            return []
+        return [
+            log_filter.get("fromBlock", DEFAULT_BLOCK_TAG),
+            log_filter.get("toBlock", DEFAULT_BLOCK_TAG),
+        ]
+    index = BLOCK_PARAM_INDEX.get(method)
+    if index is None:
+        return []
+    if params is None or len(params) <= index or params[index] is None:
+        return [DEFAULT_BLOCK_TAG]
+    return [params[index]]
+
+
+def block_number(block: Any) -> Optional[int]:
+    """The block number of a block parameter, None for tags and block hashes."""
+    if isinstance(block, int):
+        return block
+    if isinstance(block, dict):
+        block = block.get("blockNumber")
+        return block_number(block) if block is not None else None
+    if isinstance(block, str) and block.startswith("0x") and len(block) < 66:
+        return int(block, 16)
+    if block == "earliest":
+        return 0
+    return None
+
+
+def depends_on_head(method: str, params: Any) -> bool:
+    if method in HEAD_DEPENDENT_METHODS:
+        return True
+    return any(
+        isinstance(block, str) and block in MOVING_BLOCK_TAGS
+        for block in block_params(method, params)
+    )
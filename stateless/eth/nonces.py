@@ -0,0 +1,230 @@
+import abc
+import asyncio
+import re
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Optional, Union
+
+from eth_utils import encode_hex
+from web3.exceptions import Web3RPCError
+
+from .provider import ALREADY_KNOWN, AsyncStatelessProvider, StatelessProvider
+
+# How clients reject a transaction whose nonce doesn't follow the account's.
+NONCE_ERRORS = re.compile(
+    r"nonce too (low|high)|invalid nonce|nonce.*(gap|expected)|oldnonce"
+    r"|replacement transaction underpriced",
+    re.IGNORECASE,
+)
+
+RawTransaction = Union[str, bytes]
+
+
+def _error_message(error: Any) -> str:
+    if isinstance(error, dict):
+        error = error.get("error", error)
+        return str(error.get("message", error) if isinstance(error, dict) else error)
+    return str(error)
+
+
+def is_nonce_error(error: Any) -> bool:
+    """Whether an error response or exception rejected a transaction's nonce."""
+    return bool(NONCE_ERRORS.search(_error_message(error)))
+
+
+def _raw_hex(raw: RawTransaction) -> str:
+    return encode_hex(raw) if isinstance(raw, (bytes, bytearray)) else raw
+
+
+def _transaction_count(resp) -> int:
+    if "error" in resp:
+        raise Web3RPCError(str(resp["error"]), rpc_response=resp)
+    return int(resp["result"], 16)
+
+
+class _Account:
+    __slots__ = ("next_nonce", "used_at", "lock")
+
+    def __init__(self, lock):
+        self.next_nonce: Optional[int] = None
+        self.used_at = 0.0
+        self.lock = lock
+
+
+class _NonceAllocator(abc.ABC):
+    def __init__(self, provider, idle_timeout: float):
+        self.provider = provider
+        self.idle_timeout = idle_timeout
+        self.stats = {"allocated": 0, "syncs": 0, "resyncs": 0}
+        self._accounts: dict[str, _Account] = {}
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _new_lock(self):
+        """The lock serializing allocations for one account."""
+
+    @abc.abstractmethod
+    def _guard(self, account: _Account):
+        """Held while changing an account outside of an allocation."""
+
+    def _account(self, address: str) -> _Account:
+        address = address.lower()
+        account = self._accounts.get(address)
+        if account is not None:
+            return account
+        with self._lock:
+            if address not in self._accounts:
+                self._accounts[address] = _Account(self._new_lock())
+            return self._accounts[address]
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _needs_sync(self, account: _Account) -> bool:
+        return (
+            account.next_nonce is None
+            or time.monotonic() - account.used_at > self.idle_timeout
+        )
+
+    def _take(self, account: _Account) -> int:
+        nonce = account.next_nonce
+        account.next_nonce += 1
+        account.used_at = time.monotonic()
+        self._count("allocated")
+        return nonce
+
+    def _resync(self, account: _Account) -> None:
+        account.next_nonce = None
+        self._count("resyncs")
+
+    def resync(self, address: str) -> None:
+        """Fetches the account's nonce again before the next allocation."""
+        account = self._account(address)
+        with self._guard(account):
+            self._resync(account)
+
+    def release(self, address: str, nonce: int) -> None:
+        """
+        Gives back a nonce whose transaction was rejected. Only the latest nonce
+        can be reused, releasing an earlier one leaves a gap and resyncs.
+        """
+        account = self._account(address)
+        with self._guard(account):
+            if account.next_nonce == nonce + 1:
+                account.next_nonce = nonce
+            else:
+                self._resync(account)
+
+    def _failed(self, address: str, nonce: int, error: Any) -> None:
+        if isinstance(error, BaseException) or is_nonce_error(error):
+            # A send that raised may still have reached the bucket, the node's
+            # pending count is the only way to know.
+            self.resync(address)
+        elif not ALREADY_KNOWN.search(_error_message(error)):
+            self.release(address, nonce)
+
+
+class NonceManager(_NonceAllocator):
+    """
+    Allocates transaction nonces locally, per account.
+
+    The first allocation for an account fetches its verified pending
+    transaction count, later ones increment it without a round trip. The count
+    is fetched again after a nonce error and once the account has been idle for
+    `idle_timeout` seconds, in case transactions were sent from elsewhere.
+    Allocations for one account are serialized, so concurrent signers never get
+    the same nonce.
+    """
+
+    def __init__(self, provider: StatelessProvider, idle_timeout: float = 30.0):
+        super().__init__(provider, idle_timeout)
+
+    def _new_lock(self):
+        return threading.Lock()
+
+    def _guard(self, account: _Account):
+        return account.lock
+
+    def next_nonce(self, address: str) -> int:
+        account = self._account(address)
+        with account.lock:
+            if self._needs_sync(account):
+                account.next_nonce = _transaction_count(
+                    self.provider.make_request(
+                        "eth_getTransactionCount", [address, "pending"]
+                    )
+                )
+                self._count("syncs")
+            return self._take(account)
+
+    def send_raw_transaction(
+        self, address: str, sign: Callable[[int], RawTransaction]
+    ) -> Any:
+        """
+        Sends the transaction `sign(nonce)` signs with the next nonce of
+        `address`. The nonce is given back if the transaction is rejected, and
+        after a nonce error the nonce is resynced and the transaction signed and
+        sent once more.
+        """
+        for _ in range(2):
+            nonce = self.next_nonce(address)
+            try:
+                resp = self.provider.make_request(
+                    "eth_sendRawTransaction", [_raw_hex(sign(nonce))]
+                )
+            except Exception as error:
+                self._failed(address, nonce, error)
+                raise
+            if "error" not in resp:
+                return resp
+            self._failed(address, nonce, resp)
+            if not is_nonce_error(resp):
+                return resp
+        return resp
+
+
+class AsyncNonceManager(_NonceAllocator):
+    """The coroutine counterpart of NonceManager."""
+
+    def __init__(self, provider: AsyncStatelessProvider, idle_timeout: float = 30.0):
+        super().__init__(provider, idle_timeout)
+
+    def _new_lock(self):
+        return asyncio.Lock()
+
+    def _guard(self, account: _Account):
+        # Nothing runs between awaits, only allocations hold the lock across one.
+        return nullcontext()
+
+    async def next_nonce(self, address: str) -> int:
+        account = self._account(address)
+        async with account.lock:
+            if self._needs_sync(account):
+                account.next_nonce = _transaction_count(
+                    await self.provider.make_request(
+                        "eth_getTransactionCount", [address, "pending"]
+                    )
+                )
+                self._count("syncs")
+            return self._take(account)
+
+    async def send_raw_transaction(
+        self, address: str, sign: Callable[[int], RawTransaction]
+    ) -> Any:
+        for _ in range(2):
+            nonce = await self.next_nonce(address)
+            try:
+                resp = await self.provider.make_request(
+                    "eth_sendRawTransaction", [_raw_hex(sign(nonce))]
+                )
+            except Exception as error:
+                self._failed(address, nonce, error)
+                raise
+            if "error" not in resp:
+                return resp
+            self._failed(address, nonce, resp)
+            if not is_nonce_error(resp):
+                return resp
+        return resp
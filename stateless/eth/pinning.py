@@ -0,0 +1,124 @@
+from typing import Any, Awaitable, Callable
+
+from web3.exceptions import Web3RPCError
+
+from .encoding import make_request_key
+from .methods import BLOCK_PARAM_INDEX, DEFAULT_BLOCK_TAG, depends_on_head
+
+
+def pin_params(method: str, params: Any, block: str) -> Any:
+    """
+    Rewrites the block parameters of a request that are "latest", explicitly
+    or by omission, to `block`. Other tags and block numbers are left alone.
+    """
+    if method == "eth_getLogs":
+        if not params or params[0].get("blockHash") is not None:
+            return params
+        log_filter = dict(params[0])
+        for key in ("fromBlock", "toBlock"):
+            if log_filter.get(key) in (None, DEFAULT_BLOCK_TAG):
+                log_filter[key] = block
+        return [log_filter, *params[1:]]
+    index = BLOCK_PARAM_INDEX.get(method)
+    if index is None:
+        return params
+    params = list(params or [])
+    if len(params) == index:
+        params.append(block)
+    elif len(params) > index and params[index] in (None, DEFAULT_BLOCK_TAG):
+        params[index] = block
+    return params
+
+
+def pinned_block_number(resp) -> int:
+    if "error" in resp:
+        raise Web3RPCError(str(resp["error"]), rpc_response=resp)
+    return int(resp["result"], 16)
+
+
+class BlockPin:
+    """
+    The block `latest` resolves to within a provider's `pin_block` scope.
+
+    Requests made in the scope are evaluated at `number`, eth_blockNumber is
+    answered with it, and unless `memoize` is unset, responses to pinned reads
+    are kept for the rest of the scope since they can't change within it.
+    """
+
+    def __init__(self, number: int, memoize: bool = True):
+        self.number = number
+        self.tag = hex(number)
+        self.memoize = memoize
+        self.responses: dict[str, Any] = {}
+
+    def _block_number(self) -> Any:
+        return {"jsonrpc": "2.0", "id": 0, "result": self.tag}
+
+    def _memoizable(self, method, params) -> bool:
+        return (
+            self.memoize
+            and (method in BLOCK_PARAM_INDEX or method == "eth_getLogs")
+            and not depends_on_head(method, params)
+        )
+
+    def request(self, method, params, send: Callable[[str, Any], Any]) -> Any:
+        if method == "eth_blockNumber":
+            return self._block_number()
+        params = pin_params(method, params, self.tag)
+        if not self._memoizable(method, params):
+            return send(method, params)
+        key = make_request_key(method, params)
+        resp = self.responses.get(key)
+        if resp is None:
+            resp = send(method, params)
+            if "error" not in resp:
+                self.responses[key] = resp
+        return resp
+
+    async def request_async(
+        self, method, params, send: Callable[[str, Any], Awaitable[Any]]
+    ) -> Any:
+        if method == "eth_blockNumber":
+            return self._block_number()
+        params = pin_params(method, params, self.tag)
+        if not self._memoizable(method, params):
+            return await send(method, params)
+        key = make_request_key(method, params)
+        resp = self.responses.get(key)
+        if resp is None:
+            resp = await send(method, params)
+            if "error" not in resp:
+                self.responses[key] = resp
+        return resp
+
+    def pin_batch(self, batch_requests):
+        return [
+            (method, pin_params(method, params, self.tag))
+            for method, params in batch_requests
+        ]
+
+    def request_batch(self, batch_requests, send: Callable[[list], Any]) -> Any:
+        pinned = self.pin_batch(batch_requests)
+        remote = self._remote_requests(pinned)
+        return self._merge_batch(pinned, send(remote) if remote else [])
+
+    async def request_batch_async(
+        self, batch_requests, send: Callable[[list], Awaitable[Any]]
+    ) -> Any:
+        pinned = self.pin_batch(batch_requests)
+        remote = self._remote_requests(pinned)
+        return self._merge_batch(pinned, await send(remote) if remote else [])
+
+    @staticmethod
+    def _remote_requests(pinned):
+        return [request for request in pinned if request[0] != "eth_blockNumber"]
+
+    def _merge_batch(self, pinned, responses) -> Any:
+        # A single error object is returned when the whole batch is rejected.
+        if not isinstance(responses, list):
+            return responses
+        remote = iter(responses)
+        return [
+            self._block_number() if method == "eth_blockNumber" else next(remote)
+            for method, _ in pinned
+        ]
@@ -1,45 +1,1255 @@
-from typing import Any, Optional, TypedDict, cast
+import asyncio
 import json
-from web3 import Web3
+import re
+import threading
+import time
+from concurrent.futures import as_completed
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional, cast
 
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from eth_utils import encode_hex, keccak
+from web3 import AsyncHTTPProvider, Web3
+from web3._utils.batching import sort_batch_response_by_response_ids
+from web3._utils.http import DEFAULT_HTTP_TIMEOUT
+from web3.providers.async_base import AsyncBaseProvider
+from web3.providers.base import BaseProvider
 
-class Attestation(TypedDict):
-    signature: str
-    msg: str
-    signatureFormat: Optional[str]
-    hashAlgo: Optional[str]
-    identity: Optional[str]
+from .batching import AsyncMicroBatcher, MicroBatcher
+from .cache import STATIC_METHODS, BaseResponseCache
+from .coalescing import AsyncSingleFlight, SingleFlight
+from .encoding import EncodedResult, make_request_key
+from .forensics import Forensics
+from .health import HealthMonitor
+from .hedging import HedgeExecutor, HedgePolicy, async_hedged_call, hedged_call
+from .instrumentation import Instrumentation
+from .limits import BucketLimits, is_overload
+from .logs import find_excluded_log
+from .methods import BROADCAST_METHODS, NON_IDEMPOTENT_METHODS, depends_on_head
+from .pinning import BlockPin, pinned_block_number
+from .quorum import QuorumResult, evaluate_quorum
+from .replication import ReplicationVerifier
+from .retries import RetryPolicy
+from .signatures import DEFAULT_SIGNATURE_FORMAT, IdentityKeyRegistry, verify_signature
+from .streaming import AsyncStreamedResponse, StreamedResponse
+from .types import Attestation, StatelessRPCResponse  # noqa: F401
+from .utils import ElasticExecutor, LRUCache
+from .verification import SignatureCheck, VerificationPool
+
+HEADER_FIELDS = ("hash", "number", "logsBloom", "receiptsRoot")
 
-class StatelessRPCResponse(TypedDict):
-    id: str
-    jsonrpc: str
-    result: dict[str, Any]
-    attestations: list[Attestation]
 
 class IntegrityError(Exception):
-    pass
+    def __init__(
+        self,
+        method,
+        params,
+        acceptance,
+        providers,
+        quorum: Optional[QuorumResult] = None,
+        batch_index: Optional[int] = None,
+        reason: Optional[str] = None,
+    ):
+        self.method = method
+        self.params = params
+        self.acceptance = acceptance
+        self.providers = providers
+        self.quorum = quorum
+        self.attestations = quorum.attestations if quorum is not None else []
+        self.batch_index = batch_index
+        self.reason = reason
+        self._message: Optional[str] = None
+        # The message itself is only rendered by __str__, the arguments are kept
+        # so the error reprs and pickles like any other.
+        super().__init__(method, params, acceptance, providers)
+
+    def __str__(self) -> str:
+        # Rendered when displayed rather than raised, large params make it slow.
+        if self._message is None:
+            message = make_error_message(
+                self.method,
+                self.params,
+                self.acceptance,
+                self.providers,
+                self.quorum,
+                self.reason,
+            )
+            if self.batch_index is not None:
+                message = "Request #{} of the batch failed verification. {}".format(
+                    self.batch_index, message
+                )
+            self._message = message
+        return self._message
 
 
-def make_error_message(method_name, params, acceptance, providers, attestations):
-    attestation_str = "Message hash of {} (from {}) and {} (from {}) are inconsistent from the signatures".format(attestations[0]["msg"], providers[0], attestations[1]["msg"], providers[1])
-    return "The integrity of the following RPC request could not be confirmed based on the acceptance threshold of {} between the the providers: {}. \n Method: {}, Parameters: {}. \n {}".format(acceptance, providers, method_name, json.dumps(params, indent=2), attestation_str)
+def make_error_message(
+    method_name, params, acceptance, providers, quorum=None, reason=None
+):
+    if quorum is None:
+        attestation_str = reason
+    elif quorum.msg is None:
+        attestation_str = "No attestations were returned"
+    else:
+        attestation_str = "Message hash {} was attested by {} of {} identities ({}), disagreeing identities: {}".format(
+            quorum.msg,
+            quorum.count,
+            sum(len(identities) for identities in quorum.groups.values()),
+            ", ".join(quorum.agreeing),
+            ", ".join(quorum.disagreeing) or "none",
+        )
+    if quorum is not None and quorum.result_digest is not None:
+        attestation_str += ". The attested message hash does not match the returned result (local digest: {})".format(
+            quorum.result_digest
+        )
+    if quorum is not None and quorum.invalid:
+        attestation_str += ". Invalid signatures from: {}".format(
+            ", ".join(quorum.invalid)
+        )
+    if quorum is not None and reason is not None:
+        attestation_str += ". {}".format(reason)
+    return "The integrity of the following RPC request could not be confirmed based on the acceptance threshold of {} between the the providers: {}. \n Method: {}, Parameters: {}. \n {}".format(
+        acceptance,
+        providers,
+        method_name,
+        json.dumps(params, indent=2),
+        attestation_str,
+    )
 
 
-class StatelessProvider(Web3.HTTPProvider):
-    def __init__(self, url, acceptance_threshold: int, providers: list[str], *args, **kwargs):
+class BaseStatelessProvider:
+    def __init__(
+        self,
+        url,
+        acceptance_threshold: int,
+        providers: list[str],
+        *args,
+        key_registry: Optional[IdentityKeyRegistry] = None,
+        verification_pool: Optional[VerificationPool] = None,
+        verify_result_hash: bool = False,
+        verify_logs_inclusion: bool = False,
+        verify_log_receipts: bool = False,
+        header_cache_size: int = 4096,
+        receipts_cache_size: int = 64,
+        replication: Optional[ReplicationVerifier] = None,
+        cache: Optional[BaseResponseCache] = None,
+        hedging: Optional[HedgePolicy] = None,
+        limits: Optional[BucketLimits] = None,
+        retry: Optional[RetryPolicy] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        forensics: Optional[Forensics] = None,
+        health_interval: float = 10.0,
+        max_block_lag: int = 5,
+        **kwargs,
+    ):
+        # Several bucket URLs for the same chain, each request goes to the
+        # healthiest of them.
+        if isinstance(url, (list, tuple)):
+            self.health: Optional[HealthMonitor] = HealthMonitor(
+                url, health_interval, max_block_lag
+            )
+            url = url[0]
+        else:
+            self.health = None
         self.acceptance_threshold = acceptance_threshold
         self.provider = providers
+        self.key_registry = key_registry
+        self.verification_pool = verification_pool
+        self.verify_result_hash = verify_result_hash
+        self.verify_logs_inclusion = verify_logs_inclusion or verify_log_receipts
+        self.verify_log_receipts = verify_log_receipts
+        self._header_cache = LRUCache(header_cache_size)
+        self._receipts_cache = LRUCache(receipts_cache_size)
+        self.replication = replication
+        self.cache = cache
+        self.hedging = hedging
+        self.limits = limits
+        self.retry = retry
+        self.instrumentation = instrumentation
+        self.forensics = forensics
+        # Per provider, a pin on one chain must not apply to another.
+        self._pinned_block: ContextVar[Optional[BlockPin]] = ContextVar(
+            "pinned_block", default=None
+        )
         super().__init__(url, *args, **kwargs)
 
-    def make_request(self, method, params):
-        resp = super().make_request(method, params)
+    @property
+    def _keeps_responses(self) -> bool:
+        # Optimistically verified responses are returned before their signatures
+        # are checked, so they must not outlive the request.
+        return self.verification_pool is None or not self.verification_pool.optimistic
+
+    @property
+    def _routed(self) -> bool:
+        # Whether requests bypass HTTPProvider to pick a bucket or hold a slot.
+        return self.health is not None or self.limits is not None
+
+    def _finish_post(self, url, limiter, error=None) -> None:
+        if limiter is not None:
+            limiter.release(
+                error is not None and is_overload(error), failed=error is not None
+            )
+        # Cancellations and interrupts say nothing about the bucket's health.
+        if isinstance(error, Exception):
+            self._mark_failed(url)
+
+    def _record_latency(self, url, started) -> None:
+        if self.health is not None:
+            self.health.record(url, time.monotonic() - started)
+
+    def _mark_failed(self, url) -> None:
+        if self.health is not None:
+            self.health.mark_failed(url)
+
+    def _should_hedge(self, method) -> bool:
+        return self.hedging is not None and method not in NON_IDEMPOTENT_METHODS
+
+    def _hedge_targets(self) -> tuple[str, str]:
+        # With a single bucket URL the hedge goes to the same bucket, which
+        # still lands on a different connection and often a different node.
+        if self.health is None:
+            return self.endpoint_uri, self.endpoint_uri
+        primary = self.health.select()
+        return primary, self.health.select(exclude={primary})
+
+    def encode_rpc_request(self, method, params) -> bytes:
+        request_data = super().encode_rpc_request(method, params)
+        if self.instrumentation is not None:
+            self.instrumentation.bytes_sent(method, len(request_data))
+        return request_data
+
+    def decode_rpc_response(self, raw_response: bytes):
+        if self.instrumentation is None:
+            return super().decode_rpc_response(raw_response)
+        started = time.perf_counter()
+        response = super().decode_rpc_response(raw_response)
+        self.instrumentation.decoded(
+            response, len(raw_response), time.perf_counter() - started
+        )
+        return response
+
+    @staticmethod
+    def _sort_batch_response(responses):
+        if not isinstance(responses, list):
+            return responses
+        return sort_batch_response_by_response_ids(responses)
+
+    def _signature_check(self, attestation: Attestation) -> Optional[SignatureCheck]:
+        identity = attestation.get("identity")
+        if identity is None or (self.provider and identity not in self.provider):
+            return None
+        key = self.key_registry.get(identity)
+        if key is None:
+            return None
+        return (
+            attestation.get("signatureFormat") or DEFAULT_SIGNATURE_FORMAT,
+            key,
+            attestation["msg"],
+            attestation["signature"],
+        )
+
+    def _verify_attestation(self, attestation: Attestation) -> bool:
+        check = self._signature_check(attestation)
+        return check is not None and verify_signature(*check)
+
+    def _check_quorum(self, method, params, attestations, is_valid, batch_index):
+        quorum = evaluate_quorum(attestations, self.acceptance_threshold, is_valid)
+        if not quorum.accepted:
+            raise IntegrityError(
+                method,
+                params,
+                self.acceptance_threshold,
+                self.provider,
+                quorum,
+                batch_index,
+            )
+        return quorum
+
+    def _check_result_hash(self, method, params, resp, quorum, batch_index, encoded):
+        hash_algo = next(
+            a.get("hashAlgo") for a in quorum.attestations if a["msg"] == quorum.msg
+        )
+        encoded = encoded or EncodedResult(resp.get("result"))
+        if not encoded.matches(quorum.msg, hash_algo):
+            quorum.accepted = False
+            digest = encoded.digest(hash_algo)
+            quorum.result_digest = digest or "unsupported hash algorithm {}".format(
+                hash_algo
+            )
+            raise IntegrityError(
+                method,
+                params,
+                self.acceptance_threshold,
+                self.provider,
+                quorum,
+                batch_index,
+            )
+        return encoded
+
+    def _verify_response(
+        self,
+        method,
+        params,
+        resp,
+        batch_index: Optional[int] = None,
+        encoded: Optional[EncodedResult] = None,
+    ) -> StatelessRPCResponse:
         resp = cast(StatelessRPCResponse, resp)
-        if resp["attestations"][0]["msg"] != resp["attestations"][1]["msg"]:
-            raise IntegrityError(method, params, self.acceptance_threshold, self.provider, resp["attestations"])
+        if "error" in resp:
+            return resp
+        if self.instrumentation is None:
+            try:
+                self._verify_attestations(method, params, resp, batch_index, encoded)
+            except IntegrityError as error:
+                self._investigate(error, resp)
+                raise
+            return resp
+        started = time.perf_counter()
+        quorum = None
+        try:
+            quorum = self._verify_attestations(
+                method, params, resp, batch_index, encoded
+            )
+        except IntegrityError as error:
+            quorum = error.quorum
+            self._investigate(error, resp)
+            raise
+        finally:
+            self.instrumentation.verified(method, time.perf_counter() - started)
+            if quorum is not None:
+                self.instrumentation.attestations(method, quorum)
+        return resp
+
+    def _investigate(self, error, resp) -> None:
+        if self.forensics is not None:
+            self.forensics.submit(error, resp.get("result"))
+
+    def _verify_attestations(self, method, params, resp, batch_index, encoded):
+        attestations = resp.get("attestations") or []
+        if self.key_registry is None:
+            quorum = self._check_quorum(method, params, attestations, None, batch_index)
+        elif self.verification_pool is None:
+            quorum = self._check_quorum(
+                method, params, attestations, self._verify_attestation, batch_index
+            )
+        else:
+            quorum = self._verify_with_pool(method, params, attestations, batch_index)
+        if self.verify_result_hash:
+            self._check_result_hash(method, params, resp, quorum, batch_index, encoded)
+        return quorum
+
+    def _verify_with_pool(self, method, params, attestations, batch_index):
+        checks = {id(a): self._signature_check(a) for a in attestations}
+        pending = [check for check in checks.values() if check is not None]
+        future = self.verification_pool.submit(pending)
+
+        def check_results(results):
+            verified = iter(results)
+            valid = {
+                key: check is not None and next(verified)
+                for key, check in checks.items()
+            }
+            return self._check_quorum(
+                method, params, attestations, lambda a: valid[id(a)], batch_index
+            )
+
+        if not self.verification_pool.optimistic:
+            return check_results(future.result())
+
+        # Reject what can be rejected without a signature check right away and
+        # hand the rest over to the pool.
+        quorum = self._check_quorum(
+            method,
+            params,
+            attestations,
+            lambda a: checks[id(a)] is not None,
+            batch_index,
+        )
+
+        def on_verified(done):
+            try:
+                check_results(done.result())
+            except Exception as error:
+                self.verification_pool.report_failure(error)
+
+        future.add_done_callback(on_verified)
+        return quorum
+
+    def _verify_batch_response(self, batch_requests, responses):
+        # A single error object is returned when the whole batch is rejected.
+        if not isinstance(responses, list):
+            return responses
+        for index, ((method, params), resp) in enumerate(
+            zip(batch_requests, responses)
+        ):
+            self._verify_response(method, params, resp, index)
+        return responses
+
+    def _verifiy_replication(self, method, params, resp: StatelessRPCResponse) -> bool:
+        if self.replication is None:
+            return False
+        return self.replication.submit(method, params, resp)
+
+    def _observe_head(self, method, params, resp) -> None:
+        if method == "eth_blockNumber":
+            self.cache.observe_head(int(resp["result"], 16))
+        elif method == "eth_getBlockByNumber" and depends_on_head(method, params):
+            if resp.get("result"):
+                self.cache.observe_head(int(resp["result"]["number"], 16))
+
+    @staticmethod
+    def _log_block_hashes(resp) -> list[str]:
+        return list(
+            {log["blockHash"]: None for log in resp["result"] if not log.get("removed")}
+        )
+
+    @staticmethod
+    def _block_request(method, block_hash):
+        if method == "eth_getBlockByHash":
+            return (method, [block_hash, False])
+        return (method, [block_hash])
+
+    def _store_block_data(self, cache, block_hashes, responses):
+        # Returns what was fetched as well, it may already be evicted from a
+        # cache smaller than the range of blocks being checked.
+        stored = {}
+        if not isinstance(responses, list):
+            return stored
+        for block_hash, resp in zip(block_hashes, responses):
+            data = resp.get("result")
+            if not data:
+                continue
+            if isinstance(data, dict):
+                data = {field: data[field] for field in HEADER_FIELDS}
+            else:
+                data = [
+                    {"transactionHash": r["transactionHash"], "logs": r["logs"]}
+                    for r in data
+                ]
+            if self._keeps_responses:
+                cache.set(block_hash, data)
+            stored[block_hash] = data
+        return stored
+
+    @staticmethod
+    def _cached_block_data(cache, block_hashes):
+        found, missing = {}, []
+        for block_hash in block_hashes:
+            data = cache.get(block_hash)
+            if data is None:
+                missing.append(block_hash)
+            else:
+                found[block_hash] = data
+        return found, missing
+
+    def _get_block_data(self, cache, method, block_hashes, fetch):
+        found, missing = self._cached_block_data(cache, block_hashes)
+        if missing:
+            responses = fetch(
+                [self._block_request(method, block_hash) for block_hash in missing]
+            )
+            found.update(self._store_block_data(cache, missing, responses))
+        return found
+
+    def _find_excluded_log(self, resp, fetch):
+        block_hashes = self._log_block_hashes(resp)
+        headers = self._get_block_data(
+            self._header_cache, "eth_getBlockByHash", block_hashes, fetch
+        )
+        receipts = None
+        if self.verify_log_receipts:
+            receipts = self._get_block_data(
+                self._receipts_cache, "eth_getBlockReceipts", block_hashes, fetch
+            )
+        return find_excluded_log(resp["result"], headers, receipts)
+
+    def _check_logs_inclusion(self, method, params, resp, fetch):
+        self._raise_excluded_log(method, params, self._find_excluded_log(resp, fetch))
+
+    def _raise_excluded_log(self, method, params, log):
+        if log is not None:
+            raise IntegrityError(
+                method,
+                params,
+                self.acceptance_threshold,
+                self.provider,
+                reason="Log {} of transaction {} is not included in block {} ({})".format(
+                    log["logIndex"],
+                    log["transactionHash"],
+                    log["blockNumber"],
+                    log["blockHash"],
+                ),
+            )
+
+
+class StatelessProvider(BaseStatelessProvider, Web3.HTTPProvider):
+    def __init__(
+        self,
+        url,
+        *args,
+        coalesce: bool = False,
+        batch_window: Optional[float] = None,
+        batch_max_size: int = 50,
+        **kwargs,
+    ):
+        self._single_flight = SingleFlight() if coalesce else None
+        self._batcher = (
+            MicroBatcher(self._send_batch, batch_window, batch_max_size)
+            if batch_window
+            else None
+        )
+        super().__init__(url, *args, **kwargs)
+        self._hedge_pool = HedgeExecutor() if self.hedging is not None else None
+
+    def make_request(self, method, params):
+        pin = self._pinned_block.get()
+        if pin is not None:
+            return pin.request(method, params, self._make_tracked_request)
+        return self._make_tracked_request(method, params)
+
+    def _make_tracked_request(self, method, params):
+        if self.instrumentation is None:
+            return self._make_cached_request(method, params)
+        return self.instrumentation.track(
+            method, self._make_cached_request, method, params
+        )
+
+    @contextmanager
+    def pin_block(self, block: Optional[int] = None) -> Iterator[BlockPin]:
+        """
+        Evaluates every request made in the context at one block, `block` or the
+        verified latest block number, so multi-call reads see a single state.
+        Explicit or omitted "latest" block parameters are rewritten to it and
+        eth_blockNumber is answered with it. Nested scopes reuse the outer pin.
+
+        The pin follows the current context, requests made from other threads
+        only see it when run in a copy of it (contextvars.copy_context).
+        """
+        pin = self._pinned_block.get()
+        if pin is not None and block is None:
+            yield pin
+            return
+        if block is None:
+            block = pinned_block_number(self.make_request("eth_blockNumber", []))
+        token = self._pinned_block.set(BlockPin(block, memoize=self._keeps_responses))
+        try:
+            yield self._pinned_block.get()
+        finally:
+            self._pinned_block.reset(token)
+
+    def _make_cached_request(self, method, params):
+        if self.cache is not None:
+            cached = self.cache.lookup(method, params)
+            if cached is not None:
+                return cached
+        if self._single_flight is not None and method not in NON_IDEMPOTENT_METHODS:
+            return self._single_flight.do(
+                make_request_key(method, params),
+                lambda: self._make_retried_request(method, params),
+            )
+        return self._make_retried_request(method, params)
+
+    def _make_retried_request(self, method, params):
+        if self.retry is None:
+            return self._make_hedged_request(method, params)
+        return self.retry.call(
+            method, lambda: self._make_hedged_request(method, params)
+        )
+
+    def _make_hedged_request(self, method, params):
+        if not self._should_hedge(method):
+            return self._make_verified_request(method, params)
+        return hedged_call(
+            self.hedging,
+            self._hedge_pool,
+            lambda url: self._make_verified_request(method, params, url),
+            *self._hedge_targets(),
+        )
+
+    def _make_verified_request(self, method, params, url: Optional[str] = None):
+        resp = self._send_request(method, params, url)
+        encoded = EncodedResult(resp.get("result"))
+        resp = self._verify_response(method, params, resp, encoded=encoded)
+        if "error" in resp:
+            return resp
+        if method == "eth_getLogs" and self.verify_logs_inclusion:
+            self._check_logs_inclusion(method, params, resp, self._fetch_block_data)
+        self._verifiy_replication(method, params, resp)
+        if self.cache is not None and self._keeps_responses:
+            self._cache_response(method, params, resp, encoded)
         return resp
 
-    def _verifiy_replication(self, resp: StatelessRPCResponse) -> bool:
-        return True
+    def _cache_response(self, method, params, resp, encoded):
+        self._observe_head(method, params, resp)
+        if not self.cache.is_candidate(method, params, resp):
+            return
+        # Static answers are stored whatever the head, so don't refresh it.
+        if method not in STATIC_METHODS and self.cache.head_is_stale():
+            self.make_request("eth_blockNumber", [])
+        self.cache.store(method, params, resp, encoded)
+
+    def _send_request(self, method, params, url: Optional[str] = None):
+        if url is None:
+            # Batched items are verified one by one by their own callers.
+            if self._batcher is not None and method not in NON_IDEMPOTENT_METHODS:
+                return self._batcher.submit(method, params)
+            if not self._routed:
+                return super().make_request(method, params)
+        return self._post(self.encode_rpc_request(method, params), url)
+
+    def _send_batch(self, batch_requests):
+        if not self._routed:
+            return super().make_batch_request(batch_requests)
+        return self._sort_batch_response(
+            self._post(self.encode_batch_rpc_request(batch_requests))
+        )
+
+    def _post(self, request_data, url: Optional[str] = None):
+        if url is None:
+            url = self.health.select() if self.health is not None else self.endpoint_uri
+        limiter = self.limits.get(url) if self.limits is not None else None
+        if limiter is not None:
+            limiter.acquire()
+        started = time.monotonic()
+        try:
+            raw_response = self._request_session_manager.make_post_request(
+                url, request_data, **self.get_request_kwargs()
+            )
+        except BaseException as error:
+            self._finish_post(url, limiter, error)
+            raise
+        self._finish_post(url, limiter)
+        self._record_latency(url, started)
+        return self.decode_rpc_response(raw_response)
+
+    def stream_request(
+        self,
+        method,
+        params,
+        spool: bool = False,
+        spool_dir: Optional[str] = None,
+        chunk_size: int = 65536,
+        stream_path: str = "result",
+    ) -> StreamedResponse:
+        """
+        Sends a request and returns its response as a StreamedResponse, which
+        parses, hashes and verifies the body as it is read instead of decoding
+        it whole. Meant for very large eth_getLogs or debug_trace* results, the
+        latter with a `stream_path` of "result.structLogs".
+        """
+        response = self._request_session_manager.get_response_from_post_request(
+            self.health.select() if self.health is not None else self.endpoint_uri,
+            data=self.encode_rpc_request(method, params),
+            stream=True,
+            **self.get_request_kwargs(),
+        )
+        response.raise_for_status()
+        return StreamedResponse(
+            self,
+            method,
+            params,
+            response.iter_content(chunk_size),
+            spool,
+            spool_dir,
+            response.close,
+            stream_path,
+        )
+
+    def make_batch_request(self, batch_requests):
+        pin = self._pinned_block.get()
+        if pin is not None:
+            return pin.request_batch(batch_requests, self._make_verified_batch)
+        return self._make_verified_batch(batch_requests)
+
+    def _make_verified_batch(self, batch_requests):
+        responses = self._send_batch(batch_requests)
+        return self._verify_batch_response(batch_requests, responses)
 
     def _verify_get_logs_inclusion(self, resp: StatelessRPCResponse) -> bool:
-        return True
+        return self._find_excluded_log(resp, self._fetch_block_data) is None
+
+    def _fetch_block_data(self, batch_requests):
+        return self.make_batch_request(batch_requests)
+
+
+class AsyncStatelessProvider(BaseStatelessProvider, AsyncHTTPProvider):
+    def __init__(
+        self,
+        url,
+        acceptance_threshold: int,
+        providers: list[str],
+        *args,
+        max_concurrency: int = 100,
+        keepalive_timeout: float = 30.0,
+        coalesce: bool = False,
+        batch_window: Optional[float] = None,
+        batch_max_size: int = 50,
+        **kwargs,
+    ):
+        self._single_flight = AsyncSingleFlight() if coalesce else None
+        self._batcher = (
+            AsyncMicroBatcher(self._send_batch, batch_window, batch_max_size)
+            if batch_window
+            else None
+        )
+        self.max_concurrency = max_concurrency
+        self.keepalive_timeout = keepalive_timeout
+        # Caps the number of requests awaiting a response, the connector below
+        # caps the number of sockets so both stay in step.
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Keep-alive sessions by event loop and URL, one for each bucket requests
+        # are routed to. Sessions are bound to the loop they were created on.
+        self._sessions: dict[tuple[int, str], ClientSession] = {}
+        super().__init__(url, acceptance_threshold, providers, *args, **kwargs)
+
+    def _request_timeout(self) -> ClientTimeout:
+        return self.get_request_kwargs().get("timeout") or ClientTimeout(
+            DEFAULT_HTTP_TIMEOUT
+        )
+
+    async def _get_session(self, url: Optional[str] = None) -> ClientSession:
+        key = (id(asyncio.get_running_loop()), url or self.endpoint_uri)
+        cached = self._sessions.get(key)
+        if cached is None or cached.closed or cached._loop.is_closed():
+            connector = TCPConnector(
+                limit=self.max_concurrency, keepalive_timeout=self.keepalive_timeout
+            )
+            session = ClientSession(connector=connector, raise_for_status=True)
+            # web3 reads the timeout when it evicts a session from its cache.
+            cached = self._sessions[key] = (
+                await self._request_session_manager.async_cache_and_return_session(
+                    key[1], session, request_timeout=self._request_timeout()
+                )
+            )
+            if cached is not session:
+                await session.close()
+        return cached
+
+    async def make_request(self, method, params):
+        pin = self._pinned_block.get()
+        if pin is not None:
+            return await pin.request_async(method, params, self._make_tracked_request)
+        return await self._make_tracked_request(method, params)
+
+    async def _make_tracked_request(self, method, params):
+        if self.instrumentation is None:
+            return await self._make_cached_request(method, params)
+        return await self.instrumentation.track_async(
+            method, self._make_cached_request, method, params
+        )
+
+    @asynccontextmanager
+    async def pin_block(self, block: Optional[int] = None) -> AsyncIterator[BlockPin]:
+        """The coroutine counterpart of StatelessProvider.pin_block."""
+        pin = self._pinned_block.get()
+        if pin is not None and block is None:
+            yield pin
+            return
+        if block is None:
+            block = pinned_block_number(await self.make_request("eth_blockNumber", []))
+        token = self._pinned_block.set(BlockPin(block, memoize=self._keeps_responses))
+        try:
+            yield self._pinned_block.get()
+        finally:
+            self._pinned_block.reset(token)
+
+    async def _make_cached_request(self, method, params):
+        if self.cache is not None:
+            cached = self.cache.lookup(method, params)
+            if cached is not None:
+                return cached
+        if self._single_flight is not None and method not in NON_IDEMPOTENT_METHODS:
+            return await self._single_flight.do(
+                make_request_key(method, params),
+                lambda: self._make_retried_request(method, params),
+            )
+        return await self._make_retried_request(method, params)
+
+    async def _make_retried_request(self, method, params):
+        if self.retry is None:
+            return await self._make_hedged_request(method, params)
+        return await self.retry.call_async(
+            method, lambda: self._make_hedged_request(method, params)
+        )
+
+    async def _make_hedged_request(self, method, params):
+        if not self._should_hedge(method):
+            return await self._make_verified_request(method, params)
+        if self.health is not None and not self.health.started:
+            await asyncio.to_thread(self.health.start)
+        return await async_hedged_call(
+            self.hedging,
+            lambda url: self._make_verified_request(method, params, url),
+            *self._hedge_targets(),
+        )
+
+    async def _make_verified_request(self, method, params, url: Optional[str] = None):
+        resp = await self._send_request(method, params, url)
+        encoded = EncodedResult(resp.get("result"))
+        resp = await self._async_verify(
+            self._verify_response, method, params, resp, None, encoded
+        )
+        if "error" in resp:
+            return resp
+        if method == "eth_getLogs" and self.verify_logs_inclusion:
+            await self._async_check_logs_inclusion(method, params, resp)
+        self._verifiy_replication(method, params, resp)
+        if self.cache is not None and self._keeps_responses:
+            await self._cache_response(method, params, resp, encoded)
+        return resp
+
+    async def _cache_response(self, method, params, resp, encoded):
+        self._observe_head(method, params, resp)
+        if not self.cache.is_candidate(method, params, resp):
+            return
+        # Static answers are stored whatever the head, so don't refresh it.
+        if method not in STATIC_METHODS and self.cache.head_is_stale():
+            await self.make_request("eth_blockNumber", [])
+        self.cache.store(method, params, resp, encoded)
+
+    async def _send_request(self, method, params, url: Optional[str] = None):
+        if (
+            url is None
+            and self._batcher is not None
+            and method not in NON_IDEMPOTENT_METHODS
+        ):
+            return await self._batcher.submit(method, params)
+        async with self._semaphore:
+            if url is None and not self._routed:
+                await self._get_session()
+                return await super().make_request(method, params)
+            return await self._post(self.encode_rpc_request(method, params), url)
+
+    async def _send_batch(self, batch_requests):
+        async with self._semaphore:
+            if not self._routed:
+                await self._get_session()
+                return await super().make_batch_request(batch_requests)
+            return self._sort_batch_response(
+                await self._post(self.encode_batch_rpc_request(batch_requests))
+            )
+
+    async def _select_endpoint(self) -> str:
+        if self.health is None:
+            return self.endpoint_uri
+        if not self.health.started:
+            # The first round of health checks is blocking.
+            await asyncio.to_thread(self.health.start)
+        return self.health.select()
+
+    async def _post(self, request_data, url: Optional[str] = None):
+        url = url or await self._select_endpoint()
+        await self._get_session(url)
+        limiter = self.limits.get(url) if self.limits is not None else None
+        if limiter is not None:
+            await limiter.acquire_async()
+        started = time.monotonic()
+        try:
+            raw_response = await self._request_session_manager.async_make_post_request(
+                url, request_data, **self.get_request_kwargs()
+            )
+        except BaseException as error:
+            self._finish_post(url, limiter, error)
+            raise
+        self._finish_post(url, limiter)
+        self._record_latency(url, started)
+        return self.decode_rpc_response(raw_response)
+
+    async def stream_request(
+        self,
+        method,
+        params,
+        spool: bool = False,
+        spool_dir: Optional[str] = None,
+        chunk_size: int = 65536,
+        stream_path: str = "result",
+        read_timeout: Optional[float] = DEFAULT_HTTP_TIMEOUT,
+    ) -> AsyncStreamedResponse:
+        url = await self._select_endpoint()
+        await self._get_session(url)
+        # A stream may take far longer than any one request, so only the wait
+        # for each read is bounded rather than the whole response.
+        kwargs = self.get_request_kwargs()
+        kwargs["timeout"] = ClientTimeout(total=None, sock_read=read_timeout)
+        response = (
+            await self._request_session_manager.async_get_response_from_post_request(
+                url, data=self.encode_rpc_request(method, params), **kwargs
+            )
+        )
+        response.raise_for_status()
+        return AsyncStreamedResponse(
+            self,
+            method,
+            params,
+            response.content.iter_chunked(chunk_size),
+            spool,
+            spool_dir,
+            response.close,
+            stream_path,
+        )
+
+    async def make_batch_request(self, batch_requests):
+        pin = self._pinned_block.get()
+        if pin is not None:
+            return await pin.request_batch_async(
+                batch_requests, self._make_verified_batch
+            )
+        return await self._make_verified_batch(batch_requests)
+
+    async def _make_verified_batch(self, batch_requests):
+        responses = await self._send_batch(batch_requests)
+        return await self._async_verify(
+            self._verify_batch_response, batch_requests, responses
+        )
+
+    async def _async_check_logs_inclusion(self, method, params, resp):
+        block_hashes = self._log_block_hashes(resp)
+        headers = await self._async_get_block_data(
+            self._header_cache, "eth_getBlockByHash", block_hashes
+        )
+        receipts = None
+        if self.verify_log_receipts:
+            receipts = await self._async_get_block_data(
+                self._receipts_cache, "eth_getBlockReceipts", block_hashes
+            )
+        self._raise_excluded_log(
+            method, params, find_excluded_log(resp["result"], headers, receipts)
+        )
+
+    async def _async_get_block_data(self, cache, method, block_hashes):
+        found, missing = self._cached_block_data(cache, block_hashes)
+        if missing:
+            responses = await self.make_batch_request(
+                [self._block_request(method, block_hash) for block_hash in missing]
+            )
+            found.update(self._store_block_data(cache, missing, responses))
+        return found
+
+    async def _async_verify(self, verify, *args):
+        # Waiting on the verification pool would block the event loop.
+        if self.verification_pool is not None and not self.verification_pool.optimistic:
+            return await asyncio.to_thread(verify, *args)
+        return verify(*args)
+
+    async def disconnect(self) -> None:
+        await super().disconnect()
+        self._sessions.clear()
+
+
+def _response_digest(resp) -> str:
+    # Buckets in front of different clients word their errors differently, so
+    # error responses are compared by code alone.
+    if "error" in resp:
+        return "error:{}".format(resp["error"].get("code"))
+    return EncodedResult(resp.get("result")).digest()
+
+
+class _QuorumTally:
+    def __init__(self, method, params, providers, agreement):
+        self.method = method
+        self.params = params
+        self.names = [provider.endpoint_uri for provider in providers]
+        self.agreement = agreement
+        self.votes: list[Attestation] = []
+        self.responses: dict[str, StatelessRPCResponse] = {}
+        self.errors: dict[str, Exception] = {}
+        self.quorum: Optional[QuorumResult] = None
+
+    def add(self, name, resp) -> Optional[StatelessRPCResponse]:
+        digest = _response_digest(resp)
+        self.responses.setdefault(digest, resp)
+        self.votes.append(
+            {
+                "msg": digest,
+                "identity": name,
+                "signature": "",
+                "signatureFormat": None,
+                "hashAlgo": None,
+            }
+        )
+        self.quorum = evaluate_quorum(self.votes, self.agreement)
+        return self.responses[self.quorum.msg] if self.quorum.accepted else None
+
+    def add_error(self, name, error) -> None:
+        self.errors[name] = error
+
+    @property
+    def unreachable(self) -> bool:
+        remaining = len(self.names) - len(self.votes) - len(self.errors)
+        count = self.quorum.count if self.quorum is not None else 0
+        return count + remaining < self.agreement
+
+    def error(self) -> IntegrityError:
+        reason = "Buckets did not agree on the result"
+        if self.errors:
+            reason += ", failed buckets: {}".format(
+                ", ".join(
+                    "{} ({})".format(name, error) for name, error in self.errors.items()
+                )
+            )
+        return IntegrityError(
+            self.method,
+            self.params,
+            self.agreement,
+            self.names,
+            self.quorum,
+            reason=reason,
+        )
+
+
+class QuorumStatelessProvider(BaseProvider):
+    """
+    Sends every read to several independently configured StatelessProviders at
+    once, normally each in front of a different gateway, and returns as soon as
+    `agreement` of them (a majority by default) have returned the same verified
+    result. Buckets that fail, or whose own verification fails, count as
+    disagreeing. Non-idempotent requests only go to the first provider.
+
+    Every send gets a thread of its own, reused once it finishes, so requests
+    still running on a slow bucket after their quorum was reached never delay
+    the next requests.
+    """
+
+    def __init__(
+        self,
+        providers: list[StatelessProvider],
+        agreement: Optional[int] = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.providers = providers
+        self.agreement = agreement or len(providers) // 2 + 1
+        self._pool = ElasticExecutor("quorum")
+
+    def make_request(self, method, params):
+        if method in NON_IDEMPOTENT_METHODS:
+            return self.providers[0].make_request(method, params)
+        tally = _QuorumTally(method, params, self.providers, self.agreement)
+        futures = {
+            self._pool.submit(provider.make_request, method, params): name
+            for provider, name in zip(self.providers, tally.names)
+        }
+        try:
+            for future in as_completed(futures):
+                try:
+                    resp = future.result()
+                except Exception as error:
+                    tally.add_error(futures[future], error)
+                else:
+                    accepted = tally.add(futures[future], resp)
+                    if accepted is not None:
+                        return accepted
+                if tally.unreachable:
+                    break
+        finally:
+            # Stragglers are abandoned, they finish within the bucket's timeout.
+            for future in futures:
+                future.cancel()
+        raise tally.error()
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return any(provider.is_connected(show_traceback) for provider in self.providers)
+
+
+class AsyncQuorumStatelessProvider(AsyncBaseProvider):
+    """The coroutine counterpart of QuorumStatelessProvider, stragglers are cancelled."""
+
+    def __init__(
+        self,
+        providers: list[AsyncStatelessProvider],
+        agreement: Optional[int] = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.providers = providers
+        self.agreement = agreement or len(providers) // 2 + 1
+
+    async def make_request(self, method, params):
+        if method in NON_IDEMPOTENT_METHODS:
+            return await self.providers[0].make_request(method, params)
+        tally = _QuorumTally(method, params, self.providers, self.agreement)
+        tasks = {
+            asyncio.ensure_future(provider.make_request(method, params)): name
+            for provider, name in zip(self.providers, tally.names)
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        tally.add_error(tasks[task], task.exception())
+                        continue
+                    accepted = tally.add(tasks[task], task.result())
+                    if accepted is not None:
+                        return accepted
+                if tally.unreachable:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        raise tally.error()
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        for provider in self.providers:
+            if await provider.is_connected(show_traceback):
+                return True
+        return False
+
+    async def disconnect(self) -> None:
+        for provider in self.providers:
+            await provider.disconnect()
+
+
+# How clients answer a transaction they already have in their pool.
+ALREADY_KNOWN = re.compile(
+    r"already known|known transaction|alreadyknown|already exists|already imported",
+    re.IGNORECASE,
+)
+
+
+def _already_known(resp) -> bool:
+    error = resp.get("error")
+    if error is None:
+        return False
+    return bool(ALREADY_KNOWN.search(str(error.get("message", error))))
+
+
+class _Broadcast:
+    def __init__(self, params, providers):
+        self.params = params
+        self.names = [provider.endpoint_uri for provider in providers]
+        self.responses: dict[str, StatelessRPCResponse] = {}
+        self.errors: dict[str, Exception] = {}
+
+    def add(self, name, resp) -> Optional[StatelessRPCResponse]:
+        if "error" not in resp:
+            return resp
+        if _already_known(resp):
+            # The bucket has the transaction, its hash is the result either way.
+            return {
+                "jsonrpc": "2.0",
+                "id": resp.get("id"),
+                "result": encode_hex(keccak(hexstr=self.params[0])),
+            }
+        self.responses[name] = resp
+        return None
+
+    def add_error(self, name, error) -> None:
+        self.errors[name] = error
+
+    def failure(self) -> StatelessRPCResponse:
+        # Rejections are returned as a single bucket would return them, in the
+        # providers' order. Errors are raised when no bucket answered at all.
+        for name in self.names:
+            if name in self.responses:
+                return self.responses[name]
+        raise next(self.errors[name] for name in self.names if name in self.errors)
+
+
+class BroadcastStatelessProvider(BaseProvider):
+    """
+    Sends eth_sendRawTransaction to several StatelessProviders at once, normally
+    one per gateway or region, and returns as soon as one accepts it. Buckets
+    answering that they already know the transaction count as accepting it. The
+    other sends keep going in the background so the transaction reaches every
+    bucket. All other requests go to the first provider.
+    """
+
+    def __init__(self, providers: list[StatelessProvider], **kwargs):
+        super().__init__(**kwargs)
+        self.providers = providers
+        self.stats = {"broadcasts": 0, "already_known": 0, "rejected": 0}
+        self._lock = threading.Lock()
+        # Sends left running after one was accepted must not delay later ones.
+        self._pool = ElasticExecutor("broadcast")
+
+    def make_request(self, method, params):
+        if method not in BROADCAST_METHODS:
+            return self.providers[0].make_request(method, params)
+        self._count("broadcasts")
+        broadcast = _Broadcast(params, self.providers)
+        futures = {
+            self._pool.submit(provider.make_request, method, params): name
+            for provider, name in zip(self.providers, broadcast.names)
+        }
+        for future in as_completed(futures):
+            try:
+                resp = future.result()
+            except Exception as error:
+                broadcast.add_error(futures[future], error)
+                continue
+            accepted = broadcast.add(futures[future], resp)
+            if accepted is not None:
+                if accepted is not resp:
+                    self._count("already_known")
+                return accepted
+        self._count("rejected")
+        return broadcast.failure()
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return any(provider.is_connected(show_traceback) for provider in self.providers)
+
+
+class AsyncBroadcastStatelessProvider(AsyncBaseProvider):
+    """The coroutine counterpart of BroadcastStatelessProvider."""
+
+    def __init__(self, providers: list[AsyncStatelessProvider], **kwargs):
+        super().__init__(**kwargs)
+        self.providers = providers
+        self.stats = {"broadcasts": 0, "already_known": 0, "rejected": 0}
+        # Sends still running after one was accepted, referenced until done.
+        self._background: set[asyncio.Task] = set()
+
+    async def make_request(self, method, params):
+        if method not in BROADCAST_METHODS:
+            return await self.providers[0].make_request(method, params)
+        self.stats["broadcasts"] += 1
+        broadcast = _Broadcast(params, self.providers)
+        tasks = {
+            asyncio.ensure_future(provider.make_request(method, params)): name
+            for provider, name in zip(self.providers, broadcast.names)
+        }
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is not None:
+                    broadcast.add_error(tasks[task], task.exception())
+                    continue
+                accepted = broadcast.add(tasks[task], task.result())
+                if accepted is not None:
+                    if accepted is not task.result():
+                        self.stats["already_known"] += 1
+                    for straggler in pending:
+                        self._background.add(straggler)
+                        straggler.add_done_callback(self._finish_background)
+                    return accepted
+        self.stats["rejected"] += 1
+        return broadcast.failure()
+
+    def _finish_background(self, task) -> None:
+        self._background.discard(task)
+        # Retrieved so a failed straggler isn't logged as never retrieved.
+        if not task.cancelled():
+            task.exception()
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        for provider in self.providers:
+            if await provider.is_connected(show_traceback):
+                return True
+        return False
+
+    async def disconnect(self) -> None:
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        for provider in self.providers:
+            await provider.disconnect()
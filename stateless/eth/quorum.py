@@ -0,0 +1,68 @@
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from .types import Attestation
+
+
+@dataclass
+class QuorumResult:
+    accepted: bool
+    msg: Optional[str]
+    threshold: int
+    groups: dict[str, list[str]]
+    attestations: list[Attestation]
+    invalid: list[str] = field(default_factory=list)
+    result_digest: Optional[str] = None
+
+    @property
+    def count(self) -> int:
+        return len(self.groups[self.msg]) if self.msg is not None else 0
+
+    @property
+    def agreeing(self) -> list[str]:
+        return self.groups[self.msg] if self.msg is not None else []
+
+    @property
+    def disagreeing(self) -> list[str]:
+        return [
+            identity
+            for msg, identities in self.groups.items()
+            if msg != self.msg
+            for identity in identities
+        ] + self.invalid
+
+
+def attestation_identity(attestation: Attestation, index: int) -> str:
+    return attestation.get("identity") or "#{}".format(index)
+
+
+def evaluate_quorum(
+    attestations: list[Attestation],
+    threshold: int,
+    is_valid: Optional[Callable[[Attestation], bool]] = None,
+) -> QuorumResult:
+    groups: dict[str, list[str]] = {}
+    invalid = []
+    seen = set()
+    # An identity only gets one vote, duplicates after the first are ignored.
+    for index, attestation in enumerate(attestations):
+        identity = attestation_identity(attestation, index)
+        if identity in seen:
+            continue
+        seen.add(identity)
+        if is_valid is not None and not is_valid(attestation):
+            invalid.append(identity)
+            continue
+        groups.setdefault(attestation["msg"], []).append(identity)
+
+    msg = None
+    count = 0
+    tied = False
+    for candidate, identities in groups.items():
+        if len(identities) > count:
+            msg, count, tied = candidate, len(identities), False
+        elif len(identities) == count:
+            tied = True
+
+    accepted = count >= max(threshold, 1) and not tied
+    return QuorumResult(accepted, msg, threshold, groups, attestations, invalid)
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Union
+
+from eth_utils import encode_hex
+from web3.exceptions import Web3RPCError
+
+from .provider import AsyncStatelessProvider, StatelessProvider
+
+logger = logging.getLogger(__name__)
+
+Receipt = dict[str, Any]
+TransactionHash = Union[str, bytes]
+
+
+def _block_number(resp) -> int:
+    if "error" in resp:
+        raise Web3RPCError(str(resp["error"]), rpc_response=resp)
+    return int(resp["result"], 16)
+
+
+def _call_back(callback: Callable[[Receipt], Any]) -> Callable[[Any], None]:
+    def on_done(future) -> None:
+        if not future.cancelled():
+            callback(future.result())
+
+    return on_done
+
+
+class _ReceiptTracker:
+    def __init__(self, provider, poll_interval: float, batch_size: int):
+        self.provider = provider
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.block: Optional[int] = None
+        self.stats = {"polls": 0, "batches": 0, "resolved": 0, "errors": 0}
+        self._pending: dict[str, list[Union[Future, asyncio.Future]]] = {}
+        # Hashes added since the last round, looked up even without a new block.
+        self._unchecked: set[str] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _add(self, tx_hash: TransactionHash, future, callback) -> None:
+        if self._closed:
+            raise RuntimeError("The receipt watcher has been closed")
+        if callback is not None:
+            future.add_done_callback(_call_back(callback))
+        # Sending a transaction through web3 returns its hash as HexBytes.
+        if isinstance(tx_hash, (bytes, bytearray)):
+            tx_hash = encode_hex(tx_hash)
+        tx_hash = tx_hash.lower()
+        with self._lock:
+            self._pending.setdefault(tx_hash, []).append(future)
+            self._unchecked.add(tx_hash)
+
+    def _due(self, block: int) -> list[str]:
+        # Every pending hash on a new block, only the new ones otherwise.
+        with self._lock:
+            for tx_hash, futures in list(self._pending.items()):
+                futures[:] = [future for future in futures if not future.done()]
+                if not futures:
+                    del self._pending[tx_hash]
+                    self._unchecked.discard(tx_hash)
+            if block != self.block:
+                due = list(self._pending)
+            else:
+                due = list(self._unchecked)
+            self._unchecked.clear()
+            self.block = block
+        self.stats["polls"] += 1
+        return due
+
+    def _batches(self, due: list[str]) -> list[list[tuple[str, list[str]]]]:
+        return [
+            [
+                ("eth_getTransactionReceipt", [tx_hash])
+                for tx_hash in due[i : i + self.batch_size]
+            ]
+            for i in range(0, len(due), self.batch_size)
+        ]
+
+    def _resolve(self, batch, responses) -> int:
+        self.stats["batches"] += 1
+        # A single error object is returned when the whole batch is rejected.
+        if not isinstance(responses, list):
+            raise Web3RPCError(str(responses.get("error")), rpc_response=responses)
+        found = 0
+        for (_, (tx_hash,)), resp in zip(batch, responses):
+            receipt = resp.get("result")
+            if receipt is None:
+                continue
+            with self._lock:
+                futures = self._pending.pop(tx_hash, [])
+            for future in futures:
+                if not future.done():
+                    future.set_result(receipt)
+            found += 1
+        self.stats["resolved"] += found
+        return found
+
+    def _cancel_pending(self) -> None:
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+            self._unchecked.clear()
+        for futures in pending.values():
+            for future in futures:
+                future.cancel()
+
+
+class ReceiptWatcher(_ReceiptTracker):
+    """
+    Waits on the receipts of any number of transactions with one verified
+    eth_blockNumber request per `poll_interval`. Whenever the block number
+    changes, the receipts of every pending transaction are requested in batches
+    of up to `batch_size`, so polling costs a round trip per block rather than
+    one per transaction per interval. Transactions watched since the last round
+    are looked up on the next one without waiting for a new block.
+
+    Polling runs in a daemon thread started by the first `watch`, and is skipped
+    while nothing is pending. Rounds that fail are logged and retried on the
+    next one.
+    """
+
+    def __init__(
+        self,
+        provider: StatelessProvider,
+        poll_interval: float = 1.0,
+        batch_size: int = 500,
+    ):
+        super().__init__(provider, poll_interval, batch_size)
+        self._stopped = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def watch(
+        self,
+        tx_hash: TransactionHash,
+        callback: Optional[Callable[[Receipt], Any]] = None,
+    ) -> Future:
+        """
+        Returns a Future resolved with the transaction's receipt, which is also
+        passed to `callback` when given. Cancelling the Future stops the watch.
+        Raises RuntimeError once the watcher has been closed.
+        """
+        future: Future = Future()
+        self._add(tx_hash, future, callback)
+        self.start()
+        return future
+
+    def poll(self) -> int:
+        """Runs one round, returns the number of receipts found."""
+        if not self._pending:
+            return 0
+        block = _block_number(self.provider.make_request("eth_blockNumber", []))
+        found = 0
+        for batch in self._batches(self._due(block)):
+            found += self._resolve(batch, self.provider.make_batch_request(batch))
+        return found
+
+    def start(self) -> None:
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is not None:
+                return
+            self._worker = threading.Thread(
+                target=self._run, name="receipt-watcher", daemon=True
+            )
+        self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as error:
+                self.stats["errors"] += 1
+                logger.warning("Polling for receipts failed: %s", error)
+
+    def close(self) -> None:
+        """Stops polling and cancels the Futures still pending."""
+        self._stopped.set()
+        self._cancel_pending()
+
+
+class AsyncReceiptWatcher(_ReceiptTracker):
+    """
+    The coroutine counterpart of ReceiptWatcher, polling in a task on the loop
+    of the first `watch`.
+    """
+
+    def __init__(
+        self,
+        provider: AsyncStatelessProvider,
+        poll_interval: float = 1.0,
+        batch_size: int = 500,
+    ):
+        super().__init__(provider, poll_interval, batch_size)
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(
+        self,
+        tx_hash: TransactionHash,
+        callback: Optional[Callable[[Receipt], Any]] = None,
+    ) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._add(tx_hash, future, callback)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return future
+
+    async def poll(self) -> int:
+        if not self._pending:
+            return 0
+        block = _block_number(await self.provider.make_request("eth_blockNumber", []))
+        found = 0
+        for batch in self._batches(self._due(block)):
+            found += self._resolve(batch, await self.provider.make_batch_request(batch))
+        return found
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as error:
+                self.stats["errors"] += 1
+                logger.warning("Polling for receipts failed: %s", error)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._cancel_pending()
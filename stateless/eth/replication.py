@@ -0,0 +1,131 @@
+import inspect
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from web3.providers.base import BaseProvider
+
+from .methods import NON_IDEMPOTENT_METHODS, depends_on_head
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Divergence:
+    method: str
+    params: Any
+    result: Any
+    replica_result: Any
+    timestamp: float
+
+
+class ReplicationVerifier:
+    """
+    Replays a sample of verified requests against a second bucket in the background.
+
+    `replica` is any provider pointed at the second bucket, normally a
+    StatelessProvider so the replayed response is verified as well. Sampled
+    requests are queued without blocking the caller, and dropped when the queue
+    is full. Requests that follow the chain head are skipped unless
+    `include_head_dependent` is set, since two buckets at different heights
+    legitimately disagree on them.
+
+    The replica is called from a worker thread, so it must be a synchronous
+    provider, also when replicating requests made through AsyncStatelessProvider.
+    """
+
+    def __init__(
+        self,
+        replica: BaseProvider,
+        sample_rate: float = 0.01,
+        queue_size: int = 1000,
+        include_head_dependent: bool = False,
+        on_divergence: Optional[Callable[[Divergence], None]] = None,
+        max_divergences: int = 1000,
+    ):
+        if inspect.iscoroutinefunction(getattr(replica, "make_request", None)):
+            raise TypeError(
+                "Replica {!r} is asynchronous, ReplicationVerifier needs a "
+                "synchronous provider".format(replica)
+            )
+        self.replica = replica
+        self.sample_rate = sample_rate
+        self.include_head_dependent = include_head_dependent
+        self.on_divergence = on_divergence
+        self.divergences: deque[Divergence] = deque(maxlen=max_divergences)
+        self.stats = {"sampled": 0, "dropped": 0, "checked": 0, "errors": 0}
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def should_replicate(self, method, params) -> bool:
+        if method in NON_IDEMPOTENT_METHODS:
+            return False
+        if not self.include_head_dependent and depends_on_head(method, params):
+            return False
+        return random.random() < self.sample_rate
+
+    def submit(self, method, params, resp) -> bool:
+        if "error" in resp or not self.should_replicate(method, params):
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((method, params, resp.get("result")))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("sampled")
+        return True
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def join(self) -> None:
+        self._queue.join()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="replication-verifier", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            method, params, result = self._queue.get()
+            try:
+                self._check(method, params, result)
+            except Exception as failure:
+                self._count("errors")
+                logger.warning("Replication check of %s failed: %s", method, failure)
+            finally:
+                self._queue.task_done()
+
+    def _check(self, method, params, result) -> None:
+        try:
+            resp = self.replica.make_request(method, params)
+        except Exception as error:
+            self._count("errors")
+            logger.warning("Replicated %s request failed: %s", method, error)
+            return
+        self._count("checked")
+        if "error" in resp:
+            self._count("errors")
+            return
+        if resp.get("result") != result:
+            divergence = Divergence(
+                method, params, result, resp.get("result"), time.time()
+            )
+            self.divergences.append(divergence)
+            logger.error("Replica bucket diverged on %s with params %s", method, params)
+            if self.on_divergence is not None:
+                self.on_divergence(divergence)
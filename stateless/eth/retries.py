@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+import requests
+from aiohttp import ClientConnectionError
+
+from .limits import is_overload
+from .methods import NON_IDEMPOTENT_METHODS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetryConfig:
+    max_attempts: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 2.0
+
+    def delay(self, retry: int) -> float:
+        # Full jitter, spreads retries of requests that failed together.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent requests so a failing bucket doesn't
+    see its load multiplied. Each request deposits `ratio` of a retry, each
+    retry withdraws one, and `min_per_second` retries are always allowed so
+    low traffic can still retry.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.1,
+        min_per_second: float = 10.0,
+        max_balance: float = 100.0,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._balance = min_per_second
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, deposit: float) -> None:
+        now = time.monotonic()
+        self._balance = min(
+            self.max_balance,
+            self._balance + deposit + (now - self._updated_at) * self.min_per_second,
+        )
+        self._updated_at = now
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill(0)
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures worth another attempt."""
+    if isinstance(
+        error, (requests.ConnectionError, ClientConnectionError, ConnectionError)
+    ):
+        return True
+    if is_overload(error):
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    # An IntegrityError from too few attestations without any disagreement,
+    # some of the bucket's nodes just didn't answer in time.
+    quorum = getattr(error, "quorum", None)
+    return (
+        quorum is not None and not quorum.disagreeing and quorum.result_digest is None
+    )
+
+
+class RetryPolicy:
+    """
+    Retries idempotent requests that failed with a transient error.
+
+    `default` applies to every method without an entry in `methods`. Delays
+    grow exponentially with full jitter, and every retry is drawn from a shared
+    `budget`. Methods in NON_IDEMPOTENT_METHODS are never retried.
+    """
+
+    def __init__(
+        self,
+        default: Optional[RetryConfig] = None,
+        methods: Optional[dict[str, RetryConfig]] = None,
+        budget: Optional[RetryBudget] = None,
+        retry_on: Callable[[BaseException], bool] = is_retryable,
+    ):
+        self.default = default or RetryConfig()
+        self.methods = methods or {}
+        self.budget = budget or RetryBudget()
+        self.retry_on = retry_on
+        self.stats = {
+            "requests": 0,
+            "retries": 0,
+            "recovered": 0,
+            "exhausted": 0,
+            "budget_exceeded": 0,
+            "extra_latency": 0.0,
+        }
+        self._lock = threading.Lock()
+
+    def config(self, method: str) -> Optional[RetryConfig]:
+        if method in NON_IDEMPOTENT_METHODS:
+            return None
+        return self.methods.get(method, self.default)
+
+    def _count(self, stat: str, value: float = 1) -> None:
+        with self._lock:
+            self.stats[stat] += value
+
+    def _next_delay(self, method, config, attempt, error) -> Optional[float]:
+        # The delay before the next attempt, None when the error is final.
+        if not self.retry_on(error):
+            return None
+        if attempt + 1 >= config.max_attempts:
+            self._count("exhausted")
+            return None
+        if not self.budget.withdraw():
+            self._count("budget_exceeded")
+            return None
+        self._count("retries")
+        delay = config.delay(attempt)
+        logger.debug("Retrying %s in %.3fs after: %s", method, delay, error)
+        return delay
+
+    def _finish(self, first_failed_at: Optional[float], recovered: bool) -> None:
+        if first_failed_at is None:
+            return
+        if recovered:
+            self._count("recovered")
+        self._count("extra_latency", time.monotonic() - first_failed_at)
+
+    def call(self, method: str, fn: Callable[[], Any]) -> Any:
+        config = self.config(method)
+        if config is None:
+            return fn()
+        self._count("requests")
+        self.budget.deposit()
+        first_failed_at = None
+        attempt = 0
+        while True:
+            try:
+                result = fn()
+            except Exception as error:
+                first_failed_at = first_failed_at or time.monotonic()
+                delay = self._next_delay(method, config, attempt, error)
+                if delay is None:
+                    self._finish(first_failed_at, False)
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._finish(first_failed_at, True)
+            return result
+
+    async def call_async(self, method: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        config = self.config(method)
+        if config is None:
+            return await fn()
+        self._count("requests")
+        self.budget.deposit()
+        first_failed_at = None
+        attempt = 0
+        while True:
+            try:
+                result = await fn()
+            except Exception as error:
+                first_failed_at = first_failed_at or time.monotonic()
+                delay = self._next_delay(method, config, attempt, error)
+                if delay is None:
+                    self._finish(first_failed_at, False)
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._finish(first_failed_at, True)
+            return result
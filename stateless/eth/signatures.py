@@ -0,0 +1,118 @@
+import base64
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Optional
+
+from eth_keys import keys
+from eth_utils import decode_hex, is_hex
+
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+except ImportError:
+    Ed25519PublicKey = None
+
+SECP256K1_FORMATS = {"secp256k1", "eth", "ecdsa-secp256k1"}
+ED25519_FORMATS = {"ed25519", "ssh-ed25519"}
+DEFAULT_SIGNATURE_FORMAT = "secp256k1"
+
+VERIFIED_SIGNATURE_CACHE_SIZE = 65536
+
+
+def decode_bytes(value: str) -> bytes:
+    if value.startswith("0x") or is_hex(value) and len(value) % 2 == 0:
+        return decode_hex(value)
+    return base64.b64decode(value)
+
+
+def _verify_secp256k1(key: str, msg: bytes, signature: bytes) -> bool:
+    if len(signature) != 65:
+        return False
+    # Ethereum style signatures carry v as 27/28, eth_keys expects 0/1.
+    if signature[64] >= 27:
+        signature = signature[:64] + bytes([signature[64] - 27])
+    public_key = keys.Signature(signature).recover_public_key_from_msg_hash(msg)
+    if len(key) == 42:
+        return public_key.to_checksum_address().lower() == key.lower()
+    return public_key.to_bytes() == decode_bytes(key)[-64:]
+
+
+def _verify_ed25519(key: str, msg: bytes, signature: bytes) -> bool:
+    if Ed25519PublicKey is None:
+        raise ImportError(
+            "The cryptography package is required to verify ed25519 attestations"
+        )
+    try:
+        Ed25519PublicKey.from_public_bytes(decode_bytes(key)).verify(signature, msg)
+    except Exception:
+        return False
+    return True
+
+
+@lru_cache(maxsize=VERIFIED_SIGNATURE_CACHE_SIZE)
+def verify_signature(signature_format: str, key: str, msg: str, signature: str) -> bool:
+    """
+    Checks that `signature` over the attested message hash was produced by `key`.
+
+    Results are memoized on all four arguments, so repeated payloads signed by the
+    same identity cost a dictionary lookup instead of a signature check.
+    """
+    signature_format = signature_format.lower()
+    try:
+        msg_bytes = decode_bytes(msg)
+        signature_bytes = decode_bytes(signature)
+    except ValueError:
+        return False
+    if signature_format in SECP256K1_FORMATS:
+        try:
+            return _verify_secp256k1(key, msg_bytes, signature_bytes)
+        except Exception:
+            return False
+    if signature_format in ED25519_FORMATS:
+        return _verify_ed25519(key, msg_bytes, signature_bytes)
+    return False
+
+
+class IdentityKeyRegistry:
+    """
+    Maps provider identities to their published verification keys.
+
+    Keys passed in `keys` are pinned for the lifetime of the registry, any other
+    identity is resolved through `fetch` and cached for `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        keys: Optional[dict[str, str]] = None,
+        fetch: Optional[Callable[[str], Optional[str]]] = None,
+        ttl: float = 3600.0,
+    ):
+        self.keys = dict(keys or {})
+        self.fetch = fetch
+        self.ttl = ttl
+        self._cache: dict[str, tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, identity: str) -> Optional[str]:
+        key = self.keys.get(identity)
+        if key is not None or self.fetch is None:
+            return key
+
+        cached = self._cache.get(identity)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        with self._lock:
+            cached = self._cache.get(identity)
+            if cached is not None and cached[1] > time.monotonic():
+                return cached[0]
+            key = self.fetch(identity)
+            self._cache[identity] = (key, time.monotonic() + self.ttl)
+        return key
+
+    def invalidate(self, identity: Optional[str] = None) -> None:
+        with self._lock:
+            if identity is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(identity, None)
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+import ujson
+
+from .cache import BaseResponseCache
+from .encoding import EncodedResult
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    result BLOB NOT NULL,
+    attestations TEXT,
+    created_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+class SQLiteResponseStore(BaseResponseCache):
+    """
+    Persistent response cache shared by every process on a host.
+
+    Entries live in a SQLite database in WAL mode, so any number of processes can
+    read while one writes. Nothing is loaded up front, each lookup is a single
+    primary key probe. Attestations are stored next to each result so they can be
+    audited later through `audit`.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        finality_depth: int = 64,
+        head_max_age: float = 12.0,
+        timeout: float = 5.0,
+    ):
+        super().__init__(finality_depth, head_max_age)
+        self.path = os.fspath(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(SCHEMA)
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        row = (
+            self._connection()
+            .execute("SELECT result, attestations FROM responses WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return {
+            "result": ujson.loads(row[0]),
+            "attestations": ujson.loads(row[1]) if row[1] else None,
+        }
+
+    def set(self, key: str, entry: dict[str, Any], encoded: EncodedResult) -> None:
+        method = key.split(":", 1)[0]
+        attestations = entry.get("attestations")
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    method,
+                    encoded.encoded,
+                    ujson.dumps(attestations) if attestations else None,
+                    time.time(),
+                ),
+            )
+
+    def audit(self, method: Optional[str] = None) -> Iterator[dict[str, Any]]:
+        query = "SELECT key, result, attestations, created_at FROM responses"
+        args: tuple = ()
+        if method is not None:
+            query += " WHERE method = ?"
+            args = (method,)
+        for key, result, attestations, created_at in self._connection().execute(
+            query, args
+        ):
+            method_name, params = key.split(":", 1)
+            yield {
+                "method": method_name,
+                "params": ujson.loads(params),
+                "result": ujson.loads(result),
+                "attestations": ujson.loads(attestations) if attestations else None,
+                "created_at": created_at,
+            }
+
+    def __len__(self) -> int:
+        return (
+            self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        )
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,439 @@
+import codecs
+import json
+import tempfile
+import uuid
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+import ujson
+from web3.exceptions import Web3RPCError
+
+from .encoding import (
+    HASH_CONSTRUCTORS,
+    EncodedResult,
+    IncrementalEncodedList,
+    canonical_json,
+)
+
+FIELD = "field"
+OBJECT_START = "object_start"
+OBJECT_END = "object_end"
+ITEMS_START = "items_start"
+ITEM = "item"
+ITEMS_END = "items_end"
+
+_START, _KEY, _FIRST_KEY, _COLON, _VALUE, _AFTER_VALUE = range(6)
+_FIRST_ITEM, _ITEM, _AFTER_ITEM, _DONE = range(6, 10)
+
+_WHITESPACE = " \t\n\r"
+_INCOMPLETE = object()
+# Stands in for a streamed nested list while the rest of the result is encoded.
+_PLACEHOLDER = "streamed-{}".format(uuid.uuid4().hex)
+
+
+class IncrementalResponseParser:
+    """
+    Push parser for a single JSON-RPC response object.
+
+    Bytes are fed as they arrive and complete events come back: a FIELD event
+    for every member, except a list at `stream_path` which is reported item by
+    item between ITEMS_START and ITEMS_END. A dotted path such as
+    "result.structLogs" streams a list nested in the result, the objects leading
+    to it are reported between OBJECT_START and OBJECT_END and their other
+    members as FIELD events. Only the item being parsed is ever held in memory.
+    """
+
+    def __init__(self, stream_path: str = "result"):
+        self.stream_path = stream_path.split(".")
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decode = json.JSONDecoder().raw_decode
+        self._buffer = ""
+        self._pos = 0
+        # Text fed since the buffer was last filled, joined only when parsing
+        # needs it so a large value isn't copied on every chunk.
+        self._chunks: list[str] = []
+        self._pending = 0
+        self._state = _START
+        self._key: Optional[str] = None
+        # Keys of the objects entered along the stream path.
+        self._objects: list[str] = []
+        self._eof = False
+        # Retrying a value after every chunk would be quadratic in its size, so
+        # wait for the unparsed tail to double first.
+        self._wait_for = 0
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, data: bytes) -> list[tuple]:
+        self._append(self._text.decode(data))
+        return self._parse()
+
+    def close(self) -> list[tuple]:
+        self._append(self._text.decode(b"", final=True))
+        self._eof = True
+        events = self._parse()
+        if self._state != _DONE:
+            raise ValueError("Truncated JSON-RPC response")
+        return events
+
+    def _append(self, text: str) -> None:
+        if text:
+            self._chunks.append(text)
+            self._pending += len(text)
+
+    def _fill(self) -> None:
+        self._buffer = self._buffer[self._pos :] + "".join(self._chunks)
+        self._pos = 0
+        self._chunks.clear()
+        self._pending = 0
+
+    def _value(self) -> Any:
+        pending = len(self._buffer) - self._pos + self._pending
+        if not self._eof and pending < self._wait_for:
+            return _INCOMPLETE
+        if self._chunks:
+            self._fill()
+        try:
+            value, end = self._decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            self._wait_for = pending * 2
+            return _INCOMPLETE
+        # A number running up to the end of the buffer may continue in the
+        # next chunk.
+        if end == len(self._buffer) and not self._eof:
+            self._wait_for = pending + 1
+            return _INCOMPLETE
+        self._wait_for = 0
+        self._pos = end
+        return value
+
+    def _expect(self, char: str) -> None:
+        raise ValueError(
+            "Expected {} at offset {} of the JSON-RPC response, got {!r}".format(
+                char, self._pos, self._buffer[self._pos]
+            )
+        )
+
+    def _close_object(self, events: list[tuple]) -> None:
+        self._pos += 1
+        if self._objects:
+            self._objects.pop()
+            events.append((OBJECT_END,))
+            self._state = _AFTER_VALUE
+        else:
+            self._state = _DONE
+
+    def _parse(self) -> list[tuple]:
+        events: list[tuple] = []
+        while True:
+            buffer = self._buffer
+            while self._pos < len(buffer) and buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos >= len(buffer):
+                if not self._chunks:
+                    return events
+                self._fill()
+                continue
+            char = buffer[self._pos]
+            state = self._state
+
+            if state == _START:
+                if char != "{":
+                    self._expect("{")
+                self._pos += 1
+                self._state = _FIRST_KEY
+            elif state in (_FIRST_KEY, _KEY):
+                if char == "}" and state == _FIRST_KEY:
+                    self._close_object(events)
+                    continue
+                if char != '"':
+                    self._expect("a member name")
+                key = self._value()
+                if key is _INCOMPLETE:
+                    return events
+                self._key = key
+                self._state = _COLON
+            elif state == _COLON:
+                if char != ":":
+                    self._expect(":")
+                self._pos += 1
+                self._state = _VALUE
+            elif state == _VALUE:
+                path = self._objects + [self._key]
+                if char == "[" and path == self.stream_path:
+                    self._pos += 1
+                    events.append((ITEMS_START,))
+                    self._state = _FIRST_ITEM
+                    continue
+                if char == "{" and path == self.stream_path[: len(path)]:
+                    self._pos += 1
+                    self._objects.append(self._key)
+                    events.append((OBJECT_START, self._key))
+                    self._state = _FIRST_KEY
+                    continue
+                value = self._value()
+                if value is _INCOMPLETE:
+                    return events
+                events.append((FIELD, self._key, value))
+                self._state = _AFTER_VALUE
+            elif state == _AFTER_VALUE:
+                if char not in ",}":
+                    self._expect(", or }")
+                if char == "}":
+                    self._close_object(events)
+                    continue
+                self._pos += 1
+                self._state = _KEY
+            elif state in (_FIRST_ITEM, _ITEM):
+                if char == "]" and state == _FIRST_ITEM:
+                    self._pos += 1
+                    events.append((ITEMS_END,))
+                    self._state = _AFTER_VALUE
+                    continue
+                item = self._value()
+                if item is _INCOMPLETE:
+                    return events
+                events.append((ITEM, item))
+                self._state = _AFTER_ITEM
+            elif state == _AFTER_ITEM:
+                if char not in ",]":
+                    self._expect(", or ]")
+                self._pos += 1
+                if char == ",":
+                    self._state = _ITEM
+                else:
+                    events.append((ITEMS_END,))
+                    self._state = _AFTER_VALUE
+            else:
+                raise ValueError("Unexpected data after the JSON-RPC response")
+
+
+class _StreamVerifier:
+    # Collects a streamed response and verifies it through the provider once
+    # the whole body has been read.
+
+    def __init__(self, provider, method, params, stream_path, spool, spool_dir):
+        self.provider = provider
+        self.method = method
+        self.params = params
+        self.stream_path = stream_path.split(".")
+        self.fields: dict[str, Any] = {}
+        self.encoded: Optional[IncrementalEncodedList] = None
+        self.spool = tempfile.TemporaryFile(dir=spool_dir) if spool else None
+        self._objects: list[dict[str, Any]] = [self.fields]
+        # The object holding the streamed list.
+        self._container = self.fields
+        self._hash_algos: Any = ()
+
+    def add_field(self, key: str, value: Any) -> None:
+        self._objects[-1][key] = value
+
+    def start_object(self, key: str) -> None:
+        self._objects[-1][key] = {}
+        self._objects.append(self._objects[-1][key])
+
+    def end_object(self) -> None:
+        self._objects.pop()
+
+    def _encoded_around(self) -> tuple[bytes, bytes]:
+        # The canonical encoding of the result before and after a nested list.
+        if len(self.stream_path) == 1:
+            return b"", b""
+        self._container[self.stream_path[-1]] = _PLACEHOLDER
+        try:
+            encoded = canonical_json(self.fields[self.stream_path[0]])
+        finally:
+            del self._container[self.stream_path[-1]]
+        prefix, suffix = encoded.split(canonical_json(_PLACEHOLDER))
+        return prefix, suffix
+
+    def start_items(self) -> None:
+        hash_algos: Any = ()
+        if self.provider.verify_result_hash:
+            if "attestations" in self.fields:
+                hash_algos = {
+                    a.get("hashAlgo") for a in self.fields["attestations"] or []
+                }
+            else:
+                # Attestations come later in the body, hash with everything
+                # they could name.
+                hash_algos = HASH_CONSTRUCTORS
+        self._hash_algos = hash_algos
+        self._container = self._objects[-1]
+        self.encoded = IncrementalEncodedList(hash_algos, self._encoded_around()[0])
+
+    def add_item(self, item: Any) -> None:
+        encoded = self.encoded.update(item)
+        if self.spool is not None:
+            self.spool.write(encoded)
+            self.spool.write(b"\n")
+
+    def finish(self) -> dict[str, Any]:
+        resp = dict(self.fields)
+        if "error" in resp:
+            error = resp["error"]
+            message = error.get("message") if isinstance(error, dict) else error
+            raise Web3RPCError(str(message), rpc_response=resp)
+        encoded = self.encoded
+        if encoded is None:
+            encoded = EncodedResult(resp.get("result"))
+        else:
+            prefix, suffix = self._encoded_around()
+            if prefix != encoded.prefix:
+                encoded = self._rehash(prefix)
+            encoded.finish(suffix)
+        return self.provider._verify_response(
+            self.method, self.params, resp, encoded=encoded
+        )
+
+    def _rehash(self, prefix: bytes) -> IncrementalEncodedList:
+        # Members of the result that sort before the list but followed it on
+        # the wire change what precedes the list in its canonical encoding.
+        if not self.encoded.hashing:
+            self.encoded.size += len(prefix) - len(self.encoded.prefix)
+            self.encoded.prefix = prefix
+            return self.encoded
+        if self.spool is None:
+            raise ValueError(
+                "Members of the result followed the streamed {}, stream with "
+                "spool=True to verify it".format(".".join(self.stream_path))
+            )
+        encoded = IncrementalEncodedList(self._hash_algos, prefix)
+        self.spool.seek(0)
+        for line in self.spool:
+            encoded.add(line.rstrip(b"\n"))
+        self.encoded = encoded
+        return encoded
+
+    def spooled_items(self) -> Iterator[Any]:
+        self.spool.seek(0)
+        for line in self.spool:
+            yield ujson.loads(line)
+
+    def close(self) -> None:
+        if self.spool is not None:
+            self.spool.close()
+
+
+class StreamedResponse:
+    """
+    A verified JSON-RPC response read incrementally from the wire.
+
+    Iterating yields the items of a list result one at a time, or a non-list
+    result as a single item. A list nested in the result, such as the
+    structLogs of debug_traceTransaction, is streamed with a `stream_path` like
+    "result.structLogs". By default items are yielded as soon as they are
+    parsed and the response is verified once the body ends, so an
+    IntegrityError surfaces at the end of the iteration. With `spool` set, items
+    are written to a temporary file first and only yielded once the response
+    has been verified. Once iterated, `response` holds every member except the
+    streamed list, and `size` and `count` describe the result.
+    """
+
+    def __init__(
+        self,
+        provider,
+        method,
+        params,
+        chunks: Iterator[bytes],
+        spool: bool = False,
+        spool_dir: Optional[str] = None,
+        close: Optional[Callable[[], None]] = None,
+        stream_path: str = "result",
+    ):
+        if stream_path.split(".")[0] != "result":
+            raise ValueError(
+                "Only the result can be streamed, not {}".format(stream_path)
+            )
+        self._chunks = chunks
+        self._close = close
+        self._verifier = _StreamVerifier(
+            provider, method, params, stream_path, spool, spool_dir
+        )
+        self._parser = IncrementalResponseParser(stream_path)
+        self.response: Optional[dict[str, Any]] = None
+
+    @property
+    def size(self) -> Optional[int]:
+        encoded = self._verifier.encoded
+        return len(encoded) if encoded is not None else None
+
+    @property
+    def count(self) -> Optional[int]:
+        encoded = self._verifier.encoded
+        return encoded.count if encoded is not None else None
+
+    def _handle(self, events) -> Iterator[Any]:
+        verifier = self._verifier
+        for event in events:
+            if event[0] == ITEM:
+                verifier.add_item(event[1])
+                if verifier.spool is None:
+                    yield event[1]
+            elif event[0] == FIELD:
+                verifier.add_field(event[1], event[2])
+            elif event[0] == OBJECT_START:
+                verifier.start_object(event[1])
+            elif event[0] == OBJECT_END:
+                verifier.end_object()
+            elif event[0] == ITEMS_START:
+                verifier.start_items()
+
+    def __iter__(self) -> Iterator[Any]:
+        verifier = self._verifier
+        try:
+            for chunk in self._chunks:
+                yield from self._handle(self._parser.feed(chunk))
+            yield from self._handle(self._parser.close())
+            self.response = verifier.finish()
+            if verifier.encoded is None:
+                yield self.response.get("result")
+            elif verifier.spool is not None:
+                yield from verifier.spooled_items()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._verifier.close()
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def __enter__(self) -> "StreamedResponse":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class AsyncStreamedResponse(StreamedResponse):
+    """StreamedResponse over an async byte stream, iterated with `async for`."""
+
+    def __iter__(self):
+        raise TypeError("Use async for to iterate an AsyncStreamedResponse")
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        verifier = self._verifier
+        try:
+            async for chunk in self._chunks:
+                for item in self._handle(self._parser.feed(chunk)):
+                    yield item
+            for item in self._handle(self._parser.close()):
+                yield item
+            self.response = await verifier.provider._async_verify(verifier.finish)
+            if verifier.encoded is None:
+                yield self.response.get("result")
+            elif verifier.spool is not None:
+                for item in verifier.spooled_items():
+                    yield item
+        finally:
+            self.close()
+
+    async def __aenter__(self) -> "AsyncStreamedResponse":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,23 @@
+from typing import Any, Optional, TypedDict
+
+
+class Attestation(TypedDict):
+    signature: str
+    msg: str
+    signatureFormat: Optional[str]
+    hashAlgo: Optional[str]
+    identity: Optional[str]
+
+
+class StatelessRPCResponse(TypedDict):
+    id: str
+    jsonrpc: str
+    result: dict[str, Any]
+    attestations: list[Attestation]
+
+
+class NodeHealth(TypedDict):
+    provider: str
+    latency: float
+    height: int
+    region: str
@@ -0,0 +1,96 @@
+import itertools
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ElasticExecutor:
+    """
+    Runs each call on an idle worker thread, or on a new one when every worker
+    is busy, so calls still running for earlier requests never hold up later
+    ones. Workers idle for `idle_timeout` seconds exit.
+    """
+
+    def __init__(self, thread_name_prefix: str = "worker", idle_timeout: float = 60.0):
+        self.thread_name_prefix = thread_name_prefix
+        self.idle_timeout = idle_timeout
+        self.workers = 0
+        self._idle = 0
+        self._names = itertools.count(1)
+        self._calls: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            spawn = self._idle == 0
+            if spawn:
+                self.workers += 1
+                name = "{}_{}".format(self.thread_name_prefix, next(self._names))
+            else:
+                self._idle -= 1
+        self._calls.put((future, fn, args))
+        if spawn:
+            threading.Thread(target=self._work, name=name, daemon=True).start()
+        return future
+
+    def _work(self) -> None:
+        while True:
+            try:
+                future, fn, args = self._calls.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    # No idle worker left means a call was handed to this one
+                    # just as it timed out.
+                    if self._idle > 0:
+                        self._idle -= 1
+                        self.workers -= 1
+                        return
+                continue
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args)
+                except BaseException as error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            with self._lock:
+                self._idle += 1
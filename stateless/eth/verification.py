@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, Optional
+
+from .signatures import verify_signature
+
+logger = logging.getLogger(__name__)
+
+SignatureCheck = tuple[str, str, str, str]
+
+
+class VerificationMode(Enum):
+    BLOCKING = "blocking"
+    OPTIMISTIC = "optimistic"
+
+
+def verify_signatures(checks: list[SignatureCheck]) -> list[bool]:
+    return [verify_signature(*check) for check in checks]
+
+
+class VerificationPool:
+    """
+    Runs attestation signature checks on an executor instead of the calling thread.
+
+    Checks submitted by concurrent requests are coalesced into batches of up to
+    `batch_size` signatures, or whatever arrived within `batch_interval` seconds,
+    and each batch is split evenly across the executor's workers, so a process
+    pool pays one round of pickling per worker and batch rather than per
+    response. In OPTIMISTIC mode providers return responses before their
+    signatures are checked and failures are reported to `on_failure`, so those
+    responses are never cached or kept by a pinned block.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        mode: VerificationMode = VerificationMode.BLOCKING,
+        batch_size: int = 64,
+        batch_interval: float = 0.001,
+        on_failure: Optional[Callable[[Exception], None]] = None,
+        max_failures: int = 1000,
+    ):
+        self.executor = executor or ThreadPoolExecutor(thread_name_prefix="verify")
+        # Thread and process pools both expose their size as _max_workers.
+        self._workers = max(getattr(self.executor, "_max_workers", 1), 1)
+        self.mode = VerificationMode(mode)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.on_failure = on_failure
+        self.failures: deque[Exception] = deque(maxlen=max_failures)
+        self._pending: list[tuple[list[SignatureCheck], Future]] = []
+        self._pending_checks = 0
+        self._deadline = 0.0
+        self._condition = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+
+    @property
+    def optimistic(self) -> bool:
+        return self.mode is VerificationMode.OPTIMISTIC
+
+    def submit(self, checks: list[SignatureCheck]) -> "Future[list[bool]]":
+        future: Future = Future()
+        if not checks:
+            future.set_result([])
+            return future
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The verification pool has been closed")
+            if not self._pending:
+                self._deadline = time.monotonic() + self.batch_interval
+                self._condition.notify()
+            self._pending.append((checks, future))
+            self._pending_checks += len(checks)
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run, name="verification-flusher", daemon=True
+                )
+                self._flusher.start()
+            if self._pending_checks >= self.batch_size:
+                self._flush()
+        return future
+
+    def verify(self, checks: list[SignatureCheck]) -> list[bool]:
+        return self.submit(checks).result()
+
+    def report_failure(self, error: Exception) -> None:
+        self.failures.append(error)
+        if self.on_failure is not None:
+            self.on_failure(error)
+        else:
+            logger.error(
+                "Optimistically returned response failed verification: %s", error
+            )
+
+    def raise_failures(self) -> None:
+        if self.failures:
+            raise self.failures.popleft()
+
+    def close(self, wait: bool = True) -> None:
+        with self._condition:
+            self._closed = True
+            self._flush()
+            self._condition.notify()
+        self.executor.shutdown(wait=wait)
+
+    def _run(self) -> None:
+        with self._condition:
+            while not self._closed:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                self._flush()
+
+    def _flush(self) -> None:
+        # Must be called with the condition held.
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_checks = self._pending, [], 0
+        checks = [check for response_checks, _ in batch for check in response_checks]
+        size = -(-len(checks) // self._workers)
+        jobs = [
+            self.executor.submit(verify_signatures, checks[start : start + size])
+            for start in range(0, len(checks), size)
+        ]
+        lock, remaining = threading.Lock(), [len(jobs)]
+
+        def on_done(done: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            self._resolve(batch, jobs)
+
+        for job in jobs:
+            job.add_done_callback(on_done)
+
+    @staticmethod
+    def _resolve(batch, jobs: list[Future]) -> None:
+        error = next(filter(None, (job.exception() for job in jobs)), None)
+        results = [] if error is not None else [r for job in jobs for r in job.result()]
+        offset = 0
+        for checks, future in batch:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[offset : offset + len(checks)])
+            offset += len(checks)
@@ -0,0 +1,1919 @@
+import asyncio
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from aiohttp import ClientTimeout
+from eth_keys import keys
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from stateless.eth.backfill import ChunkSizer, iter_logs
+from stateless.eth.cache import ResponseCache
+from stateless.eth.encoding import EncodedResult
+from stateless.eth.forensics import Forensics, ReportStore, structural_diff
+from stateless.eth.health import HealthMonitor
+from stateless.eth.hedging import HedgeExecutor, HedgePolicy
+from stateless.eth.instrumentation import (
+    ATTESTATIONS,
+    REQUEST_BYTES,
+    REQUESTS,
+    VERIFY_SECONDS,
+    Histogram,
+    HistogramSink,
+    Instrumentation,
+    PrometheusSink,
+)
+from stateless.eth.limits import AdaptiveLimiter, BucketLimits
+from stateless.eth.logs import bloom_bits
+from stateless.eth.nonces import AsyncNonceManager, NonceManager
+from stateless.eth.provider import (
+    AsyncBroadcastStatelessProvider,
+    AsyncStatelessProvider,
+    BroadcastStatelessProvider,
+    IntegrityError,
+    QuorumStatelessProvider,
+    StatelessProvider,
+)
+from stateless.eth.quorum import evaluate_quorum
+from stateless.eth.receipts import AsyncReceiptWatcher, ReceiptWatcher
+from stateless.eth.replication import ReplicationVerifier
+from stateless.eth.retries import RetryBudget, RetryConfig, RetryPolicy
+from stateless.eth.signatures import IdentityKeyRegistry, verify_signature
+from stateless.eth.store import SQLiteResponseStore
+from stateless.eth.streaming import (
+    FIELD,
+    ITEM,
+    ITEMS_END,
+    ITEMS_START,
+    OBJECT_END,
+    OBJECT_START,
+    IncrementalResponseParser,
+)
+from stateless.eth.verification import VerificationMode, VerificationPool
+
+URL = "https://api.stateless.solutions/ethereum/v1/bucket"
+PROVIDERS = ["https://stateless.bargsystems.com", "https://stateless.nodefleet.org"]
+
+
+def make_attestation(msg, identity):
+    return {
+        "signature": "0x00",
+        "msg": msg,
+        "signatureFormat": None,
+        "hashAlgo": None,
+        "identity": identity,
+    }
+
+
+def make_response(result, msgs, request_id=1):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "result": result,
+        "attestations": [
+            make_attestation(msg, identity) for msg, identity in zip(msgs, PROVIDERS)
+        ],
+    }
+
+
+def encode(resp):
+    return json.dumps(resp).encode()
+
+
+def test_stateless_provider_accepts_consistent_attestations():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    body = encode(make_response("0x10", ["0xaa", "0xaa"]))
+    with patch.object(
+        provider._request_session_manager, "make_post_request", return_value=body
+    ):
+        assert provider.make_request("eth_blockNumber", [])["result"] == "0x10"
+
+
+def test_stateless_provider_rejects_inconsistent_attestations():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    body = encode(make_response("0x10", ["0xaa", "0xbb"]))
+    with patch.object(
+        provider._request_session_manager, "make_post_request", return_value=body
+    ):
+        with pytest.raises(IntegrityError):
+            provider.make_request("eth_blockNumber", [])
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_caps_in_flight_requests():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS, max_concurrency=2)
+    in_flight = 0
+    peak = 0
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return encode(make_response("0x10", ["0xaa", "0xaa"]))
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        responses = await asyncio.gather(
+            *(provider.make_request("eth_blockNumber", []) for _ in range(6))
+        )
+    await provider.disconnect()
+
+    assert [resp["result"] for resp in responses] == ["0x10"] * 6
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_rejects_inconsistent_attestations():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS)
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        return encode(make_response("0x10", ["0xaa", "0xbb"]))
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        with pytest.raises(IntegrityError):
+            await provider.make_request("eth_blockNumber", [])
+    await provider.disconnect()
+
+
+def test_integrity_error_pickles_and_reprs():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    body = encode(make_response("0x10", ["0xaa", "0xbb"]))
+    with patch.object(
+        provider._request_session_manager, "make_post_request", return_value=body
+    ):
+        with pytest.raises(IntegrityError) as exc_info:
+            provider.make_request("eth_getBalance", ["0x01", "0x10"])
+
+    error = pickle.loads(pickle.dumps(exc_info.value))
+    assert error.params == ["0x01", "0x10"]
+    assert error.quorum.count == 1
+    assert str(error) == str(exc_info.value)
+    assert "eth_getBalance" in repr(exc_info.value)
+
+
+def test_stateless_provider_batch_names_failing_request():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    body = encode(
+        [
+            make_response("0x1", ["0xaa", "0xaa"], request_id=0),
+            make_response("0x2", ["0xaa", "0xbb"], request_id=1),
+        ]
+    )
+    batch = [("eth_getBalance", ["0x01", "0x10"]), ("eth_getBalance", ["0x02", "0x10"])]
+    provider.request_counter = iter(range(2))
+    with patch.object(
+        provider._request_session_manager, "make_post_request", return_value=body
+    ) as post:
+        with pytest.raises(IntegrityError) as exc_info:
+            provider.make_batch_request(batch)
+
+    assert post.call_count == 1
+    assert exc_info.value.batch_index == 1
+    assert exc_info.value.params == ["0x02", "0x10"]
+
+
+def test_stateless_provider_batch_returns_verified_responses():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    body = encode(
+        [
+            make_response("0x2", ["0xbb", "0xbb"], request_id=1),
+            make_response("0x1", ["0xaa", "0xaa"], request_id=0),
+        ]
+    )
+    batch = [("eth_getBalance", ["0x01", "0x10"]), ("eth_getBalance", ["0x02", "0x10"])]
+    provider.request_counter = iter(range(2))
+    with patch.object(
+        provider._request_session_manager, "make_post_request", return_value=body
+    ):
+        responses = provider.make_batch_request(batch)
+
+    assert [resp["result"] for resp in responses] == ["0x1", "0x2"]
+
+
+@pytest.mark.parametrize(
+    "msgs,threshold,accepted,disagreeing",
+    [
+        (["0xaa", "0xaa", "0xaa", "0xbb"], 3, True, ["id3"]),
+        (["0xaa", "0xaa", "0xbb", "0xbb"], 2, False, ["id2", "id3"]),
+        (["0xaa", "0xaa", "0xbb", "0xcc"], 3, False, ["id2", "id3"]),
+        (["0xaa"], 2, False, []),
+        ([], 1, False, []),
+    ],
+)
+def test_evaluate_quorum(msgs, threshold, accepted, disagreeing):
+    attestations = [
+        make_attestation(msg, "id{}".format(index)) for index, msg in enumerate(msgs)
+    ]
+    quorum = evaluate_quorum(attestations, threshold)
+
+    assert quorum.accepted is accepted
+    assert quorum.disagreeing == disagreeing
+
+
+def test_evaluate_quorum_counts_each_identity_once():
+    attestations = [make_attestation("0xaa", "id0"), make_attestation("0xaa", "id0")]
+
+    assert not evaluate_quorum(attestations, 2).accepted
+
+
+def test_stateless_provider_rejects_single_attestation_below_threshold():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    resp = make_response("0x10", ["0xaa"])
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        return_value=encode(resp),
+    ):
+        with pytest.raises(IntegrityError) as exc_info:
+            provider.make_request("eth_blockNumber", [])
+
+    assert exc_info.value.quorum.count == 1
+
+
+def make_signed_attestation(private_key, msg, identity):
+    signature = private_key.sign_msg_hash(bytes.fromhex(msg[2:]))
+    attestation = make_attestation(msg, identity)
+    attestation["signature"] = signature.to_hex()
+    attestation["signatureFormat"] = "secp256k1"
+    return attestation
+
+
+def test_verify_signature_recovers_identity_key():
+    private_key = keys.PrivateKey(b"\x01" * 32)
+    msg = "0x" + "ab" * 32
+    signature = private_key.sign_msg_hash(bytes.fromhex("ab" * 32)).to_hex()
+    address = private_key.public_key.to_checksum_address()
+
+    assert verify_signature("secp256k1", address, msg, signature)
+    assert verify_signature(
+        "secp256k1", private_key.public_key.to_hex(), msg, signature
+    )
+    assert not verify_signature("secp256k1", address, "0x" + "cd" * 32, signature)
+
+
+def test_identity_key_registry_caches_fetched_keys():
+    fetched = []
+
+    def fetch(identity):
+        fetched.append(identity)
+        return "0x" + "00" * 20
+
+    registry = IdentityKeyRegistry(fetch=fetch)
+    registry.get(PROVIDERS[0])
+    registry.get(PROVIDERS[0])
+
+    assert fetched == [PROVIDERS[0]]
+
+
+def test_stateless_provider_rejects_forged_signatures():
+    honest_key = keys.PrivateKey(b"\x01" * 32)
+    forger_key = keys.PrivateKey(b"\x02" * 32)
+    registry = IdentityKeyRegistry(
+        {
+            identity: honest_key.public_key.to_checksum_address()
+            for identity in PROVIDERS
+        }
+    )
+    provider = StatelessProvider(URL, 2, PROVIDERS, key_registry=registry)
+    msg = "0x" + "ab" * 32
+    resp = make_response("0x10", [])
+    resp["attestations"] = [
+        make_signed_attestation(honest_key, msg, PROVIDERS[0]),
+        make_signed_attestation(forger_key, msg, PROVIDERS[1]),
+    ]
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        return_value=encode(resp),
+    ):
+        with pytest.raises(IntegrityError) as exc_info:
+            provider.make_request("eth_blockNumber", [])
+
+    assert exc_info.value.quorum.invalid == [PROVIDERS[1]]
+
+
+def make_forged_response():
+    honest_key = keys.PrivateKey(b"\x01" * 32)
+    forger_key = keys.PrivateKey(b"\x02" * 32)
+    registry = IdentityKeyRegistry(
+        {
+            identity: honest_key.public_key.to_checksum_address()
+            for identity in PROVIDERS
+        }
+    )
+    msg = "0x" + "ef" * 32
+    resp = make_response("0x10", [])
+    resp["attestations"] = [
+        make_signed_attestation(honest_key, msg, PROVIDERS[0]),
+        make_signed_attestation(forger_key, msg, PROVIDERS[1]),
+    ]
+    return registry, resp
+
+
+def test_stateless_provider_blocking_verification_pool():
+    registry, resp = make_forged_response()
+    pool = VerificationPool(batch_size=4)
+    provider = StatelessProvider(
+        URL, 2, PROVIDERS, key_registry=registry, verification_pool=pool
+    )
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        return_value=encode(resp),
+    ):
+        with pytest.raises(IntegrityError):
+            provider.make_request("eth_blockNumber", [])
+    pool.close()
+
+
+def test_verification_pool_spreads_batches_across_workers():
+    private_key = keys.PrivateKey(b"\x01" * 32)
+    key = private_key.public_key.to_checksum_address()
+    checks = []
+    for index in range(8):
+        msg = "0x" + "{:02x}".format(index) * 32
+        signature = private_key.sign_msg_hash(bytes.fromhex(msg[2:])).to_hex()
+        checks.append(("secp256k1", key, msg, signature))
+    checks[5] = checks[5][:3] + (checks[0][3],)
+    executor = ThreadPoolExecutor(max_workers=4)
+    sizes = []
+    submit = executor.submit
+
+    def record_submit(fn, jobs):
+        sizes.append(len(jobs))
+        return submit(fn, jobs)
+
+    executor.submit = record_submit
+    pool = VerificationPool(executor, batch_size=64)
+
+    assert pool.verify(checks) == [True] * 5 + [False] + [True] * 2
+    assert sizes == [2, 2, 2, 2]
+    pool.close()
+
+
+def test_stateless_provider_optimistic_verification_pool():
+    registry, resp = make_forged_response()
+    failures = []
+    pool = VerificationPool(
+        mode=VerificationMode.OPTIMISTIC, on_failure=failures.append
+    )
+    provider = StatelessProvider(
+        URL, 2, PROVIDERS, key_registry=registry, verification_pool=pool
+    )
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        return_value=encode(resp),
+    ):
+        assert provider.make_request("eth_blockNumber", [])["result"] == "0x10"
+    pool.close()
+
+    assert len(failures) == 1
+    assert isinstance(failures[0], IntegrityError)
+    with pytest.raises(IntegrityError):
+        pool.raise_failures()
+
+
+def test_stateless_provider_keeps_no_optimistically_verified_responses():
+    registry, resp = make_forged_response()
+    failures = []
+    pool = VerificationPool(
+        mode=VerificationMode.OPTIMISTIC, on_failure=failures.append
+    )
+    cache = ResponseCache()
+    provider = StatelessProvider(
+        URL, 2, PROVIDERS, key_registry=registry, verification_pool=pool, cache=cache
+    )
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        return_value=encode(resp),
+    ) as post:
+        provider.make_request("eth_chainId", [])
+        provider.make_request("eth_chainId", [])
+        with provider.pin_block(0x10) as pin:
+            provider.make_request("eth_getBalance", ["0x01"])
+            provider.make_request("eth_getBalance", ["0x01"])
+    pool.close()
+
+    assert post.call_count == 4
+    assert cache.stats["stores"] == 0
+    assert pin.responses == {}
+    assert len(failures) == 4
+
+
+def test_encoded_result_is_canonical():
+    encoded = EncodedResult({"b": ["0x1", None], "a": "a/b"})
+
+    assert encoded.encoded == b'{"a":"a/b","b":["0x1",null]}'
+    assert encoded.matches("0x" + encoded.digest("sha256"), "SHA-256")
+    assert encoded.digest("md4") is None
+
+
+@pytest.mark.parametrize(
+    "hash_algo,result,accepted",
+    [
+        ("sha256", "0x10", True),
+        ("keccak256", "0x10", True),
+        ("sha256", "0x11", False),
+    ],
+)
+def test_stateless_provider_recomputes_result_hash(hash_algo, result, accepted):
+    msg = EncodedResult("0x10").digest(hash_algo)
+    resp = make_response(result, [msg, msg])
+    for attestation in resp["attestations"]:
+        attestation["hashAlgo"] = hash_algo
+    provider = StatelessProvider(URL, 2, PROVIDERS, verify_result_hash=True)
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        return_value=encode(resp),
+    ):
+        if accepted:
+            assert provider.make_request("eth_blockNumber", [])["result"] == result
+        else:
+            with pytest.raises(IntegrityError) as exc_info:
+                provider.make_request("eth_blockNumber", [])
+            assert exc_info.value.quorum.result_digest == EncodedResult(result).digest(
+                hash_algo
+            )
+
+
+def make_rpc_server(results):
+    """Answers single and batch requests with attested results keyed by method."""
+
+    def fake_post(endpoint_uri, data, **kwargs):
+        request = json.loads(data)
+        requests = request if isinstance(request, list) else [request]
+        responses = [
+            make_response(
+                results[item["method"]](item["params"]),
+                ["0xaa", "0xaa"],
+                request_id=item["id"],
+            )
+            for item in requests
+        ]
+        return encode(responses if isinstance(request, list) else responses[0])
+
+    return fake_post
+
+
+def make_log(address, topic, block_hash="0x" + "01" * 32):
+    return {
+        "address": address,
+        "topics": [topic],
+        "data": "0x",
+        "blockHash": block_hash,
+        "blockNumber": "0x10",
+        "transactionHash": "0x" + "02" * 32,
+        "logIndex": "0x0",
+    }
+
+
+@pytest.mark.parametrize("included", [True, False])
+def test_stateless_provider_verifies_logs_inclusion(included):
+    address = "0x" + "11" * 20
+    topic = "0x" + "22" * 32
+    bloom = 0
+    for value in (address, topic if included else "0x" + "33" * 32):
+        for bit in bloom_bits(bytes.fromhex(value[2:])):
+            bloom |= 1 << bit
+    header = {
+        "hash": "0x" + "01" * 32,
+        "number": "0x10",
+        "logsBloom": "0x{:0512x}".format(bloom),
+        "receiptsRoot": "0x" + "00" * 32,
+    }
+    fake_post = make_rpc_server(
+        {
+            "eth_getLogs": lambda params: [make_log(address, topic)],
+            "eth_getBlockByHash": lambda params: header,
+        }
+    )
+    provider = StatelessProvider(URL, 2, PROVIDERS, verify_logs_inclusion=True)
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        side_effect=fake_post,
+    ) as post:
+        if included:
+            provider.make_request("eth_getLogs", [{"fromBlock": "0x10"}])
+            provider.make_request("eth_getLogs", [{"fromBlock": "0x10"}])
+            assert post.call_count == 3
+        else:
+            with pytest.raises(IntegrityError) as exc_info:
+                provider.make_request("eth_getLogs", [{"fromBlock": "0x10"}])
+            assert "not included" in str(exc_info.value)
+
+
+def make_logs_server(address, topic, blocks):
+    bloom = 0
+    for value in (address, topic):
+        for bit in bloom_bits(bytes.fromhex(value[2:])):
+            bloom |= 1 << bit
+    block_hashes = ["0x{:064x}".format(number + 1) for number in range(blocks)]
+    return make_rpc_server(
+        {
+            "eth_getLogs": lambda params: [
+                make_log(address, topic, block_hash) for block_hash in block_hashes
+            ],
+            "eth_getBlockByHash": lambda params: {
+                "hash": params[0],
+                "number": "0x10",
+                "logsBloom": "0x{:0512x}".format(bloom),
+                "receiptsRoot": "0x" + "00" * 32,
+            },
+        }
+    )
+
+
+def test_stateless_provider_verifies_logs_spanning_more_blocks_than_cached():
+    fake_post = make_logs_server("0x" + "11" * 20, "0x" + "22" * 32, 10)
+    provider = StatelessProvider(
+        URL, 2, PROVIDERS, verify_logs_inclusion=True, header_cache_size=4
+    )
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=fake_post
+    ):
+        resp = provider.make_request("eth_getLogs", [{"fromBlock": "0x10"}])
+
+    assert len(resp["result"]) == 10
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_verifies_logs_spanning_more_blocks_than_cached():
+    server = make_logs_server("0x" + "11" * 20, "0x" + "22" * 32, 10)
+    provider = AsyncStatelessProvider(
+        URL, 2, PROVIDERS, verify_logs_inclusion=True, header_cache_size=4
+    )
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        return server(endpoint_uri, data)
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        resp = await provider.make_request("eth_getLogs", [{"fromBlock": "0x10"}])
+    await provider.disconnect()
+
+    assert len(resp["result"]) == 10
+
+
+def test_stateless_provider_replicates_sampled_requests():
+    replica = Mock()
+    replica.make_request.return_value = make_response("0x20", ["0xcc", "0xcc"])
+    replication = ReplicationVerifier(replica, sample_rate=1.0)
+    provider = StatelessProvider(URL, 2, PROVIDERS, replication=replication)
+    body = encode(make_response("0x10", ["0xaa", "0xaa"]))
+    with patch.object(
+        provider._request_session_manager, "make_post_request", return_value=body
+    ):
+        provider.make_request("eth_getBalance", ["0x01", "0x10"])
+        provider.make_request("eth_getBalance", ["0x01", "latest"])
+        provider.make_request("eth_sendRawTransaction", ["0x02"])
+    replication.join()
+
+    replica.make_request.assert_called_once_with("eth_getBalance", ["0x01", "0x10"])
+    assert replication.divergences[0].replica_result == "0x20"
+    assert replication.stats["checked"] == 1
+
+
+def test_replication_verifier_survives_failing_checks():
+    replica = Mock()
+    replica.make_request.return_value = make_response("0x20", ["0xcc", "0xcc"])
+    on_divergence = Mock(side_effect=ValueError("handler failed"))
+    replication = ReplicationVerifier(
+        replica, sample_rate=1.0, on_divergence=on_divergence
+    )
+    for params in (["0x01", "0x10"], ["0x02", "0x10"]):
+        replication.submit("eth_getBalance", params, {"result": "0x10"})
+    replication.join()
+
+    assert on_divergence.call_count == 2
+    assert replication.stats["errors"] == 2
+
+
+def test_replication_verifier_rejects_async_replica():
+    with pytest.raises(TypeError):
+        ReplicationVerifier(AsyncStatelessProvider(URL, 2, PROVIDERS))
+
+
+def test_stateless_provider_caches_final_responses():
+    fake_post = make_rpc_server(
+        {
+            "eth_blockNumber": lambda params: "0x100",
+            "eth_getBlockByNumber": lambda params: {"number": "0x10", "hash": "0x01"},
+            "eth_getBalance": lambda params: "0x1",
+        }
+    )
+    cache = ResponseCache(finality_depth=64)
+    provider = StatelessProvider(URL, 2, PROVIDERS, cache=cache)
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=fake_post
+    ) as post:
+        for _ in range(2):
+            provider.make_request("eth_getBlockByNumber", ["0x10", False])
+            provider.make_request("eth_getBalance", ["0x01", "latest"])
+            provider.make_request("eth_getBalance", ["0x01", "0xff"])
+
+    methods = [json.loads(call.args[1])["method"] for call in post.call_args_list]
+    assert methods.count("eth_getBlockByNumber") == 1
+    assert methods.count("eth_getBalance") == 4
+    assert methods.count("eth_blockNumber") == 1
+
+
+def test_stateless_provider_caches_static_responses_without_head():
+    fake_post = make_rpc_server({"eth_chainId": lambda params: "0x1"})
+    provider = StatelessProvider(URL, 2, PROVIDERS, cache=ResponseCache())
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=fake_post
+    ) as post:
+        provider.make_request("eth_chainId", [])
+        provider.make_request("eth_chainId", [])
+
+    methods = [json.loads(call.args[1])["method"] for call in post.call_args_list]
+    assert methods == ["eth_chainId"]
+
+
+def test_response_cache_evicts_by_size():
+    cache = ResponseCache(max_entries=10, max_bytes=10)
+    cache.set("a", {"result": "a"}, EncodedResult("aaaa"))
+    cache.set("b", {"result": "b"}, EncodedResult("bbbb"))
+
+    assert cache.get("a") is None
+    assert cache.get("b") == {"result": "b"}
+    assert cache.size == 6
+
+
+def test_sqlite_response_store_is_shared_between_instances(tmp_path):
+    path = tmp_path / "responses.db"
+    writer = SQLiteResponseStore(path, finality_depth=0)
+    writer.observe_head(0x100)
+    resp = make_response({"number": "0x10"}, ["0xaa", "0xaa"])
+
+    assert writer.store("eth_getBlockByNumber", ["0x10", False], resp)
+
+    reader = SQLiteResponseStore(path)
+    cached = reader.lookup("eth_getBlockByNumber", ["0x10", False])
+    assert cached["result"] == {"number": "0x10"}
+    assert [entry["attestations"] for entry in reader.audit()] == [resp["attestations"]]
+    assert len(reader) == 1
+
+
+def test_stateless_provider_coalesces_identical_requests():
+    provider = StatelessProvider(URL, 2, PROVIDERS, coalesce=True)
+
+    def slow_post(endpoint_uri, data, **kwargs):
+        time.sleep(0.05)
+        return encode(make_response("0x10", ["0xaa", "0xaa"]))
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=slow_post
+    ) as post:
+        with ThreadPoolExecutor(5) as executor:
+            futures = [
+                executor.submit(provider.make_request, "eth_blockNumber", [])
+                for _ in range(5)
+            ]
+            results = [future.result()["result"] for future in futures]
+
+    assert results == ["0x10"] * 5
+    assert post.call_count == 1
+
+
+def test_stateless_provider_coalescing_releases_failed_requests():
+    provider = StatelessProvider(URL, 2, PROVIDERS, coalesce=True)
+
+    def failing_post(endpoint_uri, data, **kwargs):
+        time.sleep(0.02)
+        raise ConnectionError("reset")
+
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        side_effect=failing_post,
+    ):
+        with ThreadPoolExecutor(3) as executor:
+            futures = [
+                executor.submit(provider.make_request, "eth_blockNumber", [])
+                for _ in range(3)
+            ]
+            for future in futures:
+                with pytest.raises(ConnectionError):
+                    future.result()
+
+    assert len(provider._single_flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_coalesces_identical_requests():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS, coalesce=True)
+    calls = 0
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return encode(make_response("0x10", ["0xaa", "0xaa"]))
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        await asyncio.gather(
+            *(provider.make_request("eth_blockNumber", []) for _ in range(5))
+        )
+    await provider.disconnect()
+
+    assert calls == 1
+    assert len(provider._single_flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_coalescing_survives_cancelled_leader():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS, coalesce=True)
+    calls = 0
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return encode(make_response("0x10", ["0xaa", "0xaa"]))
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        leader = asyncio.ensure_future(provider.make_request("eth_blockNumber", []))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(provider.make_request("eth_blockNumber", []))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        resp = await asyncio.wait_for(follower, 1)
+    await provider.disconnect()
+
+    assert leader.cancelled()
+    assert resp["result"] == "0x10"
+    assert calls == 1
+    assert len(provider._single_flight) == 0
+
+
+def test_stateless_provider_micro_batches_concurrent_requests():
+    provider = StatelessProvider(URL, 2, PROVIDERS, batch_window=0.05)
+    sizes = []
+
+    def fake_post(endpoint_uri, data, **kwargs):
+        requests = json.loads(data)
+        sizes.append(len(requests))
+        return encode(
+            [
+                make_response(
+                    item["params"][0],
+                    ["0xaa", "0xbb" if item["params"][0] == "0x2" else "0xaa"],
+                    request_id=item["id"],
+                )
+                for item in requests
+            ]
+        )
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=fake_post
+    ):
+        with ThreadPoolExecutor(4) as executor:
+            futures = {
+                value: executor.submit(provider.make_request, "eth_getBalance", [value])
+                for value in ("0x0", "0x1", "0x2", "0x3")
+            }
+            with pytest.raises(IntegrityError):
+                futures["0x2"].result()
+            results = [
+                futures[value].result()["result"] for value in ("0x0", "0x1", "0x3")
+            ]
+
+    assert sizes == [4]
+    assert results == ["0x0", "0x1", "0x3"]
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_micro_batches_concurrent_requests():
+    provider = AsyncStatelessProvider(
+        URL, 2, PROVIDERS, batch_window=0.05, batch_max_size=3
+    )
+    sizes = []
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        requests = json.loads(data)
+        sizes.append(len(requests))
+        return encode(
+            [
+                make_response(
+                    item["params"][0], ["0xaa", "0xaa"], request_id=item["id"]
+                )
+                for item in requests
+            ]
+        )
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        responses = await asyncio.gather(
+            *(provider.make_request("eth_getBalance", [hex(i)]) for i in range(5))
+        )
+    await provider.disconnect()
+
+    assert sorted(sizes) == [2, 3]
+    assert [resp["result"] for resp in responses] == [hex(i) for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_micro_batch_survives_cancelled_caller():
+    provider = AsyncStatelessProvider(
+        URL, 2, PROVIDERS, batch_window=0.05, batch_max_size=10
+    )
+    sizes = []
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        requests = json.loads(data)
+        sizes.append(len(requests))
+        return encode(
+            [
+                make_response(
+                    item["params"][0], ["0xaa", "0xaa"], request_id=item["id"]
+                )
+                for item in requests
+            ]
+        )
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        first = asyncio.ensure_future(provider.make_request("eth_getBalance", ["0x0"]))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(provider.make_request("eth_getBalance", ["0x1"]))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        resp = await asyncio.wait_for(second, 1)
+        later = await asyncio.wait_for(
+            provider.make_request("eth_getBalance", ["0x2"]), 1
+        )
+    await provider.disconnect()
+
+    assert first.cancelled()
+    assert resp["result"] == "0x1"
+    assert later["result"] == "0x2"
+    assert sizes == [1, 1]
+
+
+def test_iter_logs_splits_ranges_and_yields_in_block_order():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    ranges = []
+
+    def fake_post(endpoint_uri, data, **kwargs):
+        request = json.loads(data)
+        log_filter = request["params"][0]
+        start, end = int(log_filter["fromBlock"], 16), int(log_filter["toBlock"], 16)
+        ranges.append((start, end))
+        if end - start >= 16:
+            return encode(
+                {
+                    "jsonrpc": "2.0",
+                    "id": request["id"],
+                    "error": {
+                        "code": -32005,
+                        "message": "query returned more than 10000 results",
+                    },
+                }
+            )
+        time.sleep(0.001 * (end % 3))
+        logs = [
+            {**make_log("0x" + "11" * 20, "0x" + "22" * 32), "blockNumber": hex(number)}
+            for number in range(end, start - 1, -1)
+        ]
+        return encode(make_response(logs, ["0xaa", "0xaa"], request_id=request["id"]))
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=fake_post
+    ):
+        logs = list(
+            iter_logs(
+                provider,
+                {"fromBlock": "0x0", "toBlock": hex(99)},
+                sizer=ChunkSizer(size=40),
+            )
+        )
+
+    assert [int(log["blockNumber"], 16) for log in logs] == list(range(100))
+    assert all(end - start < 16 for start, end in ranges[-5:])
+
+
+def test_chunk_sizer_adapts_to_results_and_latency():
+    sizer = ChunkSizer(size=100, target_logs=1000, target_latency=1.0)
+    sizer.observe(100, 10, 0.1)
+    assert sizer.size == 200
+    sizer.observe(200, 5000, 0.1)
+    assert sizer.size == 100
+    sizer.observe(100, 10, 3.0)
+    assert sizer.size == 50
+
+
+def make_streamed_body(result, msg, chunk_size=7):
+    # Attestations after the result, as the bucket may order them either way.
+    body = json.dumps(
+        {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "result": result,
+            **make_response(result, [msg, msg]),
+        }
+    ).encode()
+    return [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+
+@pytest.mark.parametrize("spool", [False, True])
+def test_stateless_provider_streams_verified_results(spool, tmp_path):
+    provider = StatelessProvider(URL, 2, PROVIDERS, verify_result_hash=True)
+    logs = [make_log("0x" + "11" * 20, "0x" + "22" * 32) for _ in range(20)]
+    response = Mock()
+    response.iter_content.return_value = make_streamed_body(
+        logs, EncodedResult(logs).digest()
+    )
+
+    with patch.object(
+        provider._request_session_manager,
+        "get_response_from_post_request",
+        return_value=response,
+    ) as post:
+        streamed = provider.stream_request(
+            "eth_getLogs", [{}], spool=spool, spool_dir=tmp_path
+        )
+        assert list(streamed) == logs
+
+    assert post.call_args.kwargs["stream"] is True
+    assert streamed.count == 20
+    assert streamed.size == len(EncodedResult(logs))
+    response.close.assert_called_once()
+
+
+def make_trace(struct_logs_first=False):
+    struct_logs = [{"pc": pc, "op": "PUSH1", "stack": []} for pc in range(10)]
+    trace = {"gas": 21000, "failed": False, "returnValue": ""}
+    if struct_logs_first:
+        return {"structLogs": struct_logs, **trace}
+    return {**trace, "structLogs": struct_logs}
+
+
+@pytest.mark.parametrize("spool", [False, True])
+@pytest.mark.parametrize("struct_logs_first", [False, True])
+def test_stateless_provider_streams_nested_trace_logs(
+    spool, struct_logs_first, tmp_path
+):
+    provider = StatelessProvider(URL, 2, PROVIDERS, verify_result_hash=True)
+    trace = make_trace(struct_logs_first)
+    response = Mock()
+    response.iter_content.return_value = make_streamed_body(
+        trace, EncodedResult(trace).digest()
+    )
+
+    with patch.object(
+        provider._request_session_manager,
+        "get_response_from_post_request",
+        return_value=response,
+    ):
+        streamed = provider.stream_request(
+            "debug_traceTransaction",
+            ["0x01"],
+            spool=spool,
+            spool_dir=tmp_path,
+            stream_path="result.structLogs",
+        )
+        if struct_logs_first and not spool:
+            # The members sorting before structLogs only arrive after it.
+            with pytest.raises(ValueError):
+                list(streamed)
+            return
+        items = list(streamed)
+
+    assert items == trace["structLogs"]
+    assert streamed.response["result"] == {
+        "gas": 21000,
+        "failed": False,
+        "returnValue": "",
+    }
+    assert streamed.count == 10
+    assert streamed.size == len(EncodedResult(trace))
+
+
+def test_incremental_response_parser_streams_nested_list_byte_by_byte():
+    parser = IncrementalResponseParser("result.structLogs")
+    body = json.dumps(
+        {"id": 1, "result": {"gas": 1, "structLogs": [{"pc": 0}, {"pc": 1}]}}
+    ).encode()
+    events = []
+    for i in range(len(body)):
+        events += parser.feed(body[i : i + 1])
+    events += parser.close()
+
+    assert events == [
+        (FIELD, "id", 1),
+        (OBJECT_START, "result"),
+        (FIELD, "gas", 1),
+        (ITEMS_START,),
+        (ITEM, {"pc": 0}),
+        (ITEM, {"pc": 1}),
+        (ITEMS_END,),
+        (OBJECT_END,),
+    ]
+
+
+def test_stateless_provider_stream_rejects_mismatched_hash():
+    provider = StatelessProvider(URL, 2, PROVIDERS, verify_result_hash=True)
+    logs = [make_log("0x" + "11" * 20, "0x" + "22" * 32)]
+    response = Mock()
+    response.iter_content.return_value = make_streamed_body(
+        logs, EncodedResult([]).digest()
+    )
+
+    with patch.object(
+        provider._request_session_manager,
+        "get_response_from_post_request",
+        return_value=response,
+    ):
+        with pytest.raises(IntegrityError):
+            list(provider.stream_request("eth_getLogs", [{}], spool=True))
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_streams_verified_results():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS, verify_result_hash=True)
+    result = {"structLogs": [{"pc": pc, "op": "PUSH1"} for pc in range(10)]}
+    chunks = make_streamed_body(result, EncodedResult(result).digest())
+
+    async def iter_chunked(chunk_size):
+        for chunk in chunks:
+            yield chunk
+
+    response = Mock()
+    response.content.iter_chunked = iter_chunked
+
+    timeouts = []
+
+    async def fake_post(endpoint_uri, *args, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return response
+
+    with patch.object(
+        provider._request_session_manager,
+        "async_get_response_from_post_request",
+        fake_post,
+    ):
+        streamed = await provider.stream_request(
+            "debug_traceTransaction", ["0x01"], read_timeout=5
+        )
+        items = [item async for item in streamed]
+    await provider.disconnect()
+
+    assert items == [result]
+    assert timeouts == [ClientTimeout(total=None, sock_read=5)]
+    response.close.assert_called_once()
+
+
+def make_node_health(height, latency=1.0):
+    return {"provider": "p", "latency": latency, "height": height, "region": "us"}
+
+
+def test_health_monitor_selects_fastest_synced_bucket():
+    nodes = {
+        "https://a": [make_node_health(120), make_node_health(100)],
+        "https://b": [make_node_health(119), make_node_health(120)],
+        "https://c": [make_node_health(120), make_node_health(0)],
+    }
+    monitor = HealthMonitor(list(nodes), interval=60, max_lag=5, fetch=nodes.get)
+    monitor.start()
+    monitor.record("https://b", 0.2)
+    monitor.record("https://c", 0.05)
+
+    assert monitor.select() == "https://c"
+    monitor.mark_failed("https://c")
+    assert monitor.select() == "https://b"
+    monitor.close()
+
+
+def test_stateless_provider_routes_requests_to_healthy_bucket():
+    urls = [URL, URL.replace("bucket", "other")]
+    provider = StatelessProvider(urls, 2, PROVIDERS)
+    provider.health.fetch = lambda url: [make_node_health(100 if url == URL else 200)]
+
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        side_effect=make_rpc_server({"eth_blockNumber": lambda params: "0xc8"}),
+    ) as post:
+        provider.make_request("eth_blockNumber", [])
+    provider.health.close()
+
+    assert post.call_args.args[0] == urls[1]
+    assert provider.health.buckets[urls[1]].latency is not None
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_keeps_connections_alive_to_routed_bucket():
+    urls = [URL, URL.replace("bucket", "other")]
+    provider = AsyncStatelessProvider(urls, 2, PROVIDERS)
+    provider.health.fetch = lambda url: [make_node_health(100 if url == URL else 200)]
+    server = make_rpc_server({"eth_blockNumber": lambda params: "0xc8"})
+    sessions = {}
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        manager = provider._request_session_manager
+        sessions[endpoint_uri] = await manager.async_cache_and_return_session(
+            endpoint_uri
+        )
+        return server(endpoint_uri, data)
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        await provider.make_request("eth_blockNumber", [])
+    provider.health.close()
+
+    assert list(sessions) == [urls[1]]
+    assert not sessions[urls[1]].connector.force_close
+    await provider.disconnect()
+
+
+def test_async_stateless_provider_keeps_connections_alive_across_event_loops():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS)
+    server = make_rpc_server({"eth_blockNumber": lambda params: "0xc8"})
+    sessions = []
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        manager = provider._request_session_manager
+        sessions.append(await manager.async_cache_and_return_session(endpoint_uri))
+        return server(endpoint_uri, data)
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        asyncio.run(provider.make_request("eth_blockNumber", []))
+        asyncio.run(provider.make_request("eth_blockNumber", []))
+
+    assert sessions[0] is not sessions[1]
+    assert not any(session.connector.force_close for session in sessions)
+
+
+def test_stateless_provider_hedges_slow_requests():
+    policy = HedgePolicy(initial_delay=0.02)
+    provider = StatelessProvider(URL, 2, PROVIDERS, hedging=policy)
+    calls = []
+
+    def fake_post(endpoint_uri, data, **kwargs):
+        calls.append(endpoint_uri)
+        if len(calls) == 1:
+            time.sleep(0.5)
+        return encode(make_response("0x10", ["0xaa", "0xaa"]))
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=fake_post
+    ):
+        started = time.monotonic()
+        assert provider.make_request("eth_blockNumber", [])["result"] == "0x10"
+        assert time.monotonic() - started < 0.4
+        provider.make_request("eth_sendRawTransaction", ["0x00"])
+
+    assert policy.stats == {"requests": 1, "hedged": 1, "hedge_wins": 1}
+    assert policy.hedge_rate == policy.win_rate == 1.0
+
+
+def test_stateless_provider_hedges_with_cache_under_load():
+    policy = HedgePolicy(initial_delay=0.005)
+    provider = StatelessProvider(
+        URL, 2, PROVIDERS, cache=ResponseCache(), hedging=policy
+    )
+    provider._hedge_pool = HedgeExecutor(max_workers=4)
+    fake_post = make_rpc_server(
+        {
+            "eth_blockNumber": lambda params: "0x1000",
+            "eth_getBalance": lambda params: "0x1",
+        }
+    )
+
+    def slow_post(endpoint_uri, data, **kwargs):
+        time.sleep(0.02)
+        return fake_post(endpoint_uri, data)
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", slow_post
+    ):
+        with ThreadPoolExecutor(8) as pool:
+            # Every miss refreshes the stale head from within a hedged attempt.
+            futures = [
+                pool.submit(provider.make_request, "eth_getBalance", ["0x00", hex(n)])
+                for n in range(16)
+            ]
+            results = [future.result(timeout=5)["result"] for future in futures]
+
+    assert results == ["0x1"] * 16
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_cancels_losing_hedge():
+    policy = HedgePolicy(initial_delay=0.02)
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS, hedging=policy)
+    calls = 0
+    cancelled = asyncio.Event()
+
+    async def fake_post(endpoint_uri, data, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return encode(make_response("0x10", ["0xaa", "0xaa"]))
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", fake_post
+    ):
+        resp = await provider.make_request("eth_blockNumber", [])
+        await asyncio.wait_for(cancelled.wait(), 1)
+    await provider.disconnect()
+
+    assert resp["result"] == "0x10"
+    assert policy.stats["hedge_wins"] == 1
+
+
+def make_bucket_provider(url, result, delay=0.0):
+    provider = StatelessProvider(url, 2, PROVIDERS)
+
+    def fake_post(endpoint_uri, data, **kwargs):
+        time.sleep(delay)
+        return encode(make_response(result, ["0xaa", "0xaa"], json.loads(data)["id"]))
+
+    provider._request_session_manager.make_post_request = fake_post
+    return provider
+
+
+def test_quorum_provider_returns_once_buckets_agree():
+    provider = QuorumStatelessProvider(
+        [
+            make_bucket_provider("https://a", "0x10"),
+            make_bucket_provider("https://b", "0x10", delay=0.02),
+            make_bucket_provider("https://c", "0x11", delay=1.0),
+        ]
+    )
+
+    started = time.monotonic()
+    assert provider.make_request("eth_blockNumber", [])["result"] == "0x10"
+    assert time.monotonic() - started < 0.5
+
+
+def test_quorum_provider_rejects_disagreeing_buckets():
+    provider = QuorumStatelessProvider(
+        [
+            make_bucket_provider("https://a", "0x10"),
+            make_bucket_provider("https://b", "0x11"),
+            make_bucket_provider("https://c", "0x12"),
+        ]
+    )
+
+    with pytest.raises(IntegrityError) as error:
+        provider.make_request("eth_blockNumber", [])
+    assert error.value.quorum.count == 1
+    assert sorted(error.value.quorum.disagreeing + error.value.quorum.agreeing) == [
+        "https://a",
+        "https://b",
+        "https://c",
+    ]
+
+
+def test_quorum_provider_is_not_held_up_by_stragglers_under_load():
+    provider = QuorumStatelessProvider(
+        [
+            make_bucket_provider("https://a", "0x10"),
+            make_bucket_provider("https://b", "0x10", delay=0.01),
+            make_bucket_provider("https://c", "0x11", delay=0.5),
+        ]
+    )
+
+    def read(_):
+        return provider.make_request("eth_blockNumber", [])["result"]
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(read, range(40)))
+
+    assert results == ["0x10"] * 40
+    assert time.monotonic() - started < 0.5
+
+
+def test_adaptive_limiter_backs_off_on_overload():
+    limiter = AdaptiveLimiter(initial_limit=4, max_limit=8)
+    for _ in range(4):
+        assert limiter.try_acquire()[0]
+    assert limiter.try_acquire() == (False, None)
+
+    limiter.release(overloaded=True)
+    assert limiter.limit == 2
+    limiter.release(failed=True)
+    assert limiter.limit == 2
+    for _ in range(2):
+        limiter.release()
+    assert limiter.limit == pytest.approx(2.9)
+    assert limiter.in_flight == 0
+
+
+def test_adaptive_limiter_rate_limits():
+    limiter = AdaptiveLimiter(rate=100, burst=2)
+    assert limiter.try_acquire()[0] and limiter.try_acquire()[0]
+    acquired, wait = limiter.try_acquire()
+    assert not acquired and 0 < wait <= 0.01
+
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.005
+
+
+def test_bucket_limits_share_state_between_processes():
+    name = "stateless-test-{}".format(os.getpid())
+    first = BucketLimits(shared_name=name, initial_limit=2).get(URL)
+    second = BucketLimits(shared_name=name, initial_limit=2).get(URL)
+    try:
+        first.acquire()
+        second.acquire()
+        assert not first.try_acquire()[0]
+        second.release(overloaded=True)
+        assert first.limit == 1
+    finally:
+        first.state.close()
+        second.state.unlink()
+        second.state.close()
+
+
+def test_stateless_provider_limiter_backs_off_on_429():
+    limits = BucketLimits(initial_limit=8)
+    provider = StatelessProvider(URL, 2, PROVIDERS, limits=limits)
+    error = requests.HTTPError(response=Mock(status_code=429))
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=error
+    ):
+        with pytest.raises(requests.HTTPError):
+            provider.make_request("eth_blockNumber", [])
+
+    assert limits.get(URL).limit == 4
+    assert limits.get(URL).in_flight == 0
+
+
+@pytest.mark.parametrize(
+    "error",
+    [requests.HTTPError(response=Mock(status_code=400)), KeyboardInterrupt()],
+)
+def test_stateless_provider_limiter_keeps_limit_on_other_failures(error):
+    limits = BucketLimits(initial_limit=8)
+    provider = StatelessProvider(URL, 2, PROVIDERS, limits=limits)
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=error
+    ):
+        with pytest.raises(type(error)):
+            provider.make_request("eth_blockNumber", [])
+
+    assert limits.get(URL).limit == 8
+    assert limits.get(URL).in_flight == 0
+
+
+def test_stateless_provider_retries_transient_failures():
+    policy = RetryPolicy(RetryConfig(max_attempts=3, base_delay=0.001))
+    provider = StatelessProvider(URL, 2, PROVIDERS, retry=policy)
+    responses = [
+        requests.ConnectionError("reset"),
+        encode(make_response("0x10", ["0xaa"])),
+        encode(make_response("0x10", ["0xaa", "0xaa"])),
+    ]
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=responses
+    ):
+        assert provider.make_request("eth_blockNumber", [])["result"] == "0x10"
+
+    assert policy.stats["retries"] == 2
+    assert policy.stats["recovered"] == 1
+    assert policy.stats["extra_latency"] > 0
+
+
+def test_stateless_provider_never_retries_non_idempotent_methods():
+    policy = RetryPolicy(RetryConfig(max_attempts=5, base_delay=0.001))
+    provider = StatelessProvider(URL, 2, PROVIDERS, retry=policy)
+
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        side_effect=requests.ConnectionError("reset"),
+    ) as post:
+        with pytest.raises(requests.ConnectionError):
+            provider.make_request("eth_sendRawTransaction", ["0x00"])
+
+    assert post.call_count == 1
+    assert policy.stats["retries"] == 0
+
+
+def test_retry_budget_caps_retries():
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0)
+    budget._balance = 2
+    policy = RetryPolicy(RetryConfig(max_attempts=10, base_delay=0.0), budget=budget)
+
+    def fail():
+        raise requests.ConnectionError("reset")
+
+    with pytest.raises(requests.ConnectionError):
+        policy.call("eth_call", fail)
+
+    assert policy.stats["retries"] == 2
+    assert policy.stats["budget_exceeded"] == 1
+
+
+def test_stateless_provider_reports_instrumentation():
+    histograms = HistogramSink()
+    prometheus = PrometheusSink()
+    provider = StatelessProvider(
+        URL, 2, PROVIDERS, instrumentation=Instrumentation(histograms, prometheus)
+    )
+    responses = [
+        encode(make_response("0x10", ["0xaa", "0xaa"])),
+        encode(make_response("0x10", ["0xaa", "0xbb"])),
+    ]
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", side_effect=responses
+    ):
+        provider.make_request("eth_blockNumber", [])
+        with pytest.raises(IntegrityError):
+            provider.make_request("eth_blockNumber", [])
+
+    assert histograms.counter(REQUESTS, method="eth_blockNumber", outcome="ok") == 1
+    assert (
+        histograms.counter(REQUESTS, method="eth_blockNumber", outcome="IntegrityError")
+        == 1
+    )
+    assert histograms.histogram(VERIFY_SECONDS, method="eth_blockNumber").count == 2
+    assert histograms.histogram(REQUEST_BYTES, method="eth_blockNumber").min > 0
+    assert (
+        histograms.counter(ATTESTATIONS, identity=PROVIDERS[0], outcome="agreed") == 2
+    )
+    assert (
+        histograms.counter(ATTESTATIONS, identity=PROVIDERS[1], outcome="disagreed")
+        == 1
+    )
+    exposition = prometheus.render()
+    assert "# TYPE stateless_request_seconds histogram" in exposition
+    assert 'stateless_request_seconds_count{method="eth_blockNumber"} 2' in exposition
+    assert (
+        'stateless_requests_total{method="eth_blockNumber",outcome="ok"} 1'
+        in exposition
+    )
+
+
+def test_histogram_percentiles_within_relative_error():
+    histogram = Histogram(precision=5)
+    for value in range(1, 10001):
+        histogram.record(value / 1000)
+
+    for percentile in (50, 90, 99, 99.9):
+        expected = percentile / 10
+        assert abs(histogram.percentile(percentile) - expected) <= expected / 64
+    assert histogram.percentile(100) == 10.0
+
+
+def test_integrity_error_renders_message_lazily():
+    quorum = evaluate_quorum(
+        [
+            make_attestation("0xaa", PROVIDERS[0]),
+            make_attestation("0xbb", PROVIDERS[1]),
+        ],
+        2,
+    )
+    with patch("stateless.eth.provider.json.dumps", return_value="[]") as dumps:
+        error = IntegrityError("eth_call", [{"data": "0x00"}], 2, PROVIDERS, quorum)
+        assert dumps.call_count == 0
+        assert "disagreeing identities" in str(error)
+        str(error)
+    assert dumps.call_count == 1
+
+
+def test_structural_diff_is_bounded():
+    expected = {"logs": [{"data": "0x" + "00" * 500, "index": i} for i in range(10)]}
+    actual = {"logs": [{"data": "0x" + "11" * 500, "index": i} for i in range(12)]}
+
+    diff, truncated = structural_diff(expected, actual, max_entries=3, max_length=10)
+
+    assert truncated
+    assert [entry["path"] for entry in diff] == [
+        "$.logs.length",
+        "$.logs[0].data",
+        "$.logs[1].data",
+    ]
+    assert diff[1]["expected"] == "0x00000000... (1002 chars)"
+
+
+def test_stateless_provider_reports_disagreements(tmp_path):
+    store = ReportStore(str(tmp_path / "reports.jsonl"), max_bytes=600, backup_count=1)
+    honest = Mock()
+    honest.make_request.return_value = {"result": {"value": "0x10"}}
+    dishonest = Mock()
+    dishonest.make_request.return_value = {"result": {"value": "0x11"}}
+    forensics = Forensics(store, {PROVIDERS[0]: honest, PROVIDERS[1]: dishonest})
+    provider = StatelessProvider(URL, 2, PROVIDERS, forensics=forensics)
+
+    for block in range(3):
+        body = encode(make_response({"value": "0x10"}, ["0xaa", "0xbb"]))
+        with patch.object(
+            provider._request_session_manager, "make_post_request", return_value=body
+        ):
+            with pytest.raises(IntegrityError):
+                provider.make_request("eth_call", [{"to": "0x00"}, hex(block)])
+    forensics.join()
+
+    reports = list(store.read())
+    assert forensics.stats["reported"] == 3
+    assert os.path.exists(store.path + ".1")
+    assert 0 < len(reports) < 3
+    identities = reports[-1]["identities"]
+    assert identities[PROVIDERS[0]] == {
+        "msg": "0xaa",
+        "invalid": False,
+        "diff": [],
+        "truncated": False,
+    }
+    assert identities[PROVIDERS[1]]["diff"] == [
+        {"path": "$.value", "expected": "0x10", "actual": "0x11"}
+    ]
+
+
+def test_stateless_provider_pins_latest_within_scope():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    heights = iter(["0x10", "0x11"])
+    seen = []
+
+    def balance(params):
+        seen.append(params)
+        return "0x1"
+
+    fake_post = make_rpc_server(
+        {
+            "eth_blockNumber": lambda params: next(heights),
+            "eth_getBalance": balance,
+            "eth_call": lambda params: seen.append(params) or "0x",
+        }
+    )
+    with patch.object(
+        provider._request_session_manager, "make_post_request", fake_post
+    ):
+        with provider.pin_block() as pin:
+            assert provider.make_request("eth_blockNumber", [])["result"] == "0x10"
+            provider.make_request("eth_getBalance", ["0x00", "latest"])
+            provider.make_request("eth_getBalance", ["0x00", "latest"])
+            provider.make_request("eth_call", [{"to": "0x00"}])
+            provider.make_request("eth_getBalance", ["0x00", "pending"])
+            batch = provider.make_batch_request(
+                [("eth_blockNumber", []), ("eth_getBalance", ["0x01"])]
+            )
+            assert [resp["result"] for resp in batch] == ["0x10", "0x1"]
+        assert provider.make_request("eth_blockNumber", [])["result"] == "0x11"
+
+    assert pin.number == 16
+    assert seen == [
+        ["0x00", "0x10"],
+        [{"to": "0x00"}, "0x10"],
+        ["0x00", "pending"],
+        ["0x01", "0x10"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_async_stateless_provider_pins_latest_within_scope():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS)
+    heights = iter(["0x10", "0x99"])
+    fake_post = make_rpc_server(
+        {
+            "eth_blockNumber": lambda params: next(heights),
+            "eth_getLogs": lambda params: [params[0]],
+        }
+    )
+
+    async def async_post(endpoint_uri, data, **kwargs):
+        return fake_post(endpoint_uri, data)
+
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", async_post
+    ):
+        async with provider.pin_block():
+            resp = await provider.make_request("eth_getLogs", [{"fromBlock": "0x1"}])
+            batch = await provider.make_batch_request(
+                [("eth_blockNumber", []), ("eth_blockNumber", [])]
+            )
+    await provider.disconnect()
+
+    assert resp["result"] == [{"fromBlock": "0x1", "toBlock": "0x10"}]
+    assert [resp["result"] for resp in batch] == ["0x10", "0x10"]
+
+
+RAW_TX = "0x02f86c0180843b9aca00"
+
+
+def make_rejecting_provider(url, message, delay=0.0):
+    provider = StatelessProvider(url, 2, PROVIDERS)
+
+    def fake_post(endpoint_uri, data, **kwargs):
+        time.sleep(delay)
+        return encode(
+            {
+                "jsonrpc": "2.0",
+                "id": json.loads(data)["id"],
+                "error": {"code": -32000, "message": message},
+            }
+        )
+
+    provider._request_session_manager.make_post_request = fake_post
+    return provider
+
+
+def test_broadcast_provider_treats_already_known_as_accepted():
+    provider = BroadcastStatelessProvider(
+        [
+            make_bucket_provider("https://a", "0x" + "11" * 32, delay=1.0),
+            make_rejecting_provider("https://b", "already known", delay=0.01),
+            make_rejecting_provider("https://c", "nonce too low"),
+        ]
+    )
+
+    started = time.monotonic()
+    resp = provider.make_request("eth_sendRawTransaction", [RAW_TX])
+
+    assert time.monotonic() - started < 0.5
+    assert resp["result"] == "0x" + keccak(hexstr=RAW_TX).hex()
+    assert provider.stats["already_known"] == 1
+
+
+def test_broadcast_provider_is_not_held_up_by_slow_buckets_under_load():
+    provider = BroadcastStatelessProvider(
+        [
+            make_bucket_provider("https://a", "0x" + "11" * 32, delay=0.01),
+            make_bucket_provider("https://b", "0x" + "11" * 32, delay=0.5),
+        ]
+    )
+
+    def send(_):
+        return provider.make_request("eth_sendRawTransaction", [RAW_TX])["result"]
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(send, range(40)))
+
+    assert results == ["0x" + "11" * 32] * 40
+    assert time.monotonic() - started < 0.5
+
+
+def test_broadcast_provider_returns_rejection_when_no_bucket_accepts():
+    provider = BroadcastStatelessProvider(
+        [
+            make_rejecting_provider("https://a", "nonce too low", delay=0.02),
+            make_rejecting_provider("https://b", "insufficient funds"),
+        ]
+    )
+
+    resp = provider.make_request("eth_sendRawTransaction", [RAW_TX])
+
+    assert resp["error"]["message"] == "nonce too low"
+    assert provider.stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_async_broadcast_provider_keeps_sending_to_slow_buckets():
+    providers = [AsyncStatelessProvider(url, 2, PROVIDERS) for url in ("a", "b")]
+    sent = []
+
+    def make_post(url, delay):
+        async def fake_post(endpoint_uri, data, **kwargs):
+            await asyncio.sleep(delay)
+            sent.append(url)
+            return encode(
+                make_response("0x01", ["0xaa", "0xaa"], json.loads(data)["id"])
+            )
+
+        return fake_post
+
+    provider = AsyncBroadcastStatelessProvider(providers)
+    with (
+        patch.object(
+            providers[0]._request_session_manager,
+            "async_make_post_request",
+            make_post("a", 0.0),
+        ),
+        patch.object(
+            providers[1]._request_session_manager,
+            "async_make_post_request",
+            make_post("b", 0.05),
+        ),
+    ):
+        resp = await provider.make_request("eth_sendRawTransaction", [RAW_TX])
+        assert resp["result"] == "0x01"
+        assert sent == ["a"]
+        await provider.disconnect()
+
+    assert sent == ["a", "b"]
+
+
+def make_receipt_server(heights, mined):
+    """Serves heights in turn, and receipts for the hashes in `mined`."""
+    posts = []
+    fake_post = make_rpc_server(
+        {
+            "eth_blockNumber": lambda params: next(heights),
+            "eth_getTransactionReceipt": lambda params: (
+                {"transactionHash": params[0], "status": "0x1"}
+                if params[0] in mined
+                else None
+            ),
+        }
+    )
+
+    def counting_post(endpoint_uri, data, **kwargs):
+        posts.append(json.loads(data))
+        return fake_post(endpoint_uri, data)
+
+    return counting_post, posts
+
+
+def test_receipt_watcher_polls_pending_receipts_once_per_block():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    hashes = ["0x" + "{:02x}".format(i) * 32 for i in range(3)]
+    mined = {hashes[0]}
+    fake_post, posts = make_receipt_server(iter(["0x10", "0x10", "0x11"]), mined)
+    watcher = ReceiptWatcher(provider, poll_interval=60, batch_size=2)
+    received = []
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", fake_post
+    ):
+        futures = [watcher.watch(tx_hash, received.append) for tx_hash in hashes]
+        assert watcher.poll() == 1
+        # Same block, nothing new to look up.
+        assert watcher.poll() == 0
+        mined.update(hashes[1:])
+        assert watcher.poll() == 2
+    watcher.close()
+
+    assert [future.result()["transactionHash"] for future in futures] == hashes
+    assert len(received) == 3
+    assert watcher.pending == 0
+    receipt_batches = [len(post) for post in posts if isinstance(post, list)]
+    assert receipt_batches == [2, 1, 2]
+    assert len(posts) == 3 + len(receipt_batches)
+
+
+def test_receipt_watcher_accepts_hexbytes_hashes():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    tx_hash = "0x" + "4a" * 32
+    fake_post, _ = make_receipt_server(iter(["0x10"]), {tx_hash})
+    watcher = ReceiptWatcher(provider, poll_interval=60)
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", fake_post
+    ):
+        future = watcher.watch(HexBytes(tx_hash))
+        assert watcher.poll() == 1
+    watcher.close()
+
+    assert future.result()["transactionHash"] == tx_hash
+    with pytest.raises(RuntimeError):
+        watcher.watch(tx_hash)
+
+
+@pytest.mark.asyncio
+async def test_async_receipt_watcher_resolves_futures():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS)
+    tx_hash = "0x" + "ab" * 32
+    mined = set()
+    fake_post, _ = make_receipt_server((hex(n) for n in range(16, 10000)), mined)
+
+    async def async_post(endpoint_uri, data, **kwargs):
+        return fake_post(endpoint_uri, data)
+
+    watcher = AsyncReceiptWatcher(provider, poll_interval=0.01)
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", async_post
+    ):
+        future = watcher.watch(tx_hash)
+        await asyncio.sleep(0.03)
+        assert not future.done()
+        mined.add(tx_hash)
+        receipt = await asyncio.wait_for(future, 1)
+        abandoned = watcher.watch("0x" + "cd" * 32)
+        await watcher.close()
+    await provider.disconnect()
+
+    assert receipt["status"] == "0x1"
+    assert abandoned.cancelled()
+
+
+ACCOUNT = "0x" + "aa" * 20
+
+
+def make_nonce_server(chain, sent):
+    """Serves the account's pending count and accepts only nonces not below it."""
+
+    def fake_post(endpoint_uri, data, **kwargs):
+        request = json.loads(data)
+        if request["method"] == "eth_getTransactionCount":
+            result = hex(chain["count"])
+        else:
+            nonce = int(request["params"][0], 16)
+            if nonce < chain["count"]:
+                return encode(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": request["id"],
+                        "error": {"code": -32000, "message": "nonce too low"},
+                    }
+                )
+            chain["count"] = nonce + 1
+            sent.append(nonce)
+            result = "0x" + "11" * 32
+        return encode(make_response(result, ["0xaa", "0xaa"], request["id"]))
+
+    return fake_post
+
+
+def test_nonce_manager_allocates_locally_and_resyncs_on_nonce_errors():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    chain = {"count": 5}
+    sent = []
+    manager = NonceManager(provider)
+
+    with patch.object(
+        provider._request_session_manager,
+        "make_post_request",
+        make_nonce_server(chain, sent),
+    ):
+        with ThreadPoolExecutor(4) as pool:
+            nonces = list(pool.map(lambda _: manager.next_nonce(ACCOUNT), range(8)))
+        assert sorted(nonces) == list(range(5, 13))
+        # Transactions sent from elsewhere moved the count past ours.
+        chain["count"] = 20
+        resp = manager.send_raw_transaction(ACCOUNT, hex)
+
+    assert resp["result"] == "0x" + "11" * 32
+    assert sent == [20]
+    assert manager.stats["syncs"] == 2
+    manager.release(ACCOUNT, manager.next_nonce(ACCOUNT))
+    assert manager.next_nonce(ACCOUNT) == 21
+
+
+def test_nonce_manager_resyncs_after_idle_period():
+    provider = StatelessProvider(URL, 2, PROVIDERS)
+    chain = {"count": 1}
+    fake_post = make_nonce_server(chain, [])
+    manager = NonceManager(provider, idle_timeout=0.05)
+
+    with patch.object(
+        provider._request_session_manager, "make_post_request", fake_post
+    ):
+        assert manager.next_nonce(ACCOUNT) == 1
+        chain["count"] = 4
+        assert manager.next_nonce(ACCOUNT) == 2
+        time.sleep(0.1)
+        assert manager.next_nonce(ACCOUNT) == 4
+
+
+@pytest.mark.asyncio
+async def test_async_nonce_manager_serializes_concurrent_signers():
+    provider = AsyncStatelessProvider(URL, 2, PROVIDERS)
+    sent = []
+    fake_post = make_nonce_server({"count": 3}, sent)
+
+    async def async_post(endpoint_uri, data, **kwargs):
+        await asyncio.sleep(0.001)
+        return fake_post(endpoint_uri, data)
+
+    manager = AsyncNonceManager(provider)
+    with patch.object(
+        provider._request_session_manager, "async_make_post_request", async_post
+    ):
+        await asyncio.gather(
+            *(manager.send_raw_transaction(ACCOUNT, hex) for _ in range(5))
+        )
+    await provider.disconnect()
+
+    assert sorted(sent) == [3, 4, 5, 6, 7]
+    assert manager.stats["syncs"] == 1